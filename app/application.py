@@ -13,33 +13,56 @@ delete items.
 # General imports
 import os
 import datetime
-import sys
+from functools import wraps
 
 # Security-related imports
 import random
 import string
-import json
-import httplib2
 
 from flask import session as login_session
-from oauth2client.client import flow_from_clientsecrets, FlowExchangeError
 
 # Server application-related imports
-from flask import Flask, render_template, jsonify, request, redirect, \
-    url_for
+from flask import Flask, Blueprint, render_template, request, redirect, \
+    url_for, current_app, Response, stream_with_context, g
 
 # Database-related imports
-import requests
-import bleach
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
-
-from database.database_setup import Base, Categories, Items
+from markupsafe import Markup, escape
+
+from config import Config
+from database.database_setup import Items, SCHEMA_VERSION
+from database.database_access import init_db, setup_db, \
+    get_schema_version, remove_db_session, \
+    get_categories_from_db, get_latest_items_from_db, get_item_rows_from_db, \
+    get_item_count_from_db, get_items_page_from_db, \
+    get_item_rows_page_from_db, get_item_row_from_db, \
+    get_catalog_rows_from_db, fetch_in_batches, get_item_from_db, \
+    get_catalog_version_from_db, \
+    get_item_last_modified_from_db, get_changed_tags_from_db, \
+    get_search_results_from_db, write_items_to_db, \
+    add_token_revocation_to_db
+from database.search import MATCH_START, MATCH_END, \
+    strip_control_characters
+from database.catalog_changes import category_tag, item_tag, \
+    LATEST_ITEMS_TAG, CATEGORIES_TAG
+from conditional import conditional
+from page_cache import PageCache, cached_page, tag_page
+from category_registry import CategoryRegistry
+from pagination import parse_page_arguments, encode_cursor
+from serializers import serialize_catalog, serialize_item, chunked, \
+    stream_catalog, stream_category, stream_ndjson
+from json_provider import init_json, jsonify
+from compression import Compression
+from static_assets import StaticAssets
+from commands import catalog_cli
+from provider_client import ProviderClient, ProviderError, ProviderBusy
+from provider_secrets import ProviderSecrets
+from token_revocation import RevocationWorker
+from query_budget import query_budget, QueryBudgets
+from metrics import init_metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
 
 # Error handling-related imports
 from werkzeug.exceptions import HTTPException
 from flask import abort
-from sqlalchemy.exc import SQLAlchemyError
 
 
 __author__ = "Elisabeth M. Strunk"
@@ -50,93 +73,190 @@ __status__ = "Development"
 
 
 '''
-# CONNECTION TO THE DATABASE
-  *  If the database file does not exist yet, create the database and populate
-     it with dummy data.
-  *  Open a connection to the database
-  *  Define functions that handle the interaction with the database.
+# WEB APPLICATION
+  *  Set up error handler
+  *  Define all routes and their endpoint functions on the catalog blueprint
+  *  Create the Flask application (see create_app() at the end of the module)
 '''
-try:
-    if not os.path.exists('item_catalog.db'):
-        from database.database_setup import create_database
-        from database.populate_database import populate_database
 
-        create_database()
-        populate_database()
+catalog = Blueprint('catalog', __name__)
 
-    engine = create_engine('sqlite:///item_catalog.db',
-                           connect_args={'check_same_thread': False})
-    Base.metadata.bind = engine
-    db_session = sessionmaker(bind=engine)
-    session = db_session()
-except SQLAlchemyError as e:
-    sys.exit("While initializing the database, an error occurred: " + str(e))
 
+'''
+## Error handling
+'''
 
-def get_categories_from_db():
-    return session.query(Categories).all()
 
+def handle_error(e):
+    code = 500
+    if isinstance(e, HTTPException):
+        code = e.code
+    return render_template('error.html',
+                           error_text=str(e).replace(str(code), ''),
+                           error_code=code), code
 
-def get_latest_items_from_db():
-    return session.query(Items).order_by(text("last_modified DESC")).limit(5)
 
+def handle_provider_error(e):
+    current_app.logger.warning("Call to a sign-in provider failed: %s", e)
+    return render_template('error.html',
+                           error_text="The sign-in provider could not be "
+                                      "reached. Please try again later.",
+                           error_code=502), 502
 
-def get_items_from_db(category):
-    return session.query(Items).filter_by(category=category)
 
+def handle_provider_busy(e):
+    return render_template('error.html',
+                           error_text="Too many sign-ins at the moment. "
+                                      "Please try again in a few seconds.",
+                           error_code=503), 503, {'Retry-After': '5'}
 
-def get_item_from_db(item_id):
-    return session.query(Items).filter_by(id=item_id).one_or_none()
 
+'''
+## Conditional requests
+  The state functions below provide the ETag / Last-Modified of the read
+  endpoints, see conditional.py. Pages and lists change with the catalog
+  version, single items with their last_modified timestamp.
+'''
 
-def edit_item_in_db(edited_item):
-    session.add(edited_item)
-    session.commit()
-    return edited_item
 
+def get_catalog_version():
+    # read once per request, shared by the conditional requests and the page
+    # cache
+    if 'catalog_version' not in g:
+        g.catalog_version = get_catalog_version_from_db()
+    return g.catalog_version
 
-def add_item_to_db(item):
-    session.add(item)
-    session.commit()
-    new_item = session.query(Items).filter_by(
-        last_modified=item.last_modified).one_or_none()
-    return new_item
 
+def catalog_state(**view_args):
+    version, last_modified = get_catalog_version()
+    return f'v{version}', last_modified
+
+
+def catalog_json_state(**view_args):
+    version, last_modified = get_catalog_version()
+    return f'v{version}-{requested_stream_format() or "json"}', last_modified
 
-def delete_item_from_db(item):
-    session.delete(item)
-    session.commit()
-    return None
+
+def item_state(item_id, **view_args):
+    last_modified = get_item_last_modified_from_db(item_id)
+    if last_modified is None:
+        return None
+    return f'item-{item_id}-{last_modified.timestamp()}', last_modified
 
 
 '''
-# WEB APPLICATION
-  *  Initialize Flask application and set secret key for security
-  *  Set up error handler
-  *  Define all routes and their endpoint functions
+## Categories
 '''
 
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.urandom(16)
+
+def get_categories():
+    """
+    Return the category registry of the application (see
+    category_registry.py), up to date with the catalog version.
+    """
+    registry = current_app.extensions['category_registry']
+    registry.sync(get_catalog_version()[0], get_changed_tags_from_db,
+                  get_categories_from_db)
+    return registry
 
 
 '''
-## Error handling
+## Page cache
+  The rendered index, category and item pages are kept in the page cache
+  (see page_cache.py) until a write changes what they show.
 '''
 
 
-@app.errorhandler(Exception)
-def handle_error(e):
-    code = 500
-    if isinstance(e, HTTPException):
-        code = e.code
-    return render_template('error.html',
-                           error_text=str(e).replace(str(code), ''),
-                           error_code=code), code
+def cached(tags):
+    return cached_page(lambda: get_catalog_version()[0],
+                       get_changed_tags_from_db, tags)
+
+
+def index_tags(**view_args):
+    return [CATEGORIES_TAG, LATEST_ITEMS_TAG]
+
+
+def category_tags(category, **view_args):
+    # the view has looked the category up already
+    return [CATEGORIES_TAG, category_tag(get_categories().get(category).id)]
+
 
+def item_tags(category, item_id, **view_args):
+    return [CATEGORIES_TAG, item_tag(item_id)]
 
-app.config['TRAP_HTTP_EXCEPTIONS'] = True
-app.register_error_handler(Exception, handle_error)
+
+'''
+## Pagination
+'''
+
+
+def get_requested_page(category, load_page=get_items_page_from_db):
+    """
+    Return the items of the page of category (from the category registry)
+    requested by the limit and after query arguments, and the URL of the
+    next page (None on the last page). Raises ValueError for invalid
+    arguments. load_page loads the items, e.g. as rows for JSON. The URL
+    is relative: the cached responses it ends up in are shared by all
+    hosts and schemes the catalog is served under.
+    """
+    limit, after = parse_page_arguments(
+        request.args,
+        current_app.config['ITEMS_PER_PAGE'],
+        current_app.config['MAX_ITEMS_PER_PAGE'])
+    items, has_next = load_page(category.id, limit, after)
+    next_url = None
+    if has_next:
+        next_url = url_for(request.endpoint, category=category.slug,
+                           limit=request.args.get('limit'),
+                           after=encode_cursor(items[-1]))
+    return items, next_url
+
+
+'''
+## Search
+  Results change with every write, so search pages are validated with the
+  catalog version but not kept in the page cache: every new query would
+  push a category or item page out of it.
+'''
+
+
+def get_search_results():
+    """
+    Return the search query (q argument) and the best matching items for
+    it, as many as the limit argument asks for. Raises ValueError for an
+    invalid limit.
+    """
+    query = request.args.get('q', '').strip()
+    limit, _ = parse_page_arguments(
+        request.args,
+        current_app.config['ITEMS_PER_PAGE'],
+        current_app.config['MAX_ITEMS_PER_PAGE'])
+    if not query:
+        return query, []
+    return query, get_search_results_from_db(query, limit)
+
+
+@catalog.app_template_filter('highlight')
+def highlight(snippet):
+    # escape the item text, then mark the matched terms
+    return Markup(str(escape(snippet))
+                  .replace(MATCH_START, '<mark>')
+                  .replace(MATCH_END, '</mark>'))
+
+
+'''
+## Form input
+'''
+
+
+def clean(text):
+    # bleach and its HTML parser are imported by the first write, so that
+    # starting a worker does not pay for them
+    import bleach
+
+    # control characters are removed, not left to bleach, which keeps some
+    # and turns others into '?'
+    return bleach.clean(strip_control_characters(text))
 
 
 '''
@@ -144,39 +264,57 @@ app.register_error_handler(Exception, handle_error)
 '''
 
 
-@app.route('/')
-@app.route('/catalog')
-@app.route('/catalog/')
+@catalog.route('/')
+@catalog.route('/catalog')
+@catalog.route('/catalog/')
+@query_budget(4)
+@conditional(catalog_state)
+@cached(index_tags)
 def index():
-    categories = get_categories_from_db()
-    latest_items = get_latest_items_from_db()
+    categories = get_categories()
+    latest_items = get_latest_items_from_db().all()
+    # deleting one of these items changes the page
+    tag_page(*(item_tag(i.id) for i in latest_items))
     return render_template('index.html', categories=categories,
                            latest_items=latest_items)
 
 
-@app.route('/catalog/<string:category>')
-@app.route('/catalog/<string:category>/items')
+@catalog.route('/catalog/<string:category>')
+@catalog.route('/catalog/<string:category>/items')
+@query_budget(5)
+@conditional(catalog_state)
+@cached(category_tags)
 def category(category):
-    if category in [c.name for c in get_categories_from_db()]:
-        categories = get_categories_from_db()
-        items = get_items_from_db(category)
-        number_of_items = len(items.all())
+    categories = get_categories()
+    # the slug, or the name in links from before there were slugs
+    requested_category = categories.get(category)
+    if requested_category:
+        try:
+            items, next_url = get_requested_page(requested_category)
+        except ValueError as e:
+            abort(400, description=str(e))
+        number_of_items = get_item_count_from_db(requested_category.id)
         return render_template('category.html', categories=categories,
-                               category=category, items=items,
-                               number_of_items=number_of_items)
+                               category=requested_category, items=items,
+                               number_of_items=number_of_items,
+                               next_url=next_url,
+                               is_first_page='after' not in request.args)
     else:
         abort(404, description="No category found with name "
                                "'{}'.".format(category))
 
 
-@app.route('/catalog/<string:category>/<string:item_id>')
+@catalog.route('/catalog/<string:category>/<string:item_id>')
+@query_budget(5)
+@conditional(item_state)
+@cached(item_tags)
 def item(category, item_id):
-    if category not in [c.name for c in get_categories_from_db()]:
+    if category not in get_categories():
         abort(404, description="No category found with name "
                                "'{}'.".format(category))
     item = get_item_from_db(item_id)
     if item:
-        if item.category != category:
+        if category not in (item.category_slug, item.category):
             abort(404, description="The item you requested was not found "
                                    "in category {}.".format(category))
         else:
@@ -185,64 +323,87 @@ def item(category, item_id):
         abort(404, description="No item found with id {}.".format(item_id))
 
 
-@app.route('/catalog/<string:item_id>/edit', methods=['GET', 'POST'])
+@catalog.route('/catalog/<string:item_id>/edit', methods=['GET', 'POST'])
+@query_budget(8)
 def edit_item(item_id):
     if 'username' not in login_session:
-        return redirect(url_for('login'))
+        return redirect(url_for('catalog.login'))
     item = get_item_from_db(item_id)
+    if item is None:
+        # e.g. deleted by someone else in the meantime
+        abort(404, description="No item found with id {}.".format(item_id))
     if request.method == 'GET':
-        categories = get_categories_from_db()
+        categories = get_categories()
         return render_template('edit_item.html', categories=categories,
                                item=item)
     elif request.method == 'POST':
+        # validate the whole form before the item is changed
+        item_category = None
+        if request.form['category']:
+            category_name = clean(request.form['category'])
+            item_category = get_categories().get(category_name)
+            if item_category is None:
+                abort(400, description="No category found with name "
+                                       "'{}'.".format(category_name))
         if request.form['name']:
-            item.name = bleach.clean(request.form['name'])
+            item.name = clean(request.form['name'])
         if request.form['description']:
-            item.description = bleach.clean(request.form['description'])
-        if request.form['category']:
-            item.category = bleach.clean(request.form['category'])
+            item.description = clean(request.form['description'])
+        if item_category is not None:
+            item.category_id = item_category.id
         item.last_modified = datetime.datetime.now()
-        edit_item_in_db(item)
-        return redirect(url_for('item', item_id=item_id,
-                                category=item.category))
+        write_items_to_db(edited=[item])
+        category_slug = get_categories().get_by_id(item.category_id).slug
+        return redirect(url_for('catalog.item', item_id=item_id,
+                                category=category_slug))
     else:
         abort(405)
 
 
-@app.route('/catalog/<string:item_id>/delete', methods=['GET', 'POST'])
+@catalog.route('/catalog/<string:item_id>/delete', methods=['GET', 'POST'])
+@query_budget(8)
 def delete_item(item_id):
     if 'username' not in login_session:
-        return redirect(url_for('login'))
+        return redirect(url_for('catalog.login'))
     item = get_item_from_db(item_id)
+    if item is None:
+        # e.g. deleted by someone else in the meantime
+        abort(404, description="No item found with id {}.".format(item_id))
     if request.method == 'GET':
         return render_template('delete_item.html', item=item)
     elif request.method == 'POST':
-        delete_item_from_db(item)
-        return redirect(url_for('category', category=item.category))
+        write_items_to_db(deleted=[item])
+        return redirect(url_for('catalog.category',
+                                category=item.category_slug))
     else:
         abort(405)
 
 
-@app.route('/catalog/add', methods=['GET', 'POST'])
+@catalog.route('/catalog/add', methods=['GET', 'POST'])
+@query_budget(8)
 def add_item():
     if 'username' not in login_session:
-        return redirect(url_for('login'))
+        return redirect(url_for('catalog.login'))
     if request.method == 'GET':
-        categories = get_categories_from_db()
+        categories = get_categories()
         return render_template('add_item.html', categories=categories)
     elif request.method == 'POST':
         if request.form['name'] and request.form['description'] and \
                 request.form['category']:
-            item_name = bleach.clean(request.form['name'])
-            item_description = bleach.clean(request.form['description'])
-            item_category = bleach.clean(request.form['category'])
-            new_item = add_item_to_db(
+            item_name = clean(request.form['name'])
+            item_description = clean(request.form['description'])
+            category_name = clean(request.form['category'])
+            item_category = get_categories().get(category_name)
+            if item_category is None:
+                abort(400, description="No category found with name "
+                                       "'{}'.".format(category_name))
+            new_item, = write_items_to_db(added=[
                 Items(name=item_name,
                       description=item_description,
-                      category=item_category,
-                      last_modified=datetime.datetime.now()))
-            return redirect(url_for('item', item_id=new_item.id,
-                                    category=new_item.category))
+                      category_id=item_category.id,
+                      last_modified=datetime.datetime.now())])
+            return redirect(url_for('catalog.item', item_id=new_item.id,
+                                    category=item_category.slug))
         else:
             abort(400, description="The transmitted form data was incomplete. "
                                    "Item not added.")
@@ -250,62 +411,186 @@ def add_item():
         abort(405)
 
 
+@catalog.route('/catalog/search')
+@query_budget(3)
+@conditional(catalog_state)
+def search():
+    try:
+        query, results = get_search_results()
+    except ValueError as e:
+        abort(400, description=str(e))
+    return render_template('search.html', categories=get_categories(),
+                           query=query, results=results)
+
+
 '''
 ## JSON endpoints:
+  The items of a category are paginated like the category page (limit and
+  after arguments, the URL of the next page is given as 'Next' and in the
+  Link header). The collection endpoints can also stream their complete
+  response:
+    ?stream=1 (or ?stream=json)            same document, sent in chunks
+    ?stream=ndjson or
+    Accept: application/x-ndjson           one item per line
 '''
 
+NDJSON_MIMETYPE = 'application/x-ndjson'
 
-@app.route('/catalog.json')
+
+def requested_stream_format():
+    stream = request.args.get('stream')
+    if stream == 'ndjson' or request.accept_mimetypes.best_match(
+            ['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE:
+        return 'ndjson'
+    if stream in ('1', 'true', 'json'):
+        return 'json'
+    return None
+
+
+def streamed_response(pieces, stream_format):
+    mimetype = NDJSON_MIMETYPE if stream_format == 'ndjson' \
+        else 'application/json'
+    # stream_with_context keeps the request (and its database session) alive
+    # until the last chunk has been sent
+    return Response(stream_with_context(chunked(pieces)), mimetype=mimetype)
+
+
+@catalog.route('/catalog.json')
+@query_budget(2)
+@conditional(catalog_json_state, vary='Accept')
 def index_json():
-    categories = get_categories_from_db()
-    serialized_catalog = {}
-    for category in categories:
-        serialized_catalog.update(
-            {category.name: {}}
-        )
-        serialized_items = []
-        for item in get_items_from_db(category.name):
-            serialized_items.append(item.serialize)
-        serialized_catalog[category.name].update(
-            {'Items': serialized_items}
-        )
+    stream_format = requested_stream_format()
+    if stream_format:
+        rows = fetch_in_batches(get_catalog_rows_from_db(),
+                                current_app.config['JSON_STREAM_BATCH_SIZE'])
+        if stream_format == 'ndjson':
+            pieces = stream_ndjson(row for row in rows
+                                   if row.id is not None)
+        else:
+            pieces = stream_catalog(rows)
+        return streamed_response(pieces, stream_format)
+    serialized_catalog = serialize_catalog(get_catalog_rows_from_db())
     return jsonify(Catalog=serialized_catalog)
 
 
-@app.route('/catalog/<string:category>.json')
-@app.route('/catalog/<string:category>/items.json')
+@catalog.route('/catalog/<string:category>.json')
+@catalog.route('/catalog/<string:category>/items.json')
+@query_budget(4)
+@conditional(catalog_json_state, vary='Accept')
 def category_json(category):
-    if category in [c.name for c in get_categories_from_db()]:
-        items = get_items_from_db(category)
-        number_of_items = len(items.all())
-        serialized_items = []
-        for item in get_items_from_db(category):
-            serialized_items.append(item.serialize)
+    requested_category = get_categories().get(category)
+    if requested_category:
+        stream_format = requested_stream_format()
+        if stream_format:
+            rows = fetch_in_batches(
+                get_item_rows_from_db(requested_category.id),
+                current_app.config['JSON_STREAM_BATCH_SIZE'])
+            if stream_format == 'ndjson':
+                pieces = stream_ndjson(rows)
+            else:
+                pieces = stream_category(requested_category.name, rows)
+            return streamed_response(pieces, stream_format)
+        try:
+            rows, next_url = get_requested_page(requested_category,
+                                                get_item_rows_page_from_db)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        number_of_items = get_item_count_from_db(requested_category.id)
+        serialized_items = [serialize_item(row) for row in rows]
         serialized_category = {
-            'Name': category,
+            'Name': requested_category.name,
             'Number fo items': number_of_items,
-            'Items': serialized_items}
-        return jsonify(Category=serialized_category)
+            'Items': serialized_items,
+            'Next': next_url}
+        response = jsonify(Category=serialized_category)
+        if next_url:
+            response.headers['Link'] = f'<{next_url}>; rel="next"'
+        return response
     else:
         return jsonify({'message': "No category found with name "
                                    "{}.".format(category)}), 404
 
 
-@app.route('/catalog/<string:category>/<string:item_id>.json')
+@catalog.route('/catalog/<string:category>/<string:item_id>.json')
+@query_budget(2)
+@conditional(item_state)
 def item_in_category_json(category, item_id):
-    item = get_item_from_db(item_id)
-    if item:
-        if item.category != category:
+    row = get_item_row_from_db(item_id)
+    if row:
+        if category not in (row.category_slug, row.category):
             return jsonify({'message': "The item you requested was not found "
                                        "in category {}.".format(category)}), \
                    404
         else:
-            return jsonify(Item=item.serialize)
+            return jsonify(Item=serialize_item(row))
     else:
         return jsonify({'message': "No item found with id "
                                    "{}.".format(item_id)}), 404
 
 
+@catalog.route('/catalog/search.json')
+@query_budget(2)
+@conditional(catalog_state)
+def search_json():
+    try:
+        query, results = get_search_results()
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    if not query:
+        return jsonify({'message': "Nothing to search for; pass the search "
+                                   "terms as q."}), 400
+    serialized_results = []
+    for result in results:
+        serialized_results.append({
+            'id': result.id,
+            'name': result.name,
+            'category': result.category,
+            'snippet': str(highlight(result.snippet))})
+    return jsonify(Search={'Query': query, 'Items': serialized_results})
+
+
+'''
+## Statistics
+'''
+
+
+@catalog.route('/stats/page-cache.json')
+@query_budget(0)
+def page_cache_stats():
+    cache = current_app.extensions.get('page_cache')
+    return jsonify(PageCache=cache.stats() if cache else None)
+
+
+@catalog.route('/stats/compression.json')
+@query_budget(0)
+def compression_stats():
+    compression = current_app.extensions.get('compression')
+    return jsonify(Compression=compression.stats() if compression else None)
+
+
+@catalog.route('/stats/providers.json')
+@query_budget(0)
+def provider_stats():
+    # latency of the calls to the sign-in providers, by call
+    return jsonify(Providers=current_app.extensions['provider_client'].stats())
+
+
+@catalog.route('/stats/revocations.json')
+@query_budget(1)
+def revocation_stats():
+    # depth of the token revocation queue and the worker's counters
+    return jsonify(
+        Revocations=current_app.extensions['revocation_worker'].stats())
+
+
+@catalog.route('/metrics')
+@query_budget(2)
+def metrics():
+    # the metrics of this process in the Prometheus text format
+    return Response(current_app.extensions['metrics'].registry.render(),
+                    content_type=METRICS_CONTENT_TYPE)
+
+
 '''
 # AUTHENTICATION AND AUTHORIZATION
   It is possible to sign in with either Google or Facebook.
@@ -317,7 +602,32 @@ def item_in_category_json(category, item_id):
 '''
 
 
-@app.route('/login')
+def get_provider_secrets(provider, provider_name):
+    # loaded when the application is created, see provider_secrets.py
+    secrets = current_app.extensions['provider_secrets']
+    secrets.check()
+    client_info = secrets.get(provider)
+    if client_info is None:
+        abort(503, description=f"Sign-in with {provider_name} is not "
+                               f"configured.")
+    return client_info
+
+
+def provider_sign_in(view):
+    """
+    Let the view talk to the sign-in providers only while it holds one of
+    the few sign-in slots of the process (see provider_client.py), so that
+    slow providers cannot block all threads that serve the catalog.
+    """
+    @wraps(view)
+    def decorated_view(*args, **kwargs):
+        with current_app.extensions['provider_client'].sign_in_slot():
+            return view(*args, **kwargs)
+    return decorated_view
+
+
+@catalog.route('/login')
+@query_budget(0)
 def login():
     if login_session.get('provider'):
         # current user is already logged in
@@ -331,7 +641,9 @@ def login():
     return render_template('login.html', state=state)
 
 
-@app.route('/gconnect', methods=['POST'])
+@catalog.route('/gconnect', methods=['POST'])
+@query_budget(0)
+@provider_sign_in
 def google_connect():
     """
     Code of this function adapted from the code provided by Udacity instructor
@@ -345,22 +657,36 @@ def google_connect():
     # Obtain authorization code
     code = request.data
 
-    # Upgrade the authorization code into a credentials object
+    # Upgrade the authorization code into a credentials object; the OAuth
+    # library is imported by the first sign-in with Google, not at startup
+    from oauth2client.client import OAuth2WebServerFlow, FlowExchangeError
+
+    google = get_provider_secrets('google', 'Google')
+    client = current_app.extensions['provider_client']
     try:
-        oauth_flow = flow_from_clientsecrets('client_secrets.json', scope='')
-        oauth_flow.redirect_uri = 'postmessage'
-        credentials = oauth_flow.step2_exchange(code)
+        oauth_flow = OAuth2WebServerFlow(google['client_id'],
+                                         google['client_secret'], scope='',
+                                         redirect_uri='postmessage',
+                                         auth_uri=google['auth_uri'],
+                                         token_uri=google['token_uri'])
+        credentials = oauth_flow.step2_exchange(
+            code, http=client.httplib2_request('google.token'))
     except FlowExchangeError:
         abort(401, description="Login failed. Failed to upgrade the "
                                "authorization code.")
 
-    # Check that the access token is valid
+    # Check that the access token is valid and get the user info at the
+    # same time; the user info is only used if the token is valid
     access_token = credentials.access_token
-    url = (
-        f'https://www.googleapis.com/oauth2/v1/'
-        f'tokeninfo?access_token={access_token}')
-    h = httplib2.Http()
-    result = json.loads(h.request(url, 'GET')[1])
+    google_api_url = current_app.config['GOOGLE_API_URL']
+    result, data = client.run_concurrently(
+        lambda: client.get_json('google.tokeninfo',
+                                f'{google_api_url}/oauth2/v1/tokeninfo',
+                                params={'access_token': access_token}),
+        lambda: client.get_json('google.userinfo',
+                                f'{google_api_url}/oauth2/v1/userinfo',
+                                params={'access_token': access_token,
+                                        'alt': 'json'}))
 
     # If there was an error in the access token info, abort
     if result.get('error'):
@@ -373,8 +699,7 @@ def google_connect():
                                "match given user ID.")
 
     # Verify that the access token is valid for this app
-    if result['issued_to'] != json.loads(open('client_secrets.json',
-                                              'r').read())['web']['client_id']:
+    if result['issued_to'] != google['client_id']:
         abort(401, description="Login failed. Token's client ID does not "
                                "match app's.")
 
@@ -390,12 +715,6 @@ def google_connect():
     login_session['access_token'] = credentials.access_token
     login_session['gplus_id'] = gplus_id
 
-    # Get user info
-    user_info_url = "https://www.googleapis.com/oauth2/v1/userinfo"
-    params = {'access_token': credentials.access_token, 'alt': 'json'}
-    answer = requests.get(user_info_url, params=params)
-    data = answer.json()
-
     # Store user data
     login_session['provider'] = 'google'
     login_session['username'] = data['name']
@@ -409,7 +728,9 @@ def google_connect():
                                 'picture': login_session["picture"]}}), 200
 
 
-@app.route('/fbconnect', methods=['POST'])
+@catalog.route('/fbconnect', methods=['POST'])
+@query_budget(0)
+@provider_sign_in
 def facebook_connect():
     """
     Code of this function adapted from the code provided by Udacity instructor
@@ -425,27 +746,29 @@ def facebook_connect():
     access_token = access_token_byte.decode("utf-8")
 
     # Exchange client token for long-lived server-side token
-    app_id = json.loads(open('fb_client_secrets.json', 'r').
-                        read())['web']['app_id']
-    app_secret = json.loads(open('fb_client_secrets.json', 'r')
-                            .read())['web']['app_secret']
-    url = 'https://graph.facebook.com/oauth/access_token?' \
-          'grant_type=fb_exchange_token&' \
-          f'client_id={app_id}&' \
-          f'client_secret={app_secret}&' \
-          f'fb_exchange_token={access_token}'
-    result = httplib2.Http().request(url, 'GET')[1]
-    token = json.loads(result.decode("utf-8"))["access_token"]
+    facebook = get_provider_secrets('facebook', 'Facebook')
+    client = current_app.extensions['provider_client']
+    graph_url = current_app.config['FACEBOOK_GRAPH_URL']
+    result = client.get_json('facebook.access_token',
+                             f'{graph_url}/oauth/access_token',
+                             params={'grant_type': 'fb_exchange_token',
+                                     'client_id': facebook['app_id'],
+                                     'client_secret': facebook['app_secret'],
+                                     'fb_exchange_token': access_token})
+    token = result["access_token"]
 
     # Store the access token in the session for later use
     login_session['access_token'] = token
 
-    # Get user info
-    url = 'https://graph.facebook.com/v2.8/me?' \
-          f'access_token={token}&' \
-          'fields=name,id,email'
-    result = httplib2.Http().request(url, 'GET')[1]
-    user_info = json.loads(result.decode("utf-8"))
+    # Get user info and picture at the same time
+    user_info, data = client.run_concurrently(
+        lambda: client.get_json('facebook.me', f'{graph_url}/v2.8/me',
+                                params={'access_token': token,
+                                        'fields': 'name,id,email'}),
+        lambda: client.get_json('facebook.picture',
+                                f'{graph_url}/v2.8/me/picture',
+                                params={'access_token': token, 'redirect': 0,
+                                        'height': 200, 'width': 200}))
 
     # Check if current user is already signed in
     stored_access_token = login_session.get('access_token')
@@ -455,15 +778,6 @@ def facebook_connect():
         # -> return "old_user" so the frontend can show an appropriate message
         return jsonify({'status': 'old_user', 'content': ''}), 200
 
-    # Get user picture
-    url = 'https://graph.facebook.com/v2.8/me/picture?' \
-          f'access_token={token}&' \
-          'redirect=0&' \
-          'height=200&' \
-          'width=200'
-    result = httplib2.Http().request(url, 'GET')[1]
-    data = json.loads(result)
-
     # Store user data
     login_session['provider'] = 'facebook'
     login_session['username'] = user_info["name"]
@@ -478,7 +792,8 @@ def facebook_connect():
                                 'picture': login_session["picture"]}}), 200
 
 
-@app.route('/is_user_connected')
+@catalog.route('/is_user_connected')
+@query_budget(0)
 def check_if_user_connected():
     if login_session.get('provider') is None:
         return jsonify({'status': 'no_user_connected', 'content': ''})
@@ -492,65 +807,113 @@ def check_if_user_connected():
 '''
 
 
-@app.route('/disconnect')
+# everything a sign-in stores in the login session, see above
+LOGIN_SESSION_KEYS = ['provider', 'access_token', 'gplus_id', 'facebook_id',
+                      'username', 'email', 'picture']
+
+
+@catalog.route('/disconnect')
+@query_budget(3)
 def sign_out():
     session_provider = login_session.get('provider')
-    if session_provider == 'google':
-        return google_disconnect()
-    elif session_provider == 'facebook':
-        return facebook_disconnect()
-    elif session_provider is None:
+    access_token = login_session.get('access_token')
+    if session_provider is None or access_token is None:
         return render_template('logout.html',
                                result='Current user not connected.')
-    else:
+    elif session_provider not in ('google', 'facebook'):
         abort(500, description="An error occurred during sign-out. "
-                               f"Session provider unknown.")
+                               "Session provider unknown.")
+    # The user is signed out right away; the token is revoked with the
+    # provider in the background (see token_revocation.py).
+    account_id = login_session.get('facebook_id')
+    for key in LOGIN_SESSION_KEYS:
+        login_session.pop(key, None)
+    add_token_revocation_to_db(session_provider, access_token, account_id)
+    current_app.extensions['revocation_worker'].notify()
+    return render_template('logout.html',
+                           result='You have been successfully '
+                                  'disconnected.')
 
 
-def google_disconnect():
-    access_token = login_session.get('access_token')
-    if access_token is None:
-        return render_template('logout.html',
-                               result='Current user not connected.')
-    url = 'https://accounts.google.com/o/oauth2/revoke?token=' \
-          '{}'.format(login_session['access_token'])
-    result = httplib2.Http().request(url, 'GET')[0]
-    if result['status'] == '200':
-        del login_session['provider']
-        del login_session['access_token']
-        del login_session['gplus_id']
-        del login_session['username']
-        del login_session['email']
-        del login_session['picture']
-        return render_template('logout.html',
-                               result='You have been successfully '
-                                      'disconnected.')
-    else:
-        abort(500, 'Failed to revoke token for given user.')
+'''
+# APPLICATION FACTORY
+'''
 
 
-def facebook_disconnect():
-    access_token = login_session.get('access_token')
-    if access_token is None:
-        return render_template('logout.html',
-                               result='Current user not connected.')
-    facebook_id = login_session.get('facebook_id')
-    url = 'https://graph.facebook.com/{}/permissions?access_token=' \
-          '{}'.format(facebook_id, access_token)
-    result = httplib2.Http().request(url, 'DELETE')[1]
-    data = json.loads(result)
-    if data['success'] is True:
-        del login_session['provider']
-        del login_session['access_token']
-        del login_session['facebook_id']
-        del login_session['username']
-        del login_session['email']
-        del login_session['picture']
-        return render_template('logout.html',
-                               result='You have been successfully '
-                                      'disconnected.')
+def create_app(config=None):
+    """
+    Create the catalog application.
+
+    The defaults in config.Config (read from the environment) can be
+    overridden by passing a dictionary or an object as config. Every
+    application has its own engines (app.extensions['database']), so several
+    applications in one process can use different databases.
+    """
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    if isinstance(config, dict):
+        app.config.from_mapping(config)
+    elif config is not None:
+        app.config.from_object(config)
+
+    if not app.config['SECRET_KEY']:
+        app.logger.warning("No CATALOG_SECRET_KEY configured; using a random "
+                           "key. Logins will not be shared between worker "
+                           "processes and will not survive a restart.")
+        app.config['SECRET_KEY'] = os.urandom(16)
+
+    engine = init_db(app)
+    app.extensions['json_provider'] = init_json(app)
+    app.extensions['category_registry'] = CategoryRegistry(CATEGORIES_TAG)
+    if app.config['PAGE_CACHE_MAX_BYTES']:
+        app.extensions['page_cache'] = PageCache(
+            app.config['PAGE_CACHE_MAX_BYTES'])
+    app.extensions['provider_secrets'] = ProviderSecrets(
+        {'google': os.path.join(app.root_path,
+                                app.config['GOOGLE_CLIENT_SECRETS']),
+         'facebook': os.path.join(app.root_path,
+                                  app.config['FACEBOOK_CLIENT_SECRETS'])},
+        app.config['CLIENT_SECRETS_CHECK_INTERVAL'])
+    if app.config['RELOAD_CLIENT_SECRETS_ON_SIGHUP']:
+        app.extensions['provider_secrets'].reload_on_sighup()
+    app.extensions['provider_client'] = ProviderClient(
+        pool_size=app.config['PROVIDER_POOL_SIZE'],
+        connect_timeout=app.config['PROVIDER_CONNECT_TIMEOUT'],
+        read_timeout=app.config['PROVIDER_READ_TIMEOUT'],
+        retries=app.config['PROVIDER_RETRIES'],
+        max_workers=app.config['PROVIDER_WORKERS'],
+        max_sign_ins=app.config['PROVIDER_MAX_SIGN_INS'],
+        sign_in_timeout=app.config['PROVIDER_SIGN_IN_TIMEOUT'])
+    app.extensions['revocation_worker'] = RevocationWorker(
+        engine, app.extensions['provider_client'], app.config,
+        poll_interval=app.config['REVOCATION_POLL_INTERVAL'],
+        max_attempts=app.config['REVOCATION_MAX_ATTEMPTS'],
+        backoff=app.config['REVOCATION_BACKOFF'])
+    # started in the process that serves the requests, also after a fork;
+    # works off what is left in the queue from before a restart
+    app.before_first_request(app.extensions['revocation_worker'].notify)
+    app.extensions['static_assets'] = StaticAssets(app)
+    if app.config['COMPRESSION']:
+        app.extensions['compression'] = Compression(app)
+    app.extensions['metrics'] = init_metrics(app)
+    app.extensions['query_budgets'] = QueryBudgets(app)
+
+    app.register_error_handler(Exception, handle_error)
+    app.register_error_handler(ProviderError, handle_provider_error)
+    app.register_error_handler(ProviderBusy, handle_provider_busy)
+    app.teardown_appcontext(remove_db_session)
+    app.register_blueprint(catalog)
+    app.cli.add_command(catalog_cli)
+
+    # the database is created and upgraded by `flask catalog init-db`, not
+    # by every process that starts
+    if get_schema_version() == SCHEMA_VERSION:
+        with app.app_context():
+            get_categories()
     else:
-        abort(500, 'Failed to revoke token for given user.')
+        app.logger.warning("The database is not set up for this version of "
+                           "the application. Run `flask catalog init-db`.")
+    return app
 
 
 '''
@@ -558,5 +921,8 @@ def facebook_disconnect():
 '''
 
 if __name__ == '__main__':
+    app = create_app()
+    # the development server sets up the database itself
+    setup_db(report=app.logger.warning)
     app.debug = True
     app.run(host='localhost', port=5000)
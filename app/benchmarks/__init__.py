@@ -0,0 +1,9 @@
+"""
+Benchmarks for Elisabeth's Sports Item Catalog
+
+Run from the app directory:
+
+    python -m benchmarks.generate bench.db --items 100000 --categories 200
+    python -m benchmarks.routes bench.db --output baseline.json
+    python -m benchmarks.routes bench.db --compare baseline.json
+"""
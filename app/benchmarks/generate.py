@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Synthetic catalog generator for Elisabeth's Sports Item Catalog
+
+Creates a new database file and fills it with a catalog of the requested
+size. The same seed always produces the same catalog, so benchmark results
+of different runs and versions can be compared.
+
+    python -m benchmarks.generate bench.db --items 1000000 --categories 500
+"""
+
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+
+from sqlalchemy import create_engine
+
+from database.database_setup import create_database
+from database.migrations import upgrade_database
+from database.bulk import insert_categories, insert_items
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+SPORTS = ['Soccer', 'Basketball', 'Baseball', 'Snowboarding', 'Climbing',
+          'Skating', 'Hockey', 'Tennis', 'Golf', 'Running', 'Cycling',
+          'Swimming', 'Rowing', 'Skiing', 'Volleyball', 'Handball',
+          'Badminton', 'Surfing', 'Sailing', 'Boxing']
+SEGMENTS = ['Junior', 'Women', 'Men', 'Pro', 'Outdoor', 'Indoor', 'Training',
+            'Competition', 'Vintage', 'Kids']
+BRANDS = ['Nike', 'Adidas', 'Puma', 'Bauer', 'CCM', 'Burton', 'Wilson',
+          'Spalding', 'Rawlings', 'Salomon', 'Head', 'Asics']
+PRODUCTS = ['Ball', 'Shoe', 'Glove', 'Helmet', 'Jersey', 'Board', 'Racket',
+            'Bag', 'Bottle', 'Jacket', 'Sock', 'Stick', 'Skate', 'Harness']
+COLORS = ['black', 'white', 'red', 'blue', 'green', 'volt', 'grey', 'gold']
+WORDS = ['lightweight', 'durable', 'comfortable', 'grip', 'control',
+         'performance', 'breathable', 'cushioning', 'protection', 'fit',
+         'design', 'training', 'match', 'season', 'warranty', 'precision']
+
+
+def category_names(count, rng):
+    names = [f'{sport} {segment}' for sport in SPORTS for segment in SEGMENTS]
+    rng.shuffle(names)
+    if count > len(names):
+        names += [f'Category {number}'
+                  for number in range(len(names), count)]
+    return names[:count]
+
+
+def generate_items(count, categories, rng):
+    now = datetime.datetime.now()
+    for _ in range(count):
+        description = ' '.join(rng.choice(WORDS)
+                               for _ in range(rng.randint(8, 30)))
+        yield {'name': f'{rng.choice(BRANDS)} {rng.choice(PRODUCTS)} '
+                       f'{rng.randint(1, 999)} {rng.choice(COLORS)}',
+               'description': description.capitalize()[:250],
+               'category': rng.choice(categories),
+               'last_modified': now - datetime.timedelta(
+                   seconds=rng.randint(0, 3 * 365 * 24 * 3600),
+                   microseconds=rng.randint(0, 999999))}
+
+
+def generate_catalog(path, items, categories, seed=1, batch_size=10000,
+                     report=None):
+    if os.path.exists(path):
+        raise ValueError("'{}' already exists.".format(path))
+    rng = random.Random(seed)
+    engine = create_engine('sqlite:///' + path)
+    create_database(engine)
+    upgrade_database(engine)
+    names = category_names(categories, rng)
+    with engine.begin() as connection:
+        insert_categories(connection, names)
+    batch = []
+    done = 0
+    for item in generate_items(items, names, rng):
+        batch.append(item)
+        if len(batch) == batch_size:
+            with engine.begin() as connection:
+                insert_items(connection, batch)
+            done += len(batch)
+            batch = []
+            if report:
+                report(done)
+    if batch:
+        with engine.begin() as connection:
+            insert_items(connection, batch)
+    engine.dispose()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Create a database with a synthetic catalog.")
+    parser.add_argument('path', help="database file to create")
+    parser.add_argument('--items', type=int, default=100000)
+    parser.add_argument('--categories', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    started = time.monotonic()
+    try:
+        generate_catalog(args.path, args.items, args.categories, args.seed,
+                         report=lambda done: print(f"{done} items",
+                                                   file=sys.stderr))
+    except ValueError as e:
+        sys.exit(str(e))
+    print(f"Created {args.path} with {args.items} items in "
+          f"{args.categories} categories in "
+          f"{time.monotonic() - started:.1f} s.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+JSON encoding benchmark for Elisabeth's Sports Item Catalog
+
+Builds the document of /catalog.json from a database created by
+benchmarks.generate in three ways and reports the median time of the query,
+of building the dictionaries, of encoding them and in total:
+  *  orm+flask    ORM objects and Items.serialize, encoded by flask.json
+                  (how the endpoint worked before json_provider.py)
+  *  rows+flask   column rows (serializers.py), encoded by flask.json
+  *  rows+orjson  column rows, encoded by orjson (if it is installed)
+All variants must produce the same document. Finally /catalog.json is
+requested through the test client with each JSON provider.
+
+    python -m benchmarks.json_encoding bench.db --repeat 5
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from itertools import groupby
+from operator import itemgetter
+
+from flask import json
+from sqlalchemy.orm import contains_eager
+
+from application import create_app
+from database import database_access
+from database.database_setup import Categories, Items
+from json_provider import JSONProvider, OrjsonProvider, orjson
+from serializers import serialize_catalog
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+def query_orm():
+    return database_access.session.query(Categories, Items) \
+        .outerjoin(Items, Items.category_id == Categories.id) \
+        .options(contains_eager(Items.categories)) \
+        .order_by(Categories.name, Items.last_modified, Items.id).all()
+
+
+def serialize_orm(rows):
+    serialized_catalog = {}
+    for category, category_rows in groupby(rows, key=itemgetter(0)):
+        serialized_catalog[category.name] = {
+            'Items': [item.serialize for _, item in category_rows
+                      if item is not None]
+        }
+    return serialized_catalog
+
+
+def query_rows():
+    return database_access.get_catalog_rows_from_db().fetchall()
+
+
+def run_variant(app, query, serialize, provider, repeat):
+    """Return the median seconds per step and the encoded document."""
+    timings = {'query': [], 'serialize': [], 'encode': [], 'total': []}
+    for _ in range(repeat):
+        with app.app_context():
+            started = time.perf_counter()
+            rows = query()
+            queried = time.perf_counter()
+            document = {'Catalog': serialize(rows)}
+            serialized = time.perf_counter()
+            encoded = provider.dumps(document)
+            finished = time.perf_counter()
+            database_access.session.remove()
+        timings['query'].append(queried - started)
+        timings['serialize'].append(serialized - queried)
+        timings['encode'].append(finished - serialized)
+        timings['total'].append(finished - started)
+        del rows, document
+    return {step: statistics.median(values)
+            for step, values in timings.items()}, encoded
+
+
+def time_endpoint(app, provider, repeat):
+    app.extensions['json_provider'] = provider
+    client = app.test_client()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get('/catalog.json')
+        response.get_data()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), len(response.get_data())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compare the ways to build and encode /catalog.json.")
+    parser.add_argument('database', help="database created by "
+                                         "benchmarks.generate")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.database):
+        sys.exit("'{}' does not exist; create it with "
+                 "benchmarks.generate.".format(args.database))
+    app = create_app({'DATABASE_URL': 'sqlite:///' + args.database,
+                      'SECRET_KEY': 'benchmark',
+                      'PAGE_CACHE_MAX_BYTES': 0})
+    providers = [JSONProvider(app)]
+    if orjson is not None:
+        providers.append(OrjsonProvider(app))
+    variants = [('orm+flask', query_orm, serialize_orm, providers[0])] + \
+        [(f'rows+{provider.name}', query_rows, serialize_catalog, provider)
+         for provider in providers]
+
+    with app.app_context():
+        items = database_access.session.query(Items).count()
+    print(f"/catalog.json with {items} items, median of {args.repeat} "
+          f"runs (ms):")
+    print(f"{'variant':<14}{'query':>9}{'build':>9}{'encode':>9}"
+          f"{'total':>9}")
+    documents = []
+    for name, query, serialize, provider in variants:
+        timings, encoded = run_variant(app, query, serialize, provider,
+                                       args.repeat)
+        documents.append(json.loads(encoded))
+        print(f"{name:<14}{timings['query'] * 1000:>9.0f}"
+              f"{timings['serialize'] * 1000:>9.0f}"
+              f"{timings['encode'] * 1000:>9.0f}"
+              f"{timings['total'] * 1000:>9.0f}")
+    if any(document != documents[0] for document in documents[1:]):
+        sys.exit("The variants produced different documents.")
+
+    print(f"\n{'provider':<14}{'GET ms':>9}{'bytes':>12}")
+    for provider in providers:
+        seconds, size = time_endpoint(app, provider, args.repeat)
+        print(f"{provider.name:<14}{seconds * 1000:>9.0f}{size:>12}")
+
+
+if __name__ == '__main__':
+    main()
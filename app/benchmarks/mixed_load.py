@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Mixed read/write benchmark for Elisabeth's Sports Item Catalog
+
+Runs reader processes that request category lists and items, first alone
+and then while writer processes edit items, and compares the read
+throughput of both phases. Every process creates its own application, like
+the worker processes of a pre-forking server. The page cache is disabled
+unless --page-cache is given, so every read reaches the database.
+
+    python -m benchmarks.mixed_load bench.db --readers 4 --writers 1
+    python -m benchmarks.mixed_load bench.db --journal-mode DELETE
+
+With --journal-mode DELETE (SQLite's default) a writer blocks all readers
+while it commits; with WAL (the application's default) readers continue.
+Run it on a machine with at least as many cores as processes; otherwise the
+writers also take CPU time away from the readers.
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+from application import create_app
+from benchmarks.routes import RouteBenchmark, percentile
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+READ_ROUTES = ['category_json', 'item', 'item_json']
+WRITE_ROUTES = ['edit_item']
+
+
+def run_client(writing, config, seconds, seed, start, results):
+    routes = WRITE_ROUTES if writing else READ_ROUTES
+    timings = []
+    errors = 0
+    try:
+        benchmark = RouteBenchmark(create_app(config), seed)
+        start.wait()
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            name = routes[len(timings) % len(routes)]
+            method, url, data = benchmark.request(name)
+            started = time.perf_counter()
+            try:
+                response = benchmark.client.open(url, method=method,
+                                                 data=data)
+                response.get_data()
+                if response.status_code >= 500:
+                    errors += 1
+            except Exception:
+                errors += 1
+            timings.append(time.perf_counter() - started)
+    finally:
+        # also report a client that failed to start, or the phase never ends
+        results.put((writing, timings, errors))
+
+
+def run_phase(config, readers, writers, seconds, seed):
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    start = context.Event()
+    processes = [
+        context.Process(target=run_client,
+                        args=(number >= readers, config, seconds,
+                              seed + number, start, results))
+        for number in range(readers + writers)]
+    for process in processes:
+        process.start()
+    # let every process create its application before the clock starts
+    time.sleep(2 + 0.2 * len(processes))
+    start.set()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    phase = {}
+    for kind, writing in (('reads', False), ('writes', True)):
+        timings = sorted(t for is_writer, client_timings, _ in collected
+                         if is_writer == writing for t in client_timings)
+        phase[kind] = {
+            'per_second': len(timings) / seconds,
+            'p50_ms': percentile(timings, 0.5) * 1000 if timings else 0.0,
+            'p99_ms': percentile(timings, 0.99) * 1000 if timings else 0.0,
+            'errors': sum(errors for is_writer, _, errors in collected
+                          if is_writer == writing)}
+    return phase
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Measure read throughput with and without concurrent "
+                    "writes.")
+    parser.add_argument('database', help="database created by "
+                                         "benchmarks.generate")
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=1)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--journal-mode', default='WAL',
+                        choices=['WAL', 'DELETE'])
+    parser.add_argument('--page-cache', action='store_true')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.database):
+        sys.exit("'{}' does not exist; create it with "
+                 "benchmarks.generate.".format(args.database))
+    config = {'DATABASE_URL': 'sqlite:///' + os.path.abspath(args.database),
+              'SECRET_KEY': 'benchmark',
+              'DB_JOURNAL_MODE': args.journal_mode}
+    if not args.page_cache:
+        config['PAGE_CACHE_MAX_BYTES'] = 0
+    # switch the journal mode now: that needs the database to itself, and
+    # the writer connection switches it when it connects
+    engine, read_engine = create_app(config).extensions['database']
+    read_engine.dispose()
+    engine.connect().close()
+
+    print(f"{'phase':<16}{'reads/s':>10}{'read p99 ms':>13}"
+          f"{'writes/s':>10}{'write p99 ms':>14}{'errors':>8}")
+    for label, writers in (('reads only', 0),
+                           ('reads + writes', args.writers)):
+        phase = run_phase(config, args.readers, writers, args.seconds,
+                          args.seed)
+        reads, writes = phase['reads'], phase['writes']
+        print(f"{label:<16}{reads['per_second']:>10.1f}"
+              f"{reads['p99_ms']:>13.2f}{writes['per_second']:>10.1f}"
+              f"{writes['p99_ms']:>14.2f}"
+              f"{reads['errors'] + writes['errors']:>8}")
+
+
+if __name__ == '__main__':
+    main()
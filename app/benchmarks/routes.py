@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Route benchmark for Elisabeth's Sports Item Catalog
+
+Drives every route through the Flask test client against a database created
+by benchmarks.generate and reports p50/p99 latency, requests per second and
+the peak resident set size of the process. The write routes run with a
+stubbed login session. Results can be saved as a JSON baseline and compared
+with a later run:
+
+    python -m benchmarks.routes bench.db --output baseline.json
+    python -m benchmarks.routes bench.db --compare baseline.json
+
+The comparison fails (exit code 1) if the p50 latency of a route got worse
+by more than --tolerance percent.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import time
+
+import sqlalchemy
+
+from application import create_app
+from benchmarks.generate import BRANDS, PRODUCTS
+from database import database_access
+from database.database_setup import Categories, Items
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+# Requests of a route per run are requests * weight; /catalog.json returns
+# the whole catalog and therefore runs less often.
+ROUTES = [
+    # (name, method, weight)
+    ('index', 'GET', 1),
+    ('category', 'GET', 1),
+    ('item', 'GET', 1),
+    ('index_json', 'GET', 0.05),
+    ('category_json', 'GET', 1),
+    ('item_json', 'GET', 1),
+    ('search', 'GET', 1),
+    ('search_json', 'GET', 1),
+    ('add_item', 'POST', 0.25),
+    ('edit_item', 'POST', 0.25),
+    ('delete_item', 'POST', 0.25),
+]
+
+
+def peak_rss_mb():
+    # ru_maxrss is given in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1,
+                int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class RouteBenchmark(object):
+    def __init__(self, app, seed=1):
+        self.app = app
+        self.rng = random.Random(seed)
+        self.client = app.test_client()
+        with self.client.session_transaction() as login_session:
+            login_session['provider'] = 'benchmark'
+            login_session['username'] = 'Benchmark'
+        with app.app_context():
+            rows = database_access.session.query(Items.id, Categories.slug) \
+                .join(Items.categories) \
+                .order_by(sqlalchemy.func.random()).limit(1000).all()
+            self.categories = [c.slug for c in
+                               app.extensions['category_registry']]
+        self.items = [(item_id, category) for item_id, category in rows]
+        self.added_ids = []
+
+    def request(self, name):
+        """Return (method, url, form data) for one request of route name."""
+        item_id, category = self.rng.choice(self.items)
+        if name == 'index':
+            return 'GET', '/', None
+        if name == 'category':
+            return 'GET', f'/catalog/{self.rng.choice(self.categories)}', \
+                None
+        if name == 'item':
+            return 'GET', f'/catalog/{category}/{item_id}', None
+        if name == 'index_json':
+            return 'GET', '/catalog.json', None
+        if name == 'category_json':
+            return 'GET', \
+                f'/catalog/{self.rng.choice(self.categories)}.json', None
+        if name == 'item_json':
+            return 'GET', f'/catalog/{category}/{item_id}.json', None
+        if name in ('search', 'search_json'):
+            path = '/catalog/search' if name == 'search' \
+                else '/catalog/search.json'
+            return 'GET', f'{path}?q={self.rng.choice(BRANDS)}+' \
+                          f'{self.rng.choice(PRODUCTS)[:3]}', None
+        if name == 'add_item':
+            return 'POST', '/catalog/add', {
+                'name': f'Benchmark item {self.rng.randint(1, 10 ** 6)}',
+                'description': 'Added by the route benchmark.',
+                'category': self.rng.choice(self.categories)}
+        if name == 'edit_item':
+            return 'POST', f'/catalog/{item_id}/edit', {
+                'name': '', 'category': '',
+                'description': f'Edited {self.rng.randint(1, 10 ** 6)}'}
+        if name == 'delete_item':
+            # delete the items added before, so the catalog keeps its size
+            return 'POST', f'/catalog/{self.added_ids.pop()}/delete', None
+        raise ValueError(name)
+
+    def run_route(self, name, count, warmup=3):
+        timings = []
+        status_codes = {}
+        for number in range(warmup + count):
+            if name == 'delete_item' and not self.added_ids:
+                break
+            method, url, data = self.request(name)
+            started = time.perf_counter()
+            response = self.client.open(url, method=method, data=data)
+            response.get_data()
+            elapsed = time.perf_counter() - started
+            if name == 'add_item' and response.status_code == 302:
+                self.added_ids.append(
+                    response.headers['Location'].rstrip('/').split('/')[-1])
+            if number >= warmup:
+                timings.append(elapsed)
+                status = str(response.status_code)
+                status_codes[status] = status_codes.get(status, 0) + 1
+        timings.sort()
+        return {'requests': len(timings),
+                'p50_ms': percentile(timings, 0.50) * 1000,
+                'p99_ms': percentile(timings, 0.99) * 1000,
+                'requests_per_second': len(timings) / sum(timings),
+                'peak_rss_mb': peak_rss_mb(),
+                'status_codes': status_codes}
+
+    def run(self, requests, routes=None):
+        results = {}
+        for name, method, weight in ROUTES:
+            if routes and name not in routes:
+                continue
+            results[name] = self.run_route(
+                name, max(1, int(requests * weight)))
+        return results
+
+
+def run_benchmark(database, requests=200, seed=1, page_cache=True,
+                  routes=None):
+    config = {'DATABASE_URL': 'sqlite:///' + database,
+              'SECRET_KEY': 'benchmark'}
+    if not page_cache:
+        config['PAGE_CACHE_MAX_BYTES'] = 0
+    app = create_app(config)
+    with app.app_context():
+        items = database_access.session.query(Items).count()
+        categories = len(app.extensions['category_registry'])
+    results = RouteBenchmark(app, seed).run(requests, routes)
+    return {'meta': {'database': os.path.basename(database),
+                     'items': items,
+                     'categories': categories,
+                     'requests': requests,
+                     'seed': seed,
+                     'page_cache': page_cache,
+                     'python': platform.python_version(),
+                     'sqlalchemy': sqlalchemy.__version__,
+                     'date': datetime.datetime.now().isoformat()},
+            'routes': results}
+
+
+def compare(results, baseline, tolerance):
+    """Print a comparison and return the names of routes that regressed."""
+    regressions = []
+    print(f"{'route':<15}{'p50 ms':>10}{'base':>10}{'change':>9}"
+          f"{'p99 ms':>10}{'req/s':>10}")
+    for name, result in results['routes'].items():
+        base = baseline['routes'].get(name)
+        if base is None:
+            continue
+        change = (result['p50_ms'] / base['p50_ms'] - 1) * 100 \
+            if base['p50_ms'] else 0.0
+        print(f"{name:<15}{result['p50_ms']:>10.2f}{base['p50_ms']:>10.2f}"
+              f"{change:>8.1f}%{result['p99_ms']:>10.2f}"
+              f"{result['requests_per_second']:>10.1f}")
+        if change > tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark all routes against a generated catalog.")
+    parser.add_argument('database', help="database created by "
+                                         "benchmarks.generate")
+    parser.add_argument('--requests', type=int, default=200,
+                        help="requests per route (scaled by route weight)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--route', action='append', dest='routes',
+                        help="only run this route (repeatable)")
+    parser.add_argument('--no-page-cache', action='store_true')
+    parser.add_argument('--output', help="save the results as JSON")
+    parser.add_argument('--compare', help="JSON results of an earlier run")
+    parser.add_argument('--tolerance', type=float, default=20.0,
+                        help="allowed p50 regression in percent")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.database):
+        sys.exit("'{}' does not exist; create it with "
+                 "benchmarks.generate.".format(args.database))
+    results = run_benchmark(args.database, args.requests, args.seed,
+                            not args.no_page_cache, args.routes)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            sys.exit("Regressions: " + ", ".join(regressions))
+
+
+if __name__ == '__main__':
+    main()
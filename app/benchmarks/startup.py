@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for Elisabeth's Sports Item Catalog
+
+Measures what a new worker process costs before it can serve requests:
+  *  the time Python needs to import application.py, taken from
+     `python -X importtime` in a fresh interpreter, with the slowest modules
+     it imports directly
+  *  the time from starting a process that serves the application with the
+     werkzeug server until it answers GET / with 200 (interpreter start,
+     imports, create_app() and the first request)
+Each is measured --repeat times in new processes; the medians are compared
+with budgets, and the benchmark fails (exit code 1) if one is exceeded. The
+database must have been set up before (benchmarks.generate or
+`flask catalog init-db`):
+
+    python -m benchmarks.startup bench.db --repeat 5
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+APP_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVE = """
+from werkzeug.serving import make_server
+from application import create_app
+make_server('127.0.0.1', {port}, create_app()).serve_forever()
+"""
+
+
+def child_environment(database):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = APP_FOLDER
+    env['CATALOG_DATABASE_URL'] = 'sqlite:///' + os.path.abspath(database)
+    env['CATALOG_SECRET_KEY'] = 'benchmark'
+    return env
+
+
+def parse_importtime(output, module):
+    """
+    Return the cumulative import time of module in seconds and the
+    (seconds, name) of the modules it imports directly, slowest first.
+    """
+    children = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        seconds = int(cumulative) / 1e6
+        # the modules are listed after the modules they import
+        if depth == 1:
+            children.append((seconds, name.strip()))
+        elif depth == 0:
+            if name.strip() == module:
+                return seconds, sorted(children, reverse=True)
+            children = []
+    raise ValueError(f"{module} was not imported")
+
+
+def measure_import(database, module='application'):
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=APP_FOLDER, env=child_environment(database),
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        universal_newlines=True, check=True)
+    return parse_importtime(result.stderr, module)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def measure_first_response(database, timeout=30):
+    """Return the seconds from starting a server until GET / returns 200."""
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, '-c', SERVE.format(port=port)], cwd=APP_FOLDER,
+        env=child_environment(database), stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < timeout:
+            if server.poll() is not None:
+                raise RuntimeError("The server exited with code "
+                                   f"{server.returncode}.")
+            try:
+                with urllib.request.urlopen(
+                        f'http://127.0.0.1:{port}/') as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.005)
+        raise RuntimeError(f"No response within {timeout} seconds.")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Measure the import time and the time to the first "
+                    "response of a new process.")
+    parser.add_argument('database', help="database created by "
+                                         "benchmarks.generate")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10,
+                        help="slowest direct imports to list")
+    # the defaults leave about 50% headroom over the medians measured on a
+    # development machine (import 360-480 ms, first response 570-660 ms),
+    # so that normal variance does not fail the check
+    parser.add_argument('--import-budget', type=float, default=600,
+                        help="allowed import time of application.py in ms")
+    parser.add_argument('--first-response-budget', type=float, default=1000,
+                        help="allowed time to the first 200 response in ms")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.database):
+        sys.exit("'{}' does not exist; create it with "
+                 "benchmarks.generate.".format(args.database))
+    imports = [measure_import(args.database) for _ in range(args.repeat)]
+    import_seconds = statistics.median(seconds for seconds, _ in imports)
+    first_response_seconds = statistics.median(
+        measure_first_response(args.database) for _ in range(args.repeat))
+
+    print("Slowest imports of application.py (last run, ms):")
+    for seconds, name in imports[-1][1][:args.top]:
+        print(f"  {name:<32}{seconds * 1000:>8.1f}")
+    print(f"\n{'median of ' + str(args.repeat) + ' runs':<24}"
+          f"{'ms':>8}{'budget':>8}")
+    exceeded = []
+    for name, seconds, budget in (
+            ('import', import_seconds, args.import_budget),
+            ('first response', first_response_seconds,
+             args.first_response_budget)):
+        print(f"{name:<24}{seconds * 1000:>8.0f}{budget:>8.0f}")
+        if seconds * 1000 > budget:
+            exceeded.append(name)
+    if exceeded:
+        sys.exit("Over budget: " + ", ".join(exceeded))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Category registry for Elisabeth's Sports Item Catalog
+
+Categories hardly ever change, but almost every page needs them - for the
+side bar and to look up the category of a URL. The registry keeps them in
+memory with dictionaries for O(1) lookups by slug, name and id. It is loaded
+when the application starts and reloaded only when the change log shows
+that the categories have changed (see database_access.CATEGORIES_TAG).
+"""
+
+import threading
+from collections import namedtuple
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+# detached stand-in for the Categories model, usable after the session ends
+Category = namedtuple('Category', ['id', 'name', 'slug'])
+
+
+class CategoryRegistry(object):
+    def __init__(self, categories_tag):
+        self.categories_tag = categories_tag
+        self.version = None
+        self.categories = ()
+        self._by_key = {}
+        self._by_id = {}
+        self._lock = threading.Lock()
+
+    def load(self, categories, version):
+        categories = tuple(Category(c.id, c.name, c.slug) for c in categories)
+        # URLs use the slug; links with the name still work. Slugs win if a
+        # name happens to equal another category's slug.
+        by_key = {c.name: c for c in categories}
+        by_key.update((c.slug, c) for c in categories)
+        with self._lock:
+            self.categories = categories
+            self._by_key = by_key
+            self._by_id = {c.id: c for c in categories}
+            self.version = version
+
+    def sync(self, version, load_changed_tags, load_categories):
+        """
+        Catch up with the catalog version: reload the categories with
+        load_categories() if load_changed_tags(after_version) reports that
+        they have changed (or cannot tell any more).
+        """
+        seen_version = self.version
+        if version == seen_version:
+            return
+        changed_tags = None
+        if seen_version is not None and version > seen_version:
+            changed_tags = load_changed_tags(seen_version)
+        if changed_tags is None or self.categories_tag in changed_tags:
+            self.load(load_categories(), version)
+        else:
+            with self._lock:
+                if self.version == seen_version:
+                    self.version = version
+
+    def get(self, key):
+        """Return the category with the slug or name key, or None."""
+        return self._by_key.get(key)
+
+    def get_by_id(self, category_id):
+        return self._by_id.get(category_id)
+
+    def __contains__(self, key):
+        return key in self._by_key
+
+    def __iter__(self):
+        return iter(self.categories)
+
+    def __len__(self):
+        return len(self.categories)
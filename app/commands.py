@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Command line interface for Elisabeth's Sports Item Catalog
+
+The commands are available through the flask command once the application
+can be found, e.g.:
+
+    export FLASK_APP=application
+    flask catalog init-db
+    flask catalog migrate
+    flask catalog check-query-plans
+    flask catalog check-query-counts
+    flask catalog import items.csv
+    flask catalog export items.ndjson
+    flask catalog rebuild-search-index
+    flask catalog revoke-tokens
+    flask catalog build-static
+
+The app folder is not a package (it has no __init__.py), so flask imports
+application.py as a top-level module, the way the modules import each other.
+"""
+
+import sys
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from database import database_access
+from database.migrations import upgrade_database
+from database.query_plans import check_query_plans
+from database.instrumentation import record_queries
+from database.bulk import import_items, export_items
+from database.search import create_search_index, rebuild_search_index
+from query_budget import get_query_budget
+from static_assets import build_static_assets
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+catalog_cli = AppGroup('catalog', help="Manage the item catalog.")
+
+# URLs whose requests check-query-counts compares with the query budgets of
+# their endpoints (see query_budget.py); {category} and {item_id} are taken
+# from the most recently modified item
+QUERY_COUNT_URLS = [
+    '/',
+    '/catalog/{category}/items',
+    '/catalog/{category}/{item_id}',
+    '/catalog.json',
+    '/catalog.json?stream=1',
+    '/catalog/{category}.json',
+    '/catalog/{category}.json?stream=ndjson',
+    '/catalog/{category}/{item_id}.json',
+    '/catalog/search?q=ball',
+    '/catalog/search.json?q=ball',
+]
+
+
+@catalog_cli.command('init-db')
+def init_db_command():
+    """Create, populate and upgrade the database as needed."""
+    created = database_access.setup_db(report=click.echo)
+    if created:
+        click.echo("Created: " + ", ".join(created))
+    else:
+        click.echo("Database is up to date.")
+
+
+@catalog_cli.command('migrate')
+def migrate():
+    """Upgrade an existing database to the current schema."""
+    engine, _ = database_access.get_engines()
+    created = upgrade_database(engine)
+    if created:
+        click.echo("Created: " + ", ".join(created))
+    else:
+        click.echo("Database is up to date.")
+
+
+@catalog_cli.command('check-query-plans')
+def check_plans():
+    """Fail if a read helper needs a full scan of a table."""
+    failed = False
+    for helper, statement, plan, problems in check_query_plans(
+            *database_access.get_engines()):
+        status = 'FAIL' if problems else 'ok'
+        click.echo(f"[{status}] {helper}: " + " | ".join(plan))
+        if problems:
+            failed = True
+            click.echo("       " + " ".join(statement.split()))
+    if failed:
+        sys.exit(1)
+
+
+@catalog_cli.command('check-query-counts')
+def check_query_counts():
+    """Fail if an endpoint issues more SQL statements than its budget."""
+    item = database_access.get_latest_items_from_db().first()
+    if item is None:
+        sys.exit("The catalog has no items to request.")
+    category, item_id = item.category_slug, item.id
+    failed = False
+    client = current_app.test_client()
+    adapter = current_app.url_map.bind('localhost')
+    for url in QUERY_COUNT_URLS:
+        url = url.format(category=category, item_id=item_id)
+        endpoint, _ = adapter.match(url.split('?')[0])
+        limit = get_query_budget(endpoint)
+        # a fresh application context, so nothing is kept in g from the
+        # request before
+        with current_app.app_context(), \
+                record_queries(*database_access.get_engines()) as queries:
+            client.get(url).get_data()
+        status = 'FAIL' if len(queries) > limit else 'ok'
+        click.echo(f"[{status}] {url}: {len(queries)} queries "
+                   f"(budget {limit})")
+        if len(queries) > limit:
+            failed = True
+            for statement, parameters in queries:
+                click.echo("       " + " ".join(statement.split()))
+    if failed:
+        sys.exit(1)
+
+
+def report_progress(rows, rows_per_second):
+    click.echo(f"{rows} rows ({rows_per_second:.0f} rows/s)")
+
+
+@catalog_cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'ndjson']),
+              help="File format (default: derived from the file extension).")
+@click.option('--batch-size', default=1000, show_default=True,
+              help="Rows inserted per transaction.")
+@click.option('--restart', is_flag=True,
+              help="Import the whole file again, even if it was imported "
+                   "before.")
+def import_command(path, file_format, batch_size, restart):
+    """Import items from a CSV or NDJSON file.
+
+    An interrupted import continues after the last committed batch when it
+    is run again with the same file.
+    """
+    engine, _ = database_access.get_engines()
+    try:
+        summary = import_items(engine, path, file_format,
+                               batch_size, restart, report_progress)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    if summary['already_imported']:
+        click.echo("This file has already been imported; use --restart to "
+                   "import it again.")
+        return
+    if summary['resumed_after']:
+        click.echo(f"Resumed after row {summary['resumed_after']}.")
+    rate = summary['imported'] / summary['seconds'] \
+        if summary['seconds'] else 0.0
+    click.echo(f"Imported {summary['imported']} items, skipped "
+               f"{summary['skipped']} invalid rows in "
+               f"{summary['seconds']:.1f} s ({rate:.0f} rows/s).")
+    for reason, count in summary['skip_reasons'].most_common():
+        click.echo(f"  {count} skipped: {reason}")
+
+
+@catalog_cli.command('export')
+@click.argument('path', type=click.Path(dir_okay=False, writable=True))
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'ndjson']),
+              help="File format (default: derived from the file extension).")
+@click.option('--batch-size', default=1000, show_default=True,
+              help="Rows fetched from the database at a time.")
+def export_command(path, file_format, batch_size):
+    """Export all items to a CSV or NDJSON file."""
+    engine, _ = database_access.get_engines()
+    try:
+        exported = export_items(engine, path, file_format,
+                                batch_size, report_progress)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Exported {exported} items to {path}.")
+
+
+@catalog_cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Create the full-text search index if needed and reindex all items."""
+    engine, _ = database_access.get_engines()
+    with engine.begin() as connection:
+        created = create_search_index(connection)
+        if not created:
+            rebuild_search_index(connection)
+    click.echo("Search index rebuilt.")
+
+
+@catalog_cli.command('revoke-tokens')
+def revoke_tokens():
+    """Revoke the queued tokens of signed-out users that are due now."""
+    worker = current_app.extensions['revocation_worker']
+    handled = worker.run_once()
+    stats = worker.stats()
+    click.echo(f"Handled {handled} tokens: {stats['revoked']} revoked, "
+               f"{stats['dropped']} given up. {stats['depth']} tokens "
+               f"left in the queue.")
+
+
+@catalog_cli.command('build-static')
+def build_static():
+    """Write fingerprinted, precompressed copies of the static files."""
+    manifest = build_static_assets(current_app.static_folder)
+    click.echo(f"Built {len(manifest)} static files in "
+               f"{current_app.static_folder}/build. Restart the "
+               f"application to serve them.")
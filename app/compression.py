@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Response compression for Elisabeth's Sports Item Catalog
+
+Compression compresses the text responses of the catalog (pages, JSON,
+NDJSON, metrics) with brotli or gzip, whichever the client prefers in its
+Accept-Encoding header. brotli needs the brotli package
+(pip3 install brotli); without it, clients get gzip.
+
+Responses with an ETag (see conditional.py) only change when their ETag
+does, so their compressed bodies are kept in a least recently used cache
+keyed by endpoint, view and query arguments, ETag and encoding: repeated
+requests for a page skip the compression just like the page cache
+(page_cache.py) lets them skip the rendering. Bodies of outdated ETags are
+never requested again and age out of the cache.
+
+Streamed responses are compressed chunk by chunk as they are sent. Files
+sent by the static view are not touched: the fingerprinted static files
+come precompressed, see static_assets.py.
+"""
+
+import gzip
+import sys
+import threading
+import zlib
+from collections import OrderedDict
+
+from flask import request
+
+from page_cache import request_key
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+COMPRESSIBLE_MIMETYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/javascript',
+    'application/javascript', 'application/json', 'application/x-ndjson',
+    'image/svg+xml', 'image/x-icon', 'image/vnd.microsoft.icon',
+}
+
+# levels for responses compressed on the fly: most of the size reduction
+# for a fraction of the time of the highest levels (see static_assets.py for
+# the levels of the static files, which are compressed once)
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# the query arguments that select what a response with an ETag contains
+# (pages, search results); the cache ignores any others
+KEY_ARGUMENTS = ('limit', 'after', 'q')
+
+
+'''
+# ENCODERS
+'''
+
+
+class GzipEncoder(object):
+    name = 'gzip'
+
+    def __init__(self, level=GZIP_LEVEL):
+        self.level = level
+
+    def compress(self, data):
+        return gzip.compress(data, self.level)
+
+    def compressobj(self):
+        # wbits 31: zlib stream with a gzip header and trailer
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        # sync flushes send every chunk of a stream as soon as it is ready
+        return (lambda data: compressor.compress(data) +
+                compressor.flush(zlib.Z_SYNC_FLUSH),
+                compressor.flush)
+
+
+class BrotliEncoder(object):
+    name = 'br'
+
+    def __init__(self, quality=BROTLI_QUALITY):
+        self.quality = quality
+
+    def compress(self, data):
+        return brotli.compress(data, quality=self.quality)
+
+    def compressobj(self):
+        compressor = brotli.Compressor(quality=self.quality)
+        return (lambda data: compressor.process(data) + compressor.flush(),
+                compressor.finish)
+
+
+def get_encoders():
+    """Return the available encoders, most efficient first."""
+    encoders = [GzipEncoder()]
+    if brotli is not None:
+        encoders.insert(0, BrotliEncoder())
+    return encoders
+
+
+def compress_stream(chunks, encoder, charset='utf-8'):
+    compress, finish = encoder.compressobj()
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode(charset)
+            data = compress(chunk)
+            if data:
+                yield data
+        yield finish()
+    finally:
+        # ends stream_with_context() and with it the request
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+'''
+# CACHE OF COMPRESSED BODIES
+'''
+
+
+class CompressedBodyCache(object):
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()  # (request, etag, encoding) -> body
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key, body):
+        size = sys.getsizeof(body)
+        with self._lock:
+            if size > self.max_bytes:
+                return
+            if key in self._entries:
+                self.size -= sys.getsizeof(self._entries.pop(key))
+            self._entries[key] = body
+            self.size += size
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= sys.getsizeof(evicted)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries),
+                    'size_bytes': self.size,
+                    'max_bytes': self.max_bytes,
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions}
+
+
+'''
+# COMPRESSION OF RESPONSES
+'''
+
+
+class Compression(object):
+    def __init__(self, app):
+        self.encoders = get_encoders()
+        self.min_bytes = app.config['COMPRESSION_MIN_BYTES']
+        self.cache = None
+        if app.config['COMPRESSION_CACHE_MAX_BYTES']:
+            self.cache = CompressedBodyCache(
+                app.config['COMPRESSION_CACHE_MAX_BYTES'])
+        app.after_request(self.compress_response)
+
+    def select_encoder(self):
+        name = request.accept_encodings.best_match(
+            [encoder.name for encoder in self.encoders])
+        for encoder in self.encoders:
+            if encoder.name == name:
+                return encoder
+        return None
+
+    def compress_response(self, response):
+        if response.mimetype not in COMPRESSIBLE_MIMETYPES or \
+                response.direct_passthrough or \
+                'Content-Encoding' in response.headers:
+            return response
+        # the same URL is sent compressed to some clients and not to others
+        response.vary.add('Accept-Encoding')
+        if response.status_code != 200:
+            return response
+        encoder = self.select_encoder()
+        if encoder is None:
+            return response
+        if response.is_streamed:
+            response.response = compress_stream(response.response, encoder,
+                                                response.charset)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_bytes:
+                return response
+            response.set_data(self.compress_body(response, data, encoder))
+        response.headers['Content-Encoding'] = encoder.name
+        return response
+
+    def compress_body(self, response, data, encoder):
+        # the ETags are weak (see conditional.py), so the compressed body
+        # keeps the ETag of the uncompressed one
+        etag, _ = response.get_etag()
+        if etag is None or self.cache is None:
+            return encoder.compress(data)
+        key = (request_key(KEY_ARGUMENTS), etag, encoder.name)
+        body = self.cache.get(key)
+        if body is None:
+            body = encoder.compress(data)
+            self.cache.put(key, body)
+        return body
+
+    def stats(self):
+        return {'encodings': [encoder.name for encoder in self.encoders],
+                'cache': self.cache.stats() if self.cache is not None
+                else None}
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Conditional GET support for Elisabeth's Sports Item Catalog
+
+Read endpoints are decorated with @conditional(validator). The validator is
+called with the view arguments before the view runs and returns a
+(tag, last_modified) pair that changes whenever the response would change -
+usually derived from the catalog version, which every write increments, or
+from the last_modified column of a single item. If the client already has
+that state (If-None-Match / If-Modified-Since), a 304 response is returned
+and the view is not called at all.
+"""
+
+import datetime
+from functools import wraps
+
+from flask import current_app, request, make_response
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+def to_utc(timestamp):
+    # the database stores naive local times
+    return timestamp.astimezone(datetime.timezone.utc) \
+        .replace(microsecond=0)
+
+
+def is_not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since:
+        if_modified_since = request.if_modified_since
+        if if_modified_since.tzinfo is None:
+            # older Werkzeug versions return naive UTC datetimes
+            if_modified_since = if_modified_since.replace(
+                tzinfo=datetime.timezone.utc)
+        return last_modified <= if_modified_since
+    return False
+
+
+def set_validators(response, etag, last_modified):
+    response.set_etag(etag, weak=True)
+    response.last_modified = last_modified
+    # caches may keep the response but have to revalidate it every time
+    response.cache_control.no_cache = True
+
+
+def conditional(validator, vary=None):
+    """
+    validator(**view_args) returns (tag, last_modified), or None if the view
+    has to decide itself (e.g. because the requested item does not exist).
+    vary names a request header that selects between representations of
+    the same URL; it has to be part of the tag as well.
+    """
+    def decorator(view):
+        @wraps(view)
+        def decorated_view(*args, **kwargs):
+            state = validator(**kwargs)
+            if state is None:
+                return view(*args, **kwargs)
+            tag, last_modified = state
+            etag = '{}-{}'.format(current_app.config['RELEASE'], tag)
+            last_modified = to_utc(last_modified)
+            if is_not_modified(etag, last_modified):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            set_validators(response, etag, last_modified)
+            if vary:
+                response.vary.add(vary)
+            return response
+        return decorated_view
+    return decorator
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Configuration for Elisabeth's Sports Item Catalog
+
+All settings can be given as environment variables (prefixed with CATALOG_)
+or passed to create_app() as a dictionary or object. Settings passed to
+create_app() take precedence over the environment.
+
+Every worker process of a deployment must use the same SECRET_KEY, otherwise
+a login made on one worker is not valid on another one.
+"""
+
+import os
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+class Config(object):
+    # Security
+    SECRET_KEY = os.environ.get('CATALOG_SECRET_KEY')
+
+    # Database
+    DATABASE_URL = os.environ.get('CATALOG_DATABASE_URL',
+                                  'sqlite:///item_catalog.db')
+    DB_POOL_SIZE = int(os.environ.get('CATALOG_DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.environ.get('CATALOG_DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = int(os.environ.get('CATALOG_DB_POOL_TIMEOUT', 30))
+    # SQLite pragmas applied to every connection (see database/engines.py)
+    DB_JOURNAL_MODE = os.environ.get('CATALOG_DB_JOURNAL_MODE', 'WAL')
+    DB_SYNCHRONOUS = os.environ.get('CATALOG_DB_SYNCHRONOUS', 'NORMAL')
+    # negative: KiB, positive: pages
+    DB_CACHE_SIZE = int(os.environ.get('CATALOG_DB_CACHE_SIZE', -20000))
+    DB_MMAP_SIZE = int(os.environ.get('CATALOG_DB_MMAP_SIZE',
+                                      256 * 1024 * 1024))
+    # milliseconds a connection waits for a lock held by another process
+    DB_BUSY_TIMEOUT = int(os.environ.get('CATALOG_DB_BUSY_TIMEOUT', 5000))
+
+    # Pagination of item lists
+    ITEMS_PER_PAGE = int(os.environ.get('CATALOG_ITEMS_PER_PAGE', 50))
+    MAX_ITEMS_PER_PAGE = int(os.environ.get('CATALOG_MAX_ITEMS_PER_PAGE', 500))
+
+    # Streaming JSON responses: rows fetched from the database per batch
+    JSON_STREAM_BATCH_SIZE = int(
+        os.environ.get('CATALOG_JSON_STREAM_BATCH_SIZE', 500))
+    # JSON encoder of the JSON endpoints: 'orjson' or 'flask'; by default
+    # orjson if it is installed (see json_provider.py)
+    JSON_LIBRARY = os.environ.get('CATALOG_JSON_LIBRARY', '')
+
+    # Caching
+    # part of every ETag: change it on deployments that change the templates
+    # or the JSON format, so that clients do not keep outdated copies
+    RELEASE = os.environ.get('CATALOG_RELEASE', '1')
+    # memory budget of the rendered page cache, 0 disables the cache
+    PAGE_CACHE_MAX_BYTES = int(
+        os.environ.get('CATALOG_PAGE_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    SEND_FILE_MAX_AGE_DEFAULT = int(
+        os.environ.get('CATALOG_STATIC_MAX_AGE', 43200))
+
+    # Compression of the text responses with brotli or gzip (see
+    # compression.py); responses smaller than COMPRESSION_MIN_BYTES are sent
+    # as they are
+    COMPRESSION = os.environ.get('CATALOG_COMPRESSION', '1') == '1'
+    COMPRESSION_MIN_BYTES = int(
+        os.environ.get('CATALOG_COMPRESSION_MIN_BYTES', 500))
+    # memory budget of the cache of compressed bodies, 0 disables the cache
+    COMPRESSION_CACHE_MAX_BYTES = int(
+        os.environ.get('CATALOG_COMPRESSION_CACHE_MAX_BYTES',
+                       16 * 1024 * 1024))
+
+    # Metrics: requests that take longer are logged with their SQL
+    SLOW_REQUEST_SECONDS = float(
+        os.environ.get('CATALOG_SLOW_REQUEST_SECONDS', 1.0))
+
+    # SQL statements per request beyond an endpoint's budget: 'raise', 'log'
+    # or 'off'; by default raise when testing and log in debug mode (see
+    # query_budget.py)
+    QUERY_BUDGETS = os.environ.get('CATALOG_QUERY_BUDGETS', '')
+
+    # Sign-in providers
+    GOOGLE_API_URL = os.environ.get('CATALOG_GOOGLE_API_URL',
+                                    'https://www.googleapis.com')
+    GOOGLE_ACCOUNTS_URL = os.environ.get('CATALOG_GOOGLE_ACCOUNTS_URL',
+                                         'https://accounts.google.com')
+    FACEBOOK_GRAPH_URL = os.environ.get('CATALOG_FACEBOOK_GRAPH_URL',
+                                        'https://graph.facebook.com')
+    # client secrets, relative to the application directory; checked for
+    # changes at most every CLIENT_SECRETS_CHECK_INTERVAL seconds (0: never)
+    GOOGLE_CLIENT_SECRETS = os.environ.get('CATALOG_GOOGLE_CLIENT_SECRETS',
+                                           'client_secrets.json')
+    FACEBOOK_CLIENT_SECRETS = os.environ.get(
+        'CATALOG_FACEBOOK_CLIENT_SECRETS', 'fb_client_secrets.json')
+    CLIENT_SECRETS_CHECK_INTERVAL = float(
+        os.environ.get('CATALOG_CLIENT_SECRETS_CHECK_INTERVAL', 5))
+    # only for a single server process: gunicorn uses SIGHUP to restart its
+    # workers (see gunicorn.conf.py)
+    RELOAD_CLIENT_SECRETS_ON_SIGHUP = os.environ.get(
+        'CATALOG_RELOAD_CLIENT_SECRETS_ON_SIGHUP', '') == '1'
+    # keep-alive connections per provider host
+    PROVIDER_POOL_SIZE = int(os.environ.get('CATALOG_PROVIDER_POOL_SIZE', 10))
+    PROVIDER_CONNECT_TIMEOUT = float(
+        os.environ.get('CATALOG_PROVIDER_CONNECT_TIMEOUT', 3.05))
+    PROVIDER_READ_TIMEOUT = float(
+        os.environ.get('CATALOG_PROVIDER_READ_TIMEOUT', 10))
+    PROVIDER_RETRIES = int(os.environ.get('CATALOG_PROVIDER_RETRIES', 2))
+    # threads that run independent provider calls at the same time
+    PROVIDER_WORKERS = int(os.environ.get('CATALOG_PROVIDER_WORKERS', 8))
+    # sign-ins per process that may wait for the providers at once; keep it
+    # below the number of threads per worker, so reads always find a thread
+    PROVIDER_MAX_SIGN_INS = int(
+        os.environ.get('CATALOG_PROVIDER_MAX_SIGN_INS', 2))
+    PROVIDER_SIGN_IN_TIMEOUT = float(
+        os.environ.get('CATALOG_PROVIDER_SIGN_IN_TIMEOUT', 1))
+
+    # Revocation of the tokens of signed-out users (token_revocation.py)
+    REVOCATION_POLL_INTERVAL = float(
+        os.environ.get('CATALOG_REVOCATION_POLL_INTERVAL', 30))
+    REVOCATION_MAX_ATTEMPTS = int(
+        os.environ.get('CATALOG_REVOCATION_MAX_ATTEMPTS', 8))
+    # seconds before the first retry, doubled for every further retry
+    REVOCATION_BACKOFF = float(
+        os.environ.get('CATALOG_REVOCATION_BACKOFF', 30))
+
+    # Error handling
+    TRAP_HTTP_EXCEPTIONS = True
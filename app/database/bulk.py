@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Bulk import and export for Elisabeth's Sports Item Catalog
+
+Items are read from and written to CSV or NDJSON files (one JSON object per
+line) with the fields
+
+    name, description, category, last_modified
+
+(exports also contain the id). Imports insert the items batch by batch with
+a single executemany per batch; every batch is its own transaction, which
+also records how many rows of the file have been imported. If an import is
+interrupted, running it again with the same file continues after the last
+committed batch. Missing categories are created on the fly.
+
+Files name the category of an item; the database refers to it by id.
+"""
+
+import csv
+import datetime
+import hashlib
+import json
+import os
+import re
+import time
+import unicodedata
+from collections import Counter
+
+from sqlalchemy import select, update
+
+from .database_setup import Categories, Items, ImportProgress
+from .catalog_changes import record_catalog_change, category_tag, \
+    LATEST_ITEMS_TAG, CATEGORIES_TAG
+from .search import strip_control_characters
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+FIELDS = ['name', 'description', 'category', 'last_modified']
+EXPORT_FIELDS = ['id'] + FIELDS
+FORMATS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+MAX_LENGTHS = {'name': Items.name.type.length,
+               'description': Items.description.type.length,
+               'category': Categories.name.type.length}
+
+
+'''
+# WRITING ROWS
+  Used by the import below and by populate_database().
+'''
+
+
+def category_slug(name, taken=()):
+    """
+    Return the URL form of a category name ('Rock Climbing' becomes
+    'rock-climbing'), made unique with a number if it is in taken.
+    """
+    ascii_name = unicodedata.normalize('NFKD', name) \
+        .encode('ascii', 'ignore').decode('ascii')
+    slug = re.sub(r'[^a-z0-9]+', '-', ascii_name.lower()).strip('-') \
+        or 'category'
+    slug = slug[:Categories.slug.type.length - 4]
+    unique_slug = slug
+    number = 2
+    while unique_slug in taken:
+        unique_slug = f'{slug}-{number}'
+        number += 1
+    return unique_slug
+
+
+def get_category_ids(connection, names=None):
+    """Return a dictionary that maps category names (all or names) to ids."""
+    query = select([Categories.name, Categories.id])
+    if names is not None:
+        query = query.where(Categories.name.in_(list(names)))
+    return dict(connection.execute(query).fetchall())
+
+
+def insert_categories(connection, names):
+    # existing categories are left alone
+    existing = get_category_ids(connection, names)
+    taken = {row[0] for row in connection.execute(select([Categories.slug]))}
+    rows = []
+    for name in names:
+        if name not in existing:
+            slug = category_slug(name, taken)
+            taken.add(slug)
+            rows.append({'name': name, 'slug': slug})
+    if rows:
+        connection.execute(Categories.__table__.insert(), rows)
+
+
+def insert_items(connection, rows):
+    """
+    Insert items given as dictionaries with a category name. Returns the
+    ids of their categories.
+    """
+    category_ids = get_category_ids(
+        connection, {row['category'] for row in rows})
+    connection.execute(Items.__table__.insert(), [
+        {'name': row['name'],
+         'description': row['description'],
+         'category_id': category_ids[row['category']],
+         'last_modified': row['last_modified']} for row in rows])
+    return set(category_ids.values())
+
+
+'''
+# READING AND CHECKING FILES
+'''
+
+
+def detect_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError("Cannot tell the format of '{}'; use a .csv, "
+                         ".ndjson or .jsonl file.".format(path))
+    return FORMATS[extension]
+
+
+def file_checksum(path):
+    checksum = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            checksum.update(block)
+    return checksum.hexdigest()
+
+
+def read_records(f, file_format):
+    if file_format == 'csv':
+        yield from csv.DictReader(f)
+    else:
+        for line in f:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # skipped by check_record() like any other invalid row
+                    yield None
+
+
+def check_record(record):
+    """
+    Return the column values of an item record. Raises ValueError if the
+    record is not an object or a field is missing, not a string or too long.
+    Control characters are removed from the fields.
+    """
+    if not isinstance(record, dict):
+        raise ValueError("not a JSON object")
+    values = {}
+    for field, max_length in MAX_LENGTHS.items():
+        value = record.get(field)
+        if value is None:
+            value = ''
+        if not isinstance(value, str):
+            raise ValueError("'{}' is not a string".format(field))
+        value = strip_control_characters(value).strip()
+        if not value:
+            raise ValueError("'{}' is missing".format(field))
+        if len(value) > max_length:
+            raise ValueError("'{}' is longer than {} characters"
+                             .format(field, max_length))
+        values[field] = value
+    last_modified = record.get('last_modified')
+    if not last_modified:
+        values['last_modified'] = datetime.datetime.now()
+        return values
+    try:
+        values['last_modified'] = \
+            datetime.datetime.fromisoformat(last_modified)
+    except (TypeError, ValueError):
+        raise ValueError("'last_modified' is not an ISO 8601 date")
+    return values
+
+
+'''
+# IMPORT AND EXPORT
+'''
+
+
+def get_progress(connection, source):
+    return connection.execute(
+        select([ImportProgress.rows_done, ImportProgress.finished])
+        .where(ImportProgress.source == source)).first()
+
+
+def save_progress(connection, source, rows_done, finished=False):
+    values = {'rows_done': rows_done, 'finished': finished,
+              'last_modified': datetime.datetime.now()}
+    result = connection.execute(
+        update(ImportProgress)
+        .where(ImportProgress.source == source)
+        .values(**values))
+    if not result.rowcount:
+        connection.execute(ImportProgress.__table__.insert()
+                           .values(source=source, **values))
+
+
+def import_items(engine, path, file_format=None, batch_size=1000,
+                 restart=False, report=None):
+    """
+    Import the items in the file at path. report(rows_done, rows_per_second)
+    is called after every batch. Returns a dictionary with the number of
+    imported and skipped (invalid) rows, the reasons for skipping them with
+    their counts, the number of rows that had already been imported by an
+    earlier, interrupted run, and the duration.
+    """
+    file_format = file_format or detect_format(path)
+    source = file_checksum(path)
+    with engine.begin() as connection:
+        progress = get_progress(connection, source)
+        known_categories = set(get_category_ids(connection))
+    summary = {'imported': 0, 'skipped': 0, 'skip_reasons': Counter(),
+               'resumed_after': 0,
+               'already_imported': False, 'seconds': 0.0}
+    if progress and not restart:
+        if progress.finished:
+            summary['already_imported'] = True
+            return summary
+        summary['resumed_after'] = progress.rows_done
+
+    started = time.monotonic()
+    rows_done = rows_written = summary['resumed_after']
+    batch = []
+
+    def write_batch():
+        new_categories = {row['category'] for row in batch} - \
+            known_categories
+        tags = set()
+        with engine.begin() as connection:
+            if new_categories:
+                insert_categories(connection, sorted(new_categories))
+                tags.add(CATEGORIES_TAG)
+            if batch:
+                tags.update(category_tag(category_id) for category_id in
+                            insert_items(connection, batch))
+                tags.add(LATEST_ITEMS_TAG)
+            save_progress(connection, source, rows_done)
+            if tags:
+                record_catalog_change(connection, tags)
+        known_categories.update(new_categories)
+        summary['imported'] += len(batch)
+        del batch[:]
+        if report:
+            elapsed = time.monotonic() - started
+            report(rows_done,
+                   summary['imported'] / elapsed if elapsed else 0.0)
+
+    with open(path, newline='', encoding='utf-8') as f:
+        for number, record in enumerate(read_records(f, file_format), 1):
+            if number <= summary['resumed_after']:
+                continue
+            try:
+                batch.append(check_record(record))
+            except ValueError as e:
+                summary['skipped'] += 1
+                summary['skip_reasons'][str(e)] += 1
+            rows_done = number
+            if rows_done - rows_written >= batch_size:
+                write_batch()
+                rows_written = rows_done
+    if rows_done > rows_written:
+        write_batch()
+    with engine.begin() as connection:
+        save_progress(connection, source, rows_done, finished=True)
+    summary['seconds'] = time.monotonic() - started
+    return summary
+
+
+def export_items(engine, path, file_format=None, batch_size=1000,
+                 report=None):
+    """
+    Write all items, ordered by id, to the file at path. Returns the number
+    of exported items.
+    """
+    file_format = file_format or detect_format(path)
+    started = time.monotonic()
+    exported = 0
+    with engine.connect() as connection, \
+            open(path, 'w', newline='', encoding='utf-8') as f:
+        result = connection.execution_options(stream_results=True).execute(
+            select([Items.id, Items.name, Items.description,
+                    Categories.name, Items.last_modified])
+            .select_from(Items.__table__.join(Categories.__table__))
+            .order_by(Items.id))
+        writer = csv.writer(f) if file_format == 'csv' else None
+        if writer:
+            writer.writerow(EXPORT_FIELDS)
+        while True:
+            rows = result.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                values = list(row)
+                values[-1] = values[-1].isoformat()
+                if writer:
+                    writer.writerow(values)
+                else:
+                    f.write(json.dumps(dict(zip(EXPORT_FIELDS, values))) +
+                            '\n')
+            exported += len(rows)
+            if report:
+                elapsed = time.monotonic() - started
+                report(exported, exported / elapsed if elapsed else 0.0)
+    return exported
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Catalog version and change log for Elisabeth's Sports Item Catalog
+
+Every write to the catalog increments the catalog version and logs tags
+that name what was changed: a category, an item, the list of latest items
+or the list of categories. Caches use the log to drop exactly what a write
+has changed (see page_cache.py and category_registry.py).
+
+The functions take the session or connection of the write, so that the new
+version becomes visible in the same transaction as the change itself.
+"""
+
+import datetime
+
+from sqlalchemy import select, update, delete
+
+from .database_setup import CatalogVersion, CatalogChanges
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+# number of versions kept in the catalog_changes log
+CHANGE_LOG_LENGTH = 1000
+
+# change tags
+LATEST_ITEMS_TAG = 'latest'
+CATEGORIES_TAG = 'categories'
+
+
+def category_tag(category_id):
+    return 'category:{}'.format(category_id)
+
+
+def item_tag(item_id):
+    return 'item:{}'.format(item_id)
+
+
+def record_catalog_change(connection, tags):
+    """
+    Increment the catalog version and log what was changed by tags.
+    Versions older than CHANGE_LOG_LENGTH are removed from the log.
+    """
+    connection.execute(
+        update(CatalogVersion)
+        .where(CatalogVersion.id == 1)
+        .values(version=CatalogVersion.version + 1,
+                last_modified=datetime.datetime.now()))
+    version = connection.execute(
+        select([CatalogVersion.version])
+        .where(CatalogVersion.id == 1)).scalar()
+    connection.execute(CatalogChanges.__table__.insert(),
+                       [{'version': version, 'tag': tag} for tag in tags])
+    connection.execute(
+        delete(CatalogChanges)
+        .where(CatalogChanges.version <= version - CHANGE_LOG_LENGTH))
+    return version
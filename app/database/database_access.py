@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Database access for Elisabeth's Sports Item Catalog
+
+Holds the engine and the scoped session used by the web application and the
+command line interface, and the functions that read and write catalog data.
+"""
+
+import sys
+
+from flask import current_app, has_app_context
+from sqlalchemy import text, tuple_, select, inspect, event
+from sqlalchemy.orm import Session, sessionmaker, scoped_session
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.exc import SQLAlchemyError
+
+from .database_setup import Categories, Items, CatalogVersion, \
+    CatalogChanges, create_database
+from .catalog_changes import record_catalog_change, category_tag, item_tag, \
+    LATEST_ITEMS_TAG
+from .search import search_items
+from .revocation_queue import enqueue_revocation
+from .populate_database import populate_database
+from .migrations import upgrade_database
+from .engines import create_engines
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+'''
+# CONNECTION TO THE DATABASE
+  *  Set up a scoped session: every request (thread) gets its own session,
+     which is opened on first use and rolled back and closed when the
+     request is torn down (see remove_db_session() below); the write
+     functions commit explicitly.
+  *  The session reads through the pool of read-only connections and
+     writes through the single writer connection (see engines.py).
+  *  The engines are created by init_db() when the application is created,
+     see create_app() in application.py, and kept in
+     app.extensions['database']. The session uses the engines of the
+     current application, so several applications in one process (tests,
+     benchmarks) each use their own database. The database is created and
+     upgraded by setup_db() in a separate step (flask catalog init-db), so
+     starting a worker costs a single query.
+  *  Define functions that handle the interaction with the database.
+'''
+# the engines of the application created last, for code that runs outside
+# of an application context (e.g. create_app() itself)
+engine = None
+read_engine = None
+
+
+def get_engines():
+    """
+    The writer and reader engines of the current application, or of the
+    application created last outside of an application context.
+    """
+    if has_app_context():
+        return current_app.extensions['database']
+    return engine, read_engine
+
+
+class RoutingSession(Session):
+    """
+    Session that sends flushes and Core INSERT, UPDATE and DELETE statements
+    to the writer engine and everything else to the reader engine. Once a
+    transaction has written, it stays on the writer until it ends, so it
+    reads its own changes.
+    """
+    def get_bind(self, mapper=None, clause=None):
+        if self.info.get('writing') or self._flushing or \
+                isinstance(clause, UpdateBase):
+            self.info['writing'] = True
+            return get_engines()[0]
+        return get_engines()[1]
+
+
+@event.listens_for(RoutingSession, 'after_transaction_end')
+def stop_writing(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('writing', None)
+
+
+# the session ends with the request, so objects need not be reloaded after a
+# commit: the write functions return them as they were written
+db_session = sessionmaker(class_=RoutingSession, expire_on_commit=False)
+session = scoped_session(db_session)
+
+
+def init_db(app):
+    """
+    Create the writer and reader engines configured by the application
+    config and keep them in app.extensions['database']. The database is set
+    up by setup_db().
+    """
+    global engine, read_engine
+    try:
+        engine, read_engine = create_engines(app.config)
+    except SQLAlchemyError as e:
+        sys.exit("While initializing the database, an error occurred: " +
+                 str(e))
+    app.extensions['database'] = (engine, read_engine)
+    return engine
+
+
+def get_schema_version():
+    # 0 for an empty database; compare with SCHEMA_VERSION
+    with get_engines()[1].connect() as connection:
+        return connection.execute('PRAGMA user_version').scalar()
+
+
+def setup_db(report=None):
+    """
+    Create and populate the catalog tables if the database does not contain
+    them yet and upgrade databases created by an older version of the
+    application. Returns the names of the objects that were created. The
+    migration to schema version 2 reports its progress to report, see
+    migrations.migrate_to_v2().
+    """
+    writer = get_engines()[0]
+    created = []
+    if not writer.dialect.has_table(writer, Items.__tablename__):
+        create_database(writer)
+        populate_database(writer)
+        created.append('catalog')
+    return created + upgrade_database(writer, report=report)
+
+
+def get_categories_from_db():
+    return session.query(Categories).all()
+
+
+def get_latest_items_from_db():
+    return session.query(Items).order_by(text("last_modified DESC")).limit(5)
+
+
+# the fields of Items.serialize, for JSON responses that are encoded straight
+# from the rows without building ORM objects (see serializers.py)
+ITEM_COLUMNS = [Items.id, Items.name, Items.description,
+                Categories.name.label('category'), Items.last_modified]
+
+
+def get_item_rows_from_db(category_id):
+    return session.execute(
+        select(ITEM_COLUMNS)
+        .select_from(Items.__table__.join(Categories.__table__))
+        .where(Items.category_id == category_id))
+
+
+def get_item_count_from_db(category_id):
+    # maintained by triggers, see item_counts.py
+    return session.query(Categories.item_count) \
+        .filter_by(id=category_id).scalar() or 0
+
+
+def get_items_page_from_db(category_id, limit, after=None):
+    """
+    Return the items of a category that follow the (last_modified, id)
+    position after, newest first, as a list of at most limit items, and
+    whether there are more items behind them.
+    """
+    query = session.query(Items).filter_by(category_id=category_id)
+    if after is not None:
+        query = query.filter(
+            tuple_(Items.last_modified, Items.id) < tuple_(*after))
+    items = query.order_by(Items.last_modified.desc(), Items.id.desc()) \
+        .limit(limit + 1).all()
+    return items[:limit], len(items) > limit
+
+
+def get_item_rows_page_from_db(category_id, limit, after=None):
+    """Like get_items_page_from_db(), with rows of ITEM_COLUMNS as items."""
+    query = select(ITEM_COLUMNS) \
+        .select_from(Items.__table__.join(Categories.__table__)) \
+        .where(Items.category_id == category_id)
+    if after is not None:
+        query = query.where(
+            tuple_(Items.last_modified, Items.id) < tuple_(*after))
+    rows = session.execute(
+        query.order_by(Items.last_modified.desc(), Items.id.desc())
+        .limit(limit + 1)).fetchall()
+    return rows[:limit], len(rows) > limit
+
+
+def get_item_row_from_db(item_id):
+    # ITEM_COLUMNS and the slug of the category, which the URL may name
+    return session.execute(
+        select(ITEM_COLUMNS + [Categories.slug.label('category_slug')])
+        .select_from(Items.__table__.join(Categories.__table__))
+        .where(Items.id == item_id)).first()
+
+
+def get_catalog_rows_from_db():
+    # one query for the whole catalog: every category with its items, ordered
+    # by category so that the rows can be grouped in a single pass; the id
+    # is None for a category without items
+    return session.execute(
+        select(ITEM_COLUMNS)
+        .select_from(Categories.__table__.outerjoin(Items.__table__))
+        .order_by(Categories.name, Items.last_modified, Items.id))
+
+
+def fetch_in_batches(result, batch_size):
+    # rows of a streamed response, fetched batch_size at a time
+    while True:
+        rows = result.fetchmany(batch_size)
+        if not rows:
+            return
+        yield from rows
+
+
+def get_item_from_db(item_id):
+    return session.query(Items).filter_by(id=item_id).one_or_none()
+
+
+def get_search_results_from_db(query, limit):
+    # ranked by the full-text index, see search.py
+    return search_items(session, query, limit)
+
+
+def get_catalog_version_from_db():
+    # plain SQL, no ORM objects: used to answer conditional requests cheaply
+    return session.execute(
+        select([CatalogVersion.version, CatalogVersion.last_modified])
+        .where(CatalogVersion.id == 1)).first()
+
+
+def get_item_last_modified_from_db(item_id):
+    return session.execute(
+        select([Items.last_modified]).where(Items.id == item_id)).scalar()
+
+
+def get_catalog_changes_from_db(after_version):
+    """Return the (version, tag) rows of all versions after after_version."""
+    return session.execute(
+        select([CatalogChanges.version, CatalogChanges.tag])
+        .where(CatalogChanges.version > after_version)
+        .order_by(CatalogChanges.version)).fetchall()
+
+
+def get_changed_tags_from_db(after_version):
+    """
+    Return the set of tags changed since after_version, or None if the log
+    has been pruned and no longer tells what has changed since then.
+    """
+    changes = get_catalog_changes_from_db(after_version)
+    if not changes or changes[0][0] != after_version + 1:
+        return None
+    return {tag for _, tag in changes}
+
+
+def write_items_to_db(added=(), edited=(), deleted=()):
+    """
+    Add, edit and delete items in a single transaction, recorded as a single
+    catalog change. edited and deleted are items loaded from the session;
+    edited items carry their changes. Returns the added items, which have
+    their ids from the flush.
+    """
+    added, edited, deleted = list(added), list(edited), list(deleted)
+    # edited items may have been moved to another category: both change
+    tags = {category_tag(category_id) for item in edited
+            for category_id in
+            inspect(item).attrs.category_id.history.deleted}
+    session.add_all(added + edited)
+    for item in deleted:
+        session.delete(item)
+    # the flush assigns the ids of the added items
+    session.flush()
+    for item in added + edited:
+        tags |= {category_tag(item.category_id), item_tag(item.id),
+                 LATEST_ITEMS_TAG}
+    for item in deleted:
+        tags |= {category_tag(item.category_id), item_tag(item.id)}
+    if tags:
+        record_catalog_change(session, tags)
+    session.commit()
+    return added
+
+
+def add_token_revocation_to_db(provider, token, account_id=None):
+    # revoked later by the revocation worker, see token_revocation.py
+    enqueue_revocation(session, provider, token, account_id)
+    session.commit()
+
+
+'''
+# DATABASE SESSION LIFECYCLE
+'''
+
+
+def remove_db_session(exception=None):
+    # The write functions above commit their changes themselves. Whatever is
+    # still pending when the request ends was left behind by a request that
+    # did not finish its write (e.g. one rejected with an error response,
+    # which reaches the teardown without an exception), so it is rolled back
+    # before the connection goes back to the pool.
+    try:
+        session.rollback()
+    finally:
+        session.remove()
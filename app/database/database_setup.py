@@ -4,17 +4,56 @@ Database setup for Elisabeth's Sports Item Catalog
 
 SQLite database with two tables:
     CATEGORIES
-    | name |
-    --------
+    | id | name | slug | item_count |
+    ---------------------------------
 
     ITEMS
-    | id | name | description | category | last_modified |
-    ------------------------------------------------------
+    | id | name | description | category_id | last_modified |
+    ---------------------------------------------------------
+
+Indexes on ITEMS:
+    ix_items_last_modified              (last_modified)
+    ix_items_category_id_last_modified  (category_id, last_modified)
+
+The schema version is stored in the user_version field of the database
+header. Version 1 used the category name as the key of CATEGORIES and
+stored it in every item; migrations.migrate_to_v2() rewrites such databases.
+
+The item counts of the categories are kept up to date by triggers on ITEMS,
+which are created by migrations.upgrade_database() (see item_counts.py).
+
+Item names and descriptions are indexed for full-text search in the FTS5
+table ITEMS_SEARCH, which is created by migrations.upgrade_database() (see
+search.py).
+
+There is one table with a single row that counts the changes to the
+catalog, and a log that records for every version what was changed (see
+database_access.record_catalog_change()):
+    CATALOG_VERSION
+    | id | version | last_modified |
+    --------------------------------
+
+    CATALOG_CHANGES
+    | id | version | tag |
+    ----------------------
+
+The progress of bulk imports is stored so that an interrupted import can be
+resumed (see bulk.py):
+    IMPORT_PROGRESS
+    | source | rows_done | finished | last_modified |
+    -------------------------------------------------
+
+Access tokens of signed-out users wait in a queue until they have been
+revoked with their provider (see token_revocation.py):
+    TOKEN_REVOCATIONS
+    | id | provider | token | account_id | attempts | next_attempt |
+    | last_error | created |
+    ----------------------------------------------------------------
 """
 
 
 from sqlalchemy import Column, ForeignKey, Integer, String, DateTime, \
-    create_engine
+    Index, Boolean, create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
@@ -26,17 +65,26 @@ __email__ = "elisabeth.maria.strunk@gmail.com"
 __status__ = "Development"
 
 
+SCHEMA_VERSION = 2
+
 Base = declarative_base()
 
 
 class Categories(Base):
     __tablename__ = 'categories'
-    name = Column(String(50), primary_key=True)
+    id = Column(Integer, primary_key=True)
+    name = Column(String(50), nullable=False, unique=True)
+    # the category in URLs, see bulk.category_slug()
+    slug = Column(String(60), nullable=False, unique=True)
+    # maintained by triggers, see item_counts.py
+    item_count = Column(Integer, nullable=False, default=0,
+                        server_default='0')
 
     @property
     def serialize(self):
         return {
-            'name': self.name
+            'name': self.name,
+            'slug': self.slug
         }
 
 
@@ -45,10 +93,28 @@ class Items(Base):
     id = Column(Integer, primary_key=True)
     name = Column(String(100), nullable=False)
     description = Column(String(250), nullable=False)
-    category = Column(Integer, ForeignKey('categories.name'))
-    categories = relationship(Categories)
+    category_id = Column(Integer, ForeignKey('categories.id'),
+                         nullable=False)
+    # loaded with the item in the same query
+    categories = relationship(Categories, lazy='joined', innerjoin=True)
     last_modified = Column(DateTime, nullable=False)
 
+    __table_args__ = (
+        # latest items on the front page
+        Index('ix_items_last_modified', 'last_modified'),
+        # items of a category, newest first
+        Index('ix_items_category_id_last_modified', 'category_id',
+              'last_modified'),
+    )
+
+    @property
+    def category(self):
+        return self.categories.name
+
+    @property
+    def category_slug(self):
+        return self.categories.slug
+
     @property
     def serialize(self):
         return {
@@ -60,6 +126,47 @@ class Items(Base):
         }
 
 
-def create_database():
-    engine = create_engine('sqlite:///item_catalog.db')
+class CatalogVersion(Base):
+    __tablename__ = 'catalog_version'
+    id = Column(Integer, primary_key=True)
+    # incremented by every write to the catalog
+    version = Column(Integer, nullable=False)
+    last_modified = Column(DateTime, nullable=False)
+
+
+class CatalogChanges(Base):
+    __tablename__ = 'catalog_changes'
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, index=True)
+    # what was changed, e.g. 'category:3' or 'item:12'
+    tag = Column(String(100), nullable=False)
+
+
+class ImportProgress(Base):
+    __tablename__ = 'import_progress'
+    # checksum of the imported file
+    source = Column(String(64), primary_key=True)
+    rows_done = Column(Integer, nullable=False)
+    finished = Column(Boolean, nullable=False)
+    last_modified = Column(DateTime, nullable=False)
+
+
+class TokenRevocations(Base):
+    __tablename__ = 'token_revocations'
+    id = Column(Integer, primary_key=True)
+    provider = Column(String(20), nullable=False)
+    token = Column(String(2048), nullable=False)
+    # Facebook revokes the permissions of a user id
+    account_id = Column(String(100))
+    attempts = Column(Integer, nullable=False)
+    next_attempt = Column(DateTime, nullable=False, index=True)
+    last_error = Column(String(250))
+    created = Column(DateTime, nullable=False)
+
+
+def create_database(engine=None):
+    if engine is None:
+        engine = create_engine('sqlite:///item_catalog.db')
     Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Database engines for Elisabeth's Sports Item Catalog
+
+The application talks to the database through two engines:
+  *  a writer engine with a single connection: all writes of a process are
+     serialized on it, and every write transaction starts with BEGIN
+     IMMEDIATE, so it takes the write lock up front and waits for it
+     (busy_timeout) instead of failing halfway with 'database is locked'
+  *  a reader engine with a pool of read-only (query_only) connections
+
+SQLite databases are switched to write-ahead logging (WAL), in which readers
+do not block the writer and the writer does not block readers. The pragmas
+below are applied to every new connection.
+"""
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import QueuePool
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+def sqlite_pragmas(config):
+    return [('synchronous', config['DB_SYNCHRONOUS']),
+            ('cache_size', int(config['DB_CACHE_SIZE'])),
+            ('mmap_size', int(config['DB_MMAP_SIZE'])),
+            ('busy_timeout', int(config['DB_BUSY_TIMEOUT']))]
+
+
+def set_pragmas(engine, pragmas):
+    @event.listens_for(engine, 'connect')
+    def connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+
+
+def begin_immediate(engine):
+    # pysqlite would only send BEGIN before the first write of a
+    # transaction; take over and lock the database for writing right away
+    @event.listens_for(engine, 'connect')
+    def connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, 'begin')
+    def begin(connection):
+        connection.execute('BEGIN IMMEDIATE')
+
+
+def is_file_database(url):
+    url = make_url(url)
+    return url.get_backend_name() == 'sqlite' and \
+        url.database not in (None, '', ':memory:')
+
+
+def create_engines(config):
+    """
+    Return the (writer, reader) engines for the database configured in
+    config. An in-memory database cannot be shared by two engines; then the
+    writer serves the reads as well.
+    """
+    url = config['DATABASE_URL']
+    # check_same_thread=False is needed because pooled connections are handed
+    # to whichever worker thread checks them out next; a connection is never
+    # used by two threads at the same time.
+    connect_args = {'check_same_thread': False} \
+        if url.startswith('sqlite') else {}
+    writer = create_engine(url, poolclass=QueuePool, pool_size=1,
+                           max_overflow=0,
+                           pool_timeout=config['DB_POOL_TIMEOUT'],
+                           connect_args=connect_args)
+    if not is_file_database(url):
+        return writer, writer
+    reader = create_engine(url, poolclass=QueuePool,
+                           pool_size=config['DB_POOL_SIZE'],
+                           max_overflow=config['DB_MAX_OVERFLOW'],
+                           pool_timeout=config['DB_POOL_TIMEOUT'],
+                           connect_args=connect_args)
+    pragmas = sqlite_pragmas(config)
+    set_pragmas(writer, [('journal_mode', config['DB_JOURNAL_MODE'])] +
+                pragmas)
+    begin_immediate(writer)
+    set_pragmas(reader, pragmas + [('query_only', 'ON')])
+    return writer, reader
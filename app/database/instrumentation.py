@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+SQL instrumentation for Elisabeth's Sports Item Catalog
+
+record_queries() collects every SQL statement that is sent to the database
+through the given engines while the context is active.
+"""
+
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+@contextmanager
+def record_queries(*engines):
+    """
+    Yield a list that is filled with a (statement, parameters) tuple for
+    every statement executed on one of engines inside the with block.
+    """
+    queries = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context,
+                              executemany):
+        queries.append((statement, parameters))
+
+    # the reader and the writer engine may be the same
+    engines = set(engines)
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield queries
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute',
+                         before_cursor_execute)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Item counts of the categories for Elisabeth's Sports Item Catalog
+
+Every category row stores the number of its items in ITEM_COUNT, so a
+category page does not have to count thousands of items on every request.
+Triggers on ITEMS keep the counts up to date on every insert, delete and
+move to another category - also for bulk imports and for writes that bypass
+the application.
+"""
+
+from sqlalchemy import inspect
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+# (name, statement) of the triggers, in creation order
+ITEM_COUNT_TRIGGERS = [
+    ('items_count_insert', """
+        CREATE TRIGGER items_count_insert AFTER INSERT ON items BEGIN
+            UPDATE categories SET item_count = item_count + 1
+            WHERE id = new.category_id;
+        END"""),
+    ('items_count_delete', """
+        CREATE TRIGGER items_count_delete AFTER DELETE ON items BEGIN
+            UPDATE categories SET item_count = item_count - 1
+            WHERE id = old.category_id;
+        END"""),
+    ('items_count_update', """
+        CREATE TRIGGER items_count_update
+        AFTER UPDATE OF category_id ON items
+        WHEN old.category_id IS NOT new.category_id BEGIN
+            UPDATE categories SET item_count = item_count - 1
+            WHERE id = old.category_id;
+            UPDATE categories SET item_count = item_count + 1
+            WHERE id = new.category_id;
+        END"""),
+]
+
+
+def create_item_counts(connection):
+    """
+    Create the ITEM_COUNT column and the triggers if they are missing and
+    return their names. The counts are recalculated if anything had to be
+    created.
+    """
+    created = []
+    columns = {column['name']
+               for column in inspect(connection).get_columns('categories')}
+    if 'item_count' not in columns:
+        connection.execute("ALTER TABLE categories "
+                           "ADD COLUMN item_count INTEGER NOT NULL DEFAULT 0")
+        created.append('categories.item_count')
+    existing = {row[0] for row in connection.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+    for name, statement in ITEM_COUNT_TRIGGERS:
+        if name not in existing:
+            connection.execute(statement)
+            created.append(name)
+    if created:
+        recount_items(connection)
+    return created
+
+
+def recount_items(connection):
+    """Recalculate the item counts of all categories."""
+    connection.execute("""
+        UPDATE categories SET item_count = (
+            SELECT count(*) FROM items WHERE items.category_id = categories.id)
+        """)
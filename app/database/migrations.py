@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Upgrades for existing databases of Elisabeth's Sports Item Catalog
+
+create_database() only creates what is missing on a fresh database. The
+functions in this module bring databases created by an older version of the
+application up to date. Every step checks whether it is still needed, so
+upgrade_database() can be run any number of times.
+
+Schema version 2 keys the categories by an integer id instead of their name
+(see database_setup.py). migrate_to_v2() rewrites a version 1 database while
+the old version of the application keeps using it:
+  1. New tables categories_v2 and items_v2 are created, and triggers on the
+     old tables mirror every write into them from now on.
+  2. The items are copied in batches, each its own short transaction, so
+     that the old application can write in between. The copied id range is
+     stored as import progress, so an interrupted migration continues where
+     it stopped.
+  3. A single transaction copies what is still missing, replaces the old
+     tables with the new ones, builds the indexes and triggers and sets the
+     schema version. The old application fails from now on and has to be
+     replaced right away.
+"""
+
+import datetime
+
+from sqlalchemy import inspect, select, func, text
+
+from .database_setup import Items, CatalogVersion, CatalogChanges, \
+    ImportProgress, TokenRevocations, SCHEMA_VERSION
+from .search import create_search_index
+from .item_counts import create_item_counts
+from .bulk import category_slug, get_progress, save_progress
+from .catalog_changes import record_catalog_change, LATEST_ITEMS_TAG, \
+    CATEGORIES_TAG
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+def add_missing_indexes(engine, table):
+    existing = {index['name']
+                for index in inspect(engine).get_indexes(table.name)}
+    created = []
+    for index in sorted(table.indexes, key=lambda i: i.name):
+        if index.name not in existing:
+            index.create(bind=engine)
+            created.append(index.name)
+    return created
+
+
+def add_missing_tables(engine, tables):
+    existing = set(inspect(engine).get_table_names())
+    missing = [table for table in tables if table.name not in existing]
+    for table in missing:
+        table.create(bind=engine)
+    return [table.name for table in missing]
+
+
+def add_catalog_version_row(engine):
+    table = CatalogVersion.__table__
+    with engine.begin() as connection:
+        if connection.scalar(select([func.count()]).select_from(table)):
+            return []
+        connection.execute(table.insert().values(
+            id=1, version=1, last_modified=datetime.datetime.now()))
+    return ['catalog_version row']
+
+
+def add_search_index(engine):
+    with engine.begin() as connection:
+        return create_search_index(connection)
+
+
+def add_item_counts(engine):
+    with engine.begin() as connection:
+        return create_item_counts(connection)
+
+
+'''
+# SCHEMA VERSION 2
+'''
+
+# import progress of the item copy
+V2_PROGRESS_SOURCE = 'schema-v2'
+V2_BATCH_SIZE = 10000
+
+# (name, statement) of the new tables and of the triggers that mirror writes
+# to the old tables into them; categories created meanwhile get a
+# provisional slug (slugs never contain '~') that is replaced at the swap
+V2_OBJECTS = [
+    ('categories_v2', """
+        CREATE TABLE IF NOT EXISTS categories_v2 (
+            id INTEGER NOT NULL PRIMARY KEY,
+            name VARCHAR(50) NOT NULL UNIQUE,
+            slug VARCHAR(60) NOT NULL UNIQUE,
+            item_count INTEGER NOT NULL DEFAULT 0)"""),
+    ('items_v2', """
+        CREATE TABLE IF NOT EXISTS items_v2 (
+            id INTEGER NOT NULL PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            description VARCHAR(250) NOT NULL,
+            category_id INTEGER NOT NULL REFERENCES categories_v2 (id),
+            last_modified DATETIME NOT NULL)"""),
+    ('categories_v2_insert', """
+        CREATE TRIGGER IF NOT EXISTS categories_v2_insert
+        AFTER INSERT ON categories BEGIN
+            INSERT OR IGNORE INTO categories_v2 (name, slug)
+            VALUES (new.name, '~' || new.rowid);
+        END"""),
+    ('items_v2_insert', """
+        CREATE TRIGGER IF NOT EXISTS items_v2_insert
+        AFTER INSERT ON items BEGIN
+            INSERT OR REPLACE INTO items_v2
+            SELECT new.id, new.name, new.description, categories_v2.id,
+                   new.last_modified
+            FROM categories_v2 WHERE categories_v2.name = new.category;
+        END"""),
+    ('items_v2_update', """
+        CREATE TRIGGER IF NOT EXISTS items_v2_update
+        AFTER UPDATE ON items BEGIN
+            DELETE FROM items_v2 WHERE id = old.id;
+            INSERT OR REPLACE INTO items_v2
+            SELECT new.id, new.name, new.description, categories_v2.id,
+                   new.last_modified
+            FROM categories_v2 WHERE categories_v2.name = new.category;
+        END"""),
+    ('items_v2_delete', """
+        CREATE TRIGGER IF NOT EXISTS items_v2_delete
+        AFTER DELETE ON items BEGIN
+            DELETE FROM items_v2 WHERE id = old.id;
+        END"""),
+]
+
+# items without a category cannot be copied; they are not shown by the old
+# application either
+COPY_ITEMS = """
+    INSERT OR IGNORE INTO items_v2
+    SELECT items.id, items.name, items.description, categories_v2.id,
+           items.last_modified
+    FROM items JOIN categories_v2 ON categories_v2.name = items.category
+    WHERE {}"""
+
+
+def needs_v2_migration(connection):
+    columns = {column['name']
+               for column in inspect(connection).get_columns('items')}
+    return 'category' in columns
+
+
+def add_v2_categories(connection):
+    """
+    Copy the categories that are missing from categories_v2, including the
+    ones only named by items, and replace provisional slugs.
+    """
+    names = {str(row[0]) for row in connection.execute("""
+        SELECT name FROM categories
+        UNION SELECT DISTINCT category FROM items
+        WHERE category IS NOT NULL""")}
+    slugs = dict(connection.execute(
+        "SELECT name, slug FROM categories_v2").fetchall())
+    taken = {slug for slug in slugs.values() if not slug.startswith('~')}
+    for name in sorted(names | set(slugs)):
+        if name in slugs and not slugs[name].startswith('~'):
+            continue
+        slug = category_slug(name, taken)
+        taken.add(slug)
+        if name in slugs:
+            connection.execute(
+                text("UPDATE categories_v2 SET slug = :slug "
+                     "WHERE name = :name"), slug=slug, name=name)
+        else:
+            connection.execute(
+                text("INSERT INTO categories_v2 (name, slug) "
+                     "VALUES (:name, :slug)"), name=name, slug=slug)
+
+
+def swap_v2_tables(connection):
+    """
+    Replace the version 1 tables by the new ones. Returns the number of
+    items that could not be copied.
+    """
+    add_v2_categories(connection)
+    connection.execute(COPY_ITEMS.format(
+        "items.id NOT IN (SELECT id FROM items_v2)"))
+    skipped = connection.scalar(
+        "SELECT count(*) FROM items WHERE id NOT IN (SELECT id FROM items_v2)")
+    # dropping the old tables drops their triggers and indexes
+    connection.execute("DROP TABLE items")
+    connection.execute("ALTER TABLE items_v2 RENAME TO items")
+    connection.execute("DROP TABLE categories")
+    # also points the foreign key of items to the renamed table
+    connection.execute("ALTER TABLE categories_v2 RENAME TO categories")
+    for index in sorted(Items.__table__.indexes, key=lambda i: i.name):
+        index.create(bind=connection)
+    # the search index keeps its content: the item ids have not changed
+    create_search_index(connection)
+    create_item_counts(connection)
+    connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    # every cached page shows the categories
+    record_catalog_change(connection, [CATEGORIES_TAG, LATEST_ITEMS_TAG])
+    return skipped
+
+
+def migrate_to_v2(engine, batch_size=V2_BATCH_SIZE, report=None):
+    """
+    Rewrite a version 1 database to schema version 2, see above. report is
+    called with a message after every batch. Returns the names of the
+    objects that were created.
+    """
+    with engine.begin() as connection:
+        if not needs_v2_migration(connection):
+            return []
+        for name, statement in V2_OBJECTS:
+            connection.execute(statement)
+        add_v2_categories(connection)
+        last_id = connection.scalar("SELECT max(id) FROM items")
+        progress = get_progress(connection, V2_PROGRESS_SOURCE)
+    copied_until = progress.rows_done if progress else 0
+    while True:
+        with engine.begin() as connection:
+            # another process may have finished the migration meanwhile
+            if not needs_v2_migration(connection):
+                return []
+            until = connection.scalar(text("""
+                SELECT max(id) FROM (
+                    SELECT id FROM items WHERE id > :after
+                    ORDER BY id LIMIT :batch_size)"""),
+                after=copied_until, batch_size=batch_size)
+            if until is None:
+                break
+            connection.execute(
+                text(COPY_ITEMS.format(
+                    "items.id > :after AND items.id <= :until")),
+                after=copied_until, until=until)
+            save_progress(connection, V2_PROGRESS_SOURCE, until)
+        copied_until = until
+        if report:
+            report(f"Schema version 2: copied the items up to id "
+                   f"{copied_until} of {last_id}.")
+    with engine.begin() as connection:
+        if not needs_v2_migration(connection):
+            return []
+        skipped = swap_v2_tables(connection)
+        save_progress(connection, V2_PROGRESS_SOURCE, copied_until,
+                      finished=True)
+    if report:
+        report(f"Schema version 2: done, {skipped} items without a "
+               f"category were left out.")
+    return ['schema version 2']
+
+
+'''
+# UPGRADE
+'''
+
+
+def upgrade_database(engine, report=None):
+    """
+    Apply all upgrade steps to the database behind engine and return the
+    names of the objects that were created. report is passed on to
+    migrate_to_v2().
+    """
+    created = []
+    created += add_missing_tables(engine, [CatalogVersion.__table__,
+                                           CatalogChanges.__table__,
+                                           ImportProgress.__table__,
+                                           TokenRevocations.__table__])
+    created += add_catalog_version_row(engine)
+    # before the other steps, which expect the current schema
+    created += migrate_to_v2(engine, report=report)
+    created += add_missing_indexes(engine, Items.__table__)
+    created += add_search_index(engine)
+    created += add_item_counts(engine)
+    return created
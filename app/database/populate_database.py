@@ -12,34 +12,26 @@ Item names and descriptions from products in real web-shops. Sources:
 import datetime
 
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 
-from .database_setup import Base, Categories, Items
+from .bulk import insert_categories, insert_items
 
 
 __author__ = "Elisabeth M. Strunk"
-__version__ = 1.1
+__version__ = 1.2
 __maintainer__ = "Elisabeth M. Strunk"
 __email__ = "elisabeth.maria.strunk@gmail.com"
 __status__ = "Development"
 
 
-def populate_database():
-    engine = create_engine('sqlite:///item_catalog.db')
-    Base.metadata.bind = engine
-    db_session_maker = sessionmaker(bind=engine)
-    session = db_session_maker()
+def populate_database(engine=None):
+    if engine is None:
+        engine = create_engine('sqlite:///item_catalog.db')
 
     # create entries in categories table:
-    session.add_all([Categories(name='Soccer'),
-                     Categories(name='Basketball'),
-                     Categories(name='Baseball'),
-                     Categories(name='Snowboarding'),
-                     Categories(name='Rock Climbing'),
-                     Categories(name='Skating'),
-                     Categories(name='Hockey')])
+    categories = ['Soccer', 'Basketball', 'Baseball', 'Snowboarding',
+                  'Rock Climbing', 'Skating', 'Hockey']
     # create entries in items table:
-    session.add_all([Items(name="Diamond Soccer Ball",
+    sample_entries = [dict(name="Diamond Soccer Ball",
                            description="Diamond Soccer Ball is a great "
                                        "club match and practice ball. Newly "
                                        "developed all-round ball with extra "
@@ -47,7 +39,7 @@ def populate_database():
                                        "year warranty.",
                            category="Soccer",
                            last_modified=datetime.datetime.now()),
-                     Items(name="Nike Phantom Venom Academy FG Soccer Shoe "
+                      dict(name="Nike Phantom Venom Academy FG Soccer Shoe "
                                 "Men volt obsidian volt barely volt",
                            description="The Nike Phantom Venom Academy FG is "
                                        "engineered for powerful, precise "
@@ -59,7 +51,7 @@ def populate_database():
                                        "moment.",
                            category="Soccer",
                            last_modified=datetime.datetime.now()),
-                     Items(name="Nike Goalkeeper Match Soccer Gloves Unisex "
+                      dict(name="Nike Goalkeeper Match Soccer Gloves Unisex "
                                 "blue hero white",
                            description="Padding plus grip. The Nike "
                                        "Goalkeeper Match Soccer Gloves "
@@ -68,7 +60,7 @@ def populate_database():
                                        "on the ball in wet or dry conditions.",
                            category="Soccer",
                            last_modified=datetime.datetime.now()),
-                     Items(name="Nike Precision III Basketball Shoes Men grey "
+                      dict(name="Nike Precision III Basketball Shoes Men grey "
                                 "gold",
                            description="Make every move count in the Nike "
                                        "Precision III. This all-purpose "
@@ -79,7 +71,7 @@ def populate_database():
                                        "up for soft steps and quick cuts.",
                            category="Basketball",
                            last_modified=datetime.datetime.now()),
-                     Items(name="Spalding Street Game Ball BBL Platinum",
+                      dict(name="Spalding Street Game Ball BBL Platinum",
                            description="The successor of the legendary "
                                        "Streetball. Thanks to his resilience "
                                        "in street basketball, he has become "
@@ -88,7 +80,7 @@ def populate_database():
                                        "control.",
                            category="Basketball",
                            last_modified=datetime.datetime.now()),
-                     Items(name="Nike Backboard Dri-FIT Basketball T-Shirt "
+                      dict(name="Nike Backboard Dri-FIT Basketball T-Shirt "
                                 "Kids game royal",
                            description="Sweat-wicking comfort. The Nike "
                                        "Dri-FIT T-Shirt has sweat-wicking "
@@ -96,7 +88,7 @@ def populate_database():
                                        "comfortable on the court.",
                            category="Basketball",
                            last_modified=datetime.datetime.now()),
-                     Items(name="Nike Dry Basketball Shorts Kids midnight "
+                      dict(name="Nike Dry Basketball Shorts Kids midnight "
                                 "navy black",
                            description="Sweat-wicking comfort. The Nike "
                                        "Dri-FIT Shorts feature sweat-wicking "
@@ -105,7 +97,7 @@ def populate_database():
                                        "while you play.",
                            category="Basketball",
                            last_modified=datetime.datetime.now()),
-                     Items(name="New Era League Essential New York Yankees "
+                      dict(name="New Era League Essential New York Yankees "
                                 "Unisex blue",
                            description="You can wear the League Essential New "
                                        "York Yankees Cap everywhere . During "
@@ -118,7 +110,7 @@ def populate_database():
                                        "beat faster.",
                            category="Baseball",
                            last_modified=datetime.datetime.now()),
-                     Items(name="Rawlings Baseball / softball gloves",
+                      dict(name="Rawlings Baseball / softball gloves",
                            description="New custom options now available! "
                                        "Ever wanted to design a glove like "
                                        "a pro player? Or are you looking "
@@ -132,7 +124,7 @@ def populate_database():
                                        "number and flag.",
                            category="Baseball",
                            last_modified=datetime.datetime.now()),
-                     Items(name="Worth FPS512 Sick 454 Baseball Bat",
+                      dict(name="Worth FPS512 Sick 454 Baseball Bat",
                            description="Worth’s 454(TM) USA technology has "
                                        "a new two-phase resin system making "
                                        "the engineered carbon fiber composite "
@@ -143,7 +135,7 @@ def populate_database():
                                        "maximum bat control through the zone.",
                            category="Baseball",
                            last_modified=datetime.datetime.now()),
-                     Items(name="Wilson WTA5500 Shock FX 2.0 Catcher's Helmet",
+                      dict(name="Wilson WTA5500 Shock FX 2.0 Catcher's Helmet",
                            description="Floating Mas(TM) system with extended "
                                        "cage absorbs up to 50% more impact "
                                        "than regular masks. Strategic venting "
@@ -156,13 +148,13 @@ def populate_database():
                                        "Standard",
                            category="Baseball",
                            last_modified=datetime.datetime.now()),
-                     Items(name="All Star CP28Pro Body Protector",
+                      dict(name="All Star CP28Pro Body Protector",
                            description="Multi layered foam. Contoured neck "
                                        "colar. Fully adjustable 5 point "
                                        "harness. With shoulder cap",
                            category="Baseball",
                            last_modified=datetime.datetime.now()),
-                     Items(name="O'Neill PM Contour Snowboard Jacket Women "
+                      dict(name="O'Neill PM Contour Snowboard Jacket Women "
                                 "grey",
                            description="Featuring 10K/10K waterproofing & "
                                        "breathability, O'Neill Hyperdry nano "
@@ -180,7 +172,7 @@ def populate_database():
                                        "bar afterwards.",
                            category="Snowboarding",
                            last_modified=datetime.datetime.now()),
-                     Items(name="Scott Backcountry Guide AP 30l KIT "
+                      dict(name="Scott Backcountry Guide AP 30l KIT "
                                 "Avalanche Airbag black burnt orange",
                            description="There is no compromise on a safe "
                                        "day in the mountains. The SCOTT "
@@ -196,7 +188,7 @@ def populate_database():
                                        "the mountains.",
                            category="Snowboarding",
                            last_modified=datetime.datetime.now()),
-                     Items(name="Climbing Technology Click Up Kit orange",
+                      dict(name="Climbing Technology Click Up Kit orange",
                            description="It can be used with 8.5-11 mm single "
                                        "ropes. It is compact and lightweight "
                                        "and allows for belaying a leader and "
@@ -216,7 +208,7 @@ def populate_database():
                                        "of the climber.",
                            category="Rock Climbing",
                            last_modified=datetime.datetime.now()),
-                     Items(name="Red Chili Atomic 2 Climbing Shoe ocker "
+                      dict(name="Red Chili Atomic 2 Climbing Shoe ocker "
                                 "orange",
                            description="The new Climbing Shoe. The "
                                        "entry-area is completely redesigned "
@@ -232,7 +224,7 @@ def populate_database():
                                        "toe box for maximum power.",
                            category="Rock Climbing",
                            last_modified=datetime.datetime.now()),
-                     Items(name="SALEWA Agner DST Climbing Tights Women "
+                      dict(name="SALEWA Agner DST Climbing Tights Women "
                                 "dark purple",
                            description="Versatile, comfortable alpine "
                                        "climbing tights for women. The "
@@ -247,21 +239,21 @@ def populate_database():
                                        "performance.",
                            category="Rock Climbing",
                            last_modified=datetime.datetime.now()),
-                     Items(name="LACD Quickdraw Start Wire",
+                      dict(name="LACD Quickdraw Start Wire",
                            description="The Quickdraw Start Wire Express set "
                                        "by LACD is just as well suited for "
                                        "the first experience in rock climbing "
                                        "as for experienced rock climbers.",
                            category="Rock Climbing",
                            last_modified=datetime.datetime.now()),
-                     Items(name="Powerslide Infinity Wheels 90mm / 85A "
+                      dict(name="Powerslide Infinity Wheels 90mm / 85A "
                                 "(pack of 4)",
                            description="High-quality speed wheels by "
                                        "Powerslide. These wheels have a race "
                                        "profile.",
                            category="Skating",
                            last_modified=datetime.datetime.now()),
-                     Items(name="Powerslide Wristguards black",
+                      dict(name="Powerslide Wristguards black",
                            description="The wrist protectors have an "
                                        "anatomical shape. Made of 600D "
                                        "nylon upper. With Triplestrap system "
@@ -270,21 +262,21 @@ def populate_database():
                                        "wearing comfort.",
                            category="Skating",
                            last_modified=datetime.datetime.now()),
-                     Items(name="Balzer Star Lady New Eishockey Semi Softboot "
+                      dict(name="Balzer Star Lady New Eishockey Semi Softboot "
                                 "white",
                            description="The Star Lady ice skate offers "
                                        "everything You need for a funny day "
                                        "on the ice.",
                            category="Hockey",
                            last_modified=datetime.datetime.now()),
-                     Items(name="Bauer Rubena Puck black",
+                      dict(name="Bauer Rubena Puck black",
                            description="Let´s play. Bauer's Rubena Puck is "
                                        "an official match puck and is played "
                                        "in all leagues. The first choice of "
                                        "every hockey player.",
                            category="Hockey",
                            last_modified=datetime.datetime.now()),
-                     Items(name="CCM Fitlite 40 Helmetcombo Junior with "
+                      dict(name="CCM Fitlite 40 Helmetcombo Junior with "
                                 "FL40 facemask white",
                            description="CCM FitLite 40 helmet white combines "
                                        "white the advantage of a fully "
@@ -292,6 +284,7 @@ def populate_database():
                                        "innovation in safety and protection.",
                            category="Hockey",
                            last_modified=datetime.datetime.now())
-                     ])
-    session.commit()
-    session.close()
+                     ]
+    with engine.begin() as connection:
+        insert_categories(connection, categories)
+        insert_items(connection, sample_entries)
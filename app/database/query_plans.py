@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Query plan check for Elisabeth's Sports Item Catalog
+
+Runs every read helper of database_access (every get_*_from_db function),
+captures the SQL it sends and asks SQLite for the plan of each statement
+with EXPLAIN QUERY PLAN. A plan that reads a whole table (a SCAN without an
+index) or sorts rows in a temporary b-tree means that an index is missing or
+is not being used.
+
+Listing all categories is a scan by design and is not reported.
+"""
+
+import datetime
+import inspect
+import re
+
+from sqlalchemy.orm import Query
+
+from . import database_access
+from .database_access import session
+from .instrumentation import record_queries
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+# values for the parameters of the read helpers, by name - they do not
+# influence the plan; a new helper with another parameter needs one here
+SAMPLE_ARGUMENTS = {
+    'category_id': 1,
+    'item_id': 1,
+    'limit': 50,
+    'after': (datetime.datetime.now(), 1),
+    'after_version': 0,
+    'query': 'ball',
+}
+
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?(?!categories\b)\w+(?!.*\bINDEX\b)')
+TEMP_SORT = re.compile(r'USE TEMP B-TREE')
+
+
+def get_read_helpers():
+    """
+    Return the (helper, arguments) pairs to check: every get_*_from_db
+    function of database_access, once with its required parameters and once
+    more with all of them if it has optional ones.
+    """
+    helpers = []
+    for name, helper in sorted(vars(database_access).items()):
+        if not (name.startswith('get_') and name.endswith('_from_db') and
+                inspect.isfunction(helper)):
+            continue
+        parameters = inspect.signature(helper).parameters.values()
+        missing = [p.name for p in parameters
+                   if p.name not in SAMPLE_ARGUMENTS]
+        if missing:
+            raise ValueError(f"No sample value for {', '.join(missing)} "
+                             f"of {name}; add it to SAMPLE_ARGUMENTS.")
+        required = tuple(SAMPLE_ARGUMENTS[p.name] for p in parameters
+                         if p.default is p.empty)
+        helpers.append((helper, required))
+        if len(required) < len(parameters):
+            helpers.append((helper, tuple(SAMPLE_ARGUMENTS[p.name]
+                                          for p in parameters)))
+    return helpers
+
+
+def explain_query_plan(connection, statement, parameters):
+    rows = connection.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+    return [row[-1] for row in rows]
+
+
+def find_plan_problems(plan):
+    return [detail for detail in plan
+            if FULL_SCAN.search(detail) or TEMP_SORT.search(detail)]
+
+
+def check_query_plans(*engines):
+    """
+    Return a list of (helper name, statement, plan, problems) tuples, one for
+    every statement issued by the read helpers through one of engines.
+    """
+    results = []
+    try:
+        for helper, arguments in get_read_helpers():
+            with record_queries(*engines) as queries:
+                result = helper(*arguments)
+                if isinstance(result, Query):
+                    result.all()
+            with engines[0].connect() as connection:
+                for statement, parameters in queries:
+                    plan = explain_query_plan(connection, statement,
+                                              parameters)
+                    results.append((helper.__name__, statement, plan,
+                                    find_plan_problems(plan)))
+    finally:
+        session.remove()
+    return results
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Queue of access tokens to revoke for Elisabeth's Sports Item Catalog
+
+Signing out only enqueues the access token; token_revocation.py revokes it
+with the provider later and retries with backoff if that fails. The queue
+is the TOKEN_REVOCATIONS table, so tokens survive restarts and are shared
+by all worker processes. A worker claims an entry by moving its
+next_attempt into the future, so two processes never revoke the same token
+at the same time.
+"""
+
+import datetime
+
+from sqlalchemy import select, update, delete, func
+
+from .database_setup import TokenRevocations
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+table = TokenRevocations.__table__
+
+
+def enqueue_revocation(connection, provider, token, account_id=None):
+    now = datetime.datetime.now()
+    connection.execute(table.insert().values(
+        provider=provider, token=token, account_id=account_id, attempts=0,
+        next_attempt=now, created=now))
+
+
+def claim_due_revocations(connection, limit, lease):
+    """
+    Return up to limit entries whose next attempt is due and hold them back
+    from other workers for lease (a timedelta).
+    """
+    now = datetime.datetime.now()
+    due = connection.execute(
+        select([table]).where(table.c.next_attempt <= now)
+        .order_by(table.c.next_attempt).limit(limit)).fetchall()
+    claimed = []
+    for entry in due:
+        result = connection.execute(
+            update(table)
+            .where(table.c.id == entry.id)
+            .where(table.c.next_attempt == entry.next_attempt)
+            .values(next_attempt=now + lease))
+        if result.rowcount:
+            claimed.append(entry)
+    return claimed
+
+
+def remove_revocation(connection, entry_id):
+    connection.execute(delete(table).where(table.c.id == entry_id))
+
+
+def reschedule_revocation(connection, entry_id, attempts, next_attempt,
+                          error):
+    connection.execute(
+        update(table).where(table.c.id == entry_id)
+        .values(attempts=attempts, next_attempt=next_attempt,
+                last_error=error[:table.c.last_error.type.length]))
+
+
+def get_queue_stats(connection):
+    depth, oldest, due = connection.execute(
+        select([func.count(), func.min(table.c.created),
+                func.sum(table.c.next_attempt <= datetime.datetime.now())])
+    ).first()
+    return {'depth': depth,
+            'due': due or 0,
+            'oldest_seconds':
+                (datetime.datetime.now() - oldest).total_seconds()
+                if oldest else 0.0}
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Full-text search for Elisabeth's Sports Item Catalog
+
+Item names and descriptions are indexed in the SQLite FTS5 table
+ITEMS_SEARCH. It is an external content table: it stores only the index and
+reads the text from ITEMS, so the items are not stored twice. Triggers on
+ITEMS keep the index up to date on every insert, update and delete - also
+for bulk imports and for writes that bypass the application.
+
+Results are ranked with BM25; a match in the name counts more than a match
+in the description.
+"""
+
+import re
+
+from sqlalchemy import text
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+SEARCH_TABLE = 'items_search'
+
+# (name, statement) of the index and its triggers, in creation order
+SEARCH_OBJECTS = [
+    ('items_search', """
+        CREATE VIRTUAL TABLE items_search USING fts5(
+            name, description,
+            content='items', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2')"""),
+    ('items_search_insert', """
+        CREATE TRIGGER items_search_insert AFTER INSERT ON items BEGIN
+            INSERT INTO items_search (rowid, name, description)
+            VALUES (new.id, new.name, new.description);
+        END"""),
+    ('items_search_delete', """
+        CREATE TRIGGER items_search_delete AFTER DELETE ON items BEGIN
+            INSERT INTO items_search (items_search, rowid, name, description)
+            VALUES ('delete', old.id, old.name, old.description);
+        END"""),
+    ('items_search_update', """
+        CREATE TRIGGER items_search_update
+        AFTER UPDATE OF name, description ON items BEGIN
+            INSERT INTO items_search (items_search, rowid, name, description)
+            VALUES ('delete', old.id, old.name, old.description);
+            INSERT INTO items_search (rowid, name, description)
+            VALUES (new.id, new.name, new.description);
+        END"""),
+]
+
+# weights of the name and description columns in the ranking; ordering by
+# the rank column lets FTS5 sort the matches itself instead of SQLite
+# sorting them in a temporary b-tree
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+# marks the matched terms in snippets; the application strips control
+# characters from item texts when they are written (see
+# strip_control_characters()), so it can safely turn these into markup
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+# C0 control characters and DEL, except tab, line feed and carriage return
+CONTROL_CHARACTERS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]')
+SNIPPET_TOKENS = 16
+
+SEARCH_QUERY = text(f"""
+    SELECT items.id, items.name, categories.name AS category,
+           categories.slug AS category_slug,
+           snippet(items_search, -1, :match_start, :match_end, '…',
+                   {SNIPPET_TOKENS}) AS snippet
+    FROM items_search JOIN items ON items.id = items_search.rowid
+    JOIN categories ON categories.id = items.category_id
+    WHERE items_search MATCH :expression
+      AND rank MATCH 'bm25({NAME_WEIGHT}, {DESCRIPTION_WEIGHT})'
+    ORDER BY rank
+    LIMIT :limit""")
+
+TERM = re.compile(r'\w+')
+
+
+def create_search_index(connection):
+    """
+    Create the parts of the search index that are missing and return their
+    names. The index is filled if the table itself had to be created.
+    """
+    existing = {row[0] for row in connection.execute(
+        "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")}
+    created = []
+    for name, statement in SEARCH_OBJECTS:
+        if name not in existing:
+            connection.execute(statement)
+            created.append(name)
+    if SEARCH_TABLE in created:
+        rebuild_search_index(connection)
+    return created
+
+
+def rebuild_search_index(connection):
+    # reindexes the whole items table
+    connection.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) "
+                       f"VALUES ('rebuild')")
+
+
+def strip_control_characters(text):
+    # keeps MATCH_START and MATCH_END out of the item texts
+    return CONTROL_CHARACTERS.sub('', text)
+
+
+def match_expression(query):
+    """
+    Turn the text a user searched for into an FTS5 query: every word must
+    occur, the last one may be incomplete. Returns None if query contains no
+    words. Quoting the words keeps FTS5 operators in the input from being
+    interpreted.
+    """
+    terms = TERM.findall(query)
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def search_items(connection, query, limit):
+    """
+    Return the (id, name, category, category_slug, snippet) rows of the at
+    most limit items that match query best.
+    """
+    expression = match_expression(query)
+    if expression is None:
+        return []
+    return connection.execute(SEARCH_QUERY, {
+        'expression': expression, 'limit': limit,
+        'match_start': MATCH_START, 'match_end': MATCH_END}).fetchall()
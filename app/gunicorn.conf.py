@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+gunicorn configuration for Elisabeth's Sports Item Catalog
+
+The application is loaded once in the master process (preload_app) and then
+forked into one worker process per core. Each worker serves requests from a
+small pool of threads. The number of workers and threads can be set with
+CATALOG_WORKERS and CATALOG_THREADS.
+
+SIGHUP restarts the workers, which also makes them read the client secrets
+files again; CATALOG_RELOAD_CLIENT_SECRETS_ON_SIGHUP is not used here.
+"""
+
+import multiprocessing
+import os
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+bind = os.environ.get('CATALOG_BIND', '127.0.0.1:5000')
+workers = int(os.environ.get('CATALOG_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.environ.get('CATALOG_THREADS', 4))
+worker_class = 'gthread'
+preload_app = True
+
+
+def on_starting(server):
+    if os.environ.get('CATALOG_RELOAD_CLIENT_SECRETS_ON_SIGHUP') == '1':
+        server.log.warning("CATALOG_RELOAD_CLIENT_SECRETS_ON_SIGHUP is "
+                           "ignored: under gunicorn, SIGHUP restarts the "
+                           "workers, which read the client secrets again.")
+
+
+def post_fork(server, worker):
+    # Connections opened by the master process must not be shared with the
+    # workers; every worker starts with an empty connection pool.
+    for engine in server.app.wsgi().extensions['database']:
+        engine.dispose()
+    # threads do not survive the fork: start the token revocation worker of
+    # this process, which also revokes the tokens queued before a restart
+    server.app.wsgi().extensions['revocation_worker'].notify()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+JSON encoding for Elisabeth's Sports Item Catalog
+
+The JSON endpoints encode their responses with the JSON provider of the
+application (see init_json()):
+  *  OrjsonProvider uses the orjson package (pip3 install orjson), which
+     encodes several times faster than the json module
+  *  JSONProvider uses flask.json, i.e. the application's JSONEncoder
+JSON_LIBRARY selects one of them; by default orjson is used if it is
+installed. Both produce the same documents: keys sorted (unless
+JSON_SORT_KEYS is off) and datetimes in the HTTP date format of flask.json,
+e.g. 'Sun, 18 Oct 2026 17:04:32 GMT'.
+
+jsonify() and dumps() below replace flask.jsonify and flask.json.dumps in
+the views and serializers.
+"""
+
+import datetime
+
+from flask import current_app, json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep',
+          'Oct', 'Nov', 'Dec')
+
+
+def http_date(value):
+    """
+    Format a datetime like flask.json does (werkzeug.http.http_date()), but
+    without building a time tuple first. Naive datetimes are taken as UTC.
+    """
+    if value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc)
+    # %-formatting: the fastest way in CPython, and called for every item
+    return '%s, %02d %s %04d %02d:%02d:%02d GMT' % (
+        WEEKDAYS[value.weekday()], value.day, MONTHS[value.month - 1],
+        value.year, value.hour, value.minute, value.second)
+
+
+class JSONProvider(object):
+    name = 'flask'
+
+    def __init__(self, app):
+        self.app = app
+
+    def dumps(self, obj, pretty=False):
+        if pretty:
+            return json.dumps(obj, indent=2, separators=(', ', ': '))
+        return json.dumps(obj, separators=(',', ':'))
+
+    def response(self, obj, pretty=False):
+        return self.app.response_class(
+            self.dumps(obj, pretty) + '\n',
+            mimetype=self.app.config['JSONIFY_MIMETYPE'])
+
+
+class OrjsonProvider(JSONProvider):
+    name = 'orjson'
+
+    def __init__(self, app):
+        super().__init__(app)
+        # orjson would write datetimes in ISO 8601
+        self.options = orjson.OPT_PASSTHROUGH_DATETIME | \
+            orjson.OPT_NON_STR_KEYS
+        if app.config['JSON_SORT_KEYS']:
+            self.options |= orjson.OPT_SORT_KEYS
+        # dates, UUIDs, Markup etc. are encoded like flask.json does
+        self.encoder = app.json_encoder()
+
+    def default(self, value):
+        if isinstance(value, datetime.datetime):
+            return http_date(value)
+        return self.encoder.default(value)
+
+    def dumps(self, obj, pretty=False):
+        return self.dump_bytes(obj, pretty).decode()
+
+    def dump_bytes(self, obj, pretty=False):
+        options = self.options | orjson.OPT_INDENT_2 if pretty \
+            else self.options
+        return orjson.dumps(obj, default=self.default, option=options)
+
+    def response(self, obj, pretty=False):
+        return self.app.response_class(
+            self.dump_bytes(obj, pretty) + b'\n',
+            mimetype=self.app.config['JSONIFY_MIMETYPE'])
+
+
+PROVIDERS = {'flask': JSONProvider, 'orjson': OrjsonProvider}
+
+
+def init_json(app):
+    """Return the JSON provider configured by JSON_LIBRARY."""
+    library = app.config['JSON_LIBRARY'] or \
+        ('orjson' if orjson is not None else 'flask')
+    if library not in PROVIDERS:
+        raise ValueError(f"JSON_LIBRARY must be one of "
+                         f"{', '.join(PROVIDERS)}, not '{library}'")
+    if library == 'orjson' and orjson is None:
+        raise ValueError("JSON_LIBRARY is 'orjson', but the orjson package "
+                         "is not installed.")
+    return PROVIDERS[library](app)
+
+
+def dumps(obj):
+    return current_app.extensions['json_provider'].dumps(obj)
+
+
+def jsonify(*args, **kwargs):
+    """Like flask.jsonify, with the JSON provider of the application."""
+    if args and kwargs:
+        raise TypeError("jsonify() behavior undefined when passed both args "
+                        "and kwargs")
+    data = args[0] if len(args) == 1 else args or kwargs
+    pretty = current_app.config['JSONIFY_PRETTYPRINT_REGULAR'] or \
+        current_app.debug
+    return current_app.extensions['json_provider'].response(data, pretty)
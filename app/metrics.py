@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Metrics for Elisabeth's Sports Item Catalog
+
+init_metrics() instruments an application and collects, per process:
+  *  the latency of every request by endpoint, method and status
+  *  the number of SQL statements and the time spent in SQL per request
+     (from the engine events of the reader and the writer engine)
+  *  the time spent rendering templates per request
+  *  the latency of the calls to the sign-in providers
+and reports them, together with the page cache, sign-in and token
+revocation statistics, in the Prometheus text format (see
+MetricsRegistry.render()). Requests slower than SLOW_REQUEST_SECONDS are
+logged with the SQL statements they issued.
+
+Every worker process keeps its own metrics; a scrape sees the process that
+happened to answer it.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, request, has_request_context
+from jinja2 import Template
+from sqlalchemy import event
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+# statements logged with a slow request
+SLOW_REQUEST_STATEMENTS = 50
+
+
+'''
+# METRIC TYPES
+'''
+
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', r'\\').replace('"', r'\"') \
+            .replace('\n', r'\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter(object):
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *label_values):
+        with self._lock:
+            self._values[label_values] = \
+                self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            yield self.name, format_labels(self.labels, label_values), value
+
+
+class Histogram(object):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._values = {}  # label values -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            values = self._values.get(label_values)
+            if values is None:
+                values = self._values[label_values] = \
+                    [[0] * len(self.buckets), 0.0, 0]
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                values[0][index] += 1
+            values[1] += value
+            values[2] += 1
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total, count)
+                      for key, (counts, total, count) in self._values.items()}
+        names = self.labels + ('le',)
+        for label_values, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield (self.name + '_bucket',
+                       format_labels(names, label_values + (bound,)),
+                       cumulative)
+            yield (self.name + '_bucket',
+                   format_labels(names, label_values + ('+Inf',)), count)
+            labels = format_labels(self.labels, label_values)
+            yield self.name + '_sum', labels, total
+            yield self.name + '_count', labels, count
+
+
+class Collected(object):
+    """
+    Values read from elsewhere when the metrics are rendered: collect()
+    returns a number, or a dictionary that maps label value tuples to
+    numbers.
+    """
+    def __init__(self, name, help_text, collect, labels=(), kind='gauge'):
+        self.name = name
+        self.help_text = help_text
+        self.collect = collect
+        self.labels = labels
+        self.kind = kind
+
+    def samples(self):
+        values = self.collect()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for label_values, value in sorted(values.items()):
+            yield self.name, format_labels(self.labels, label_values), value
+
+
+class MetricsRegistry(object):
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help_text}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+'''
+# INSTRUMENTATION
+'''
+
+
+class TimedTemplate(Template):
+    # adds the time spent rendering to the current request
+    def render(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            if has_request_context():
+                g.template_seconds = g.get('template_seconds', 0.0) + \
+                    time.perf_counter() - started
+
+
+class RequestMetrics(object):
+    def __init__(self, app, engines, provider_client):
+        self.logger = app.logger
+        self.slow_request_seconds = app.config['SLOW_REQUEST_SECONDS']
+        self.registry = registry = MetricsRegistry()
+        self.requests = registry.add(Histogram(
+            'catalog_request_duration_seconds',
+            "Time from receiving a request to sending the last byte.",
+            ('endpoint', 'method', 'status')))
+        self.sql_statements = registry.add(Histogram(
+            'catalog_request_sql_statements',
+            "SQL statements issued per request.", ('endpoint',),
+            COUNT_BUCKETS))
+        self.sql_seconds = registry.add(Histogram(
+            'catalog_request_sql_duration_seconds',
+            "Time spent executing SQL per request.", ('endpoint',)))
+        self.template_seconds = registry.add(Histogram(
+            'catalog_request_template_duration_seconds',
+            "Time spent rendering templates per request.", ('endpoint',)))
+        self.all_sql_statements = registry.add(Counter(
+            'catalog_sql_statements_total',
+            "SQL statements issued, also outside of requests."))
+        self.provider_calls = registry.add(Histogram(
+            'catalog_provider_call_duration_seconds',
+            "Latency of calls to the sign-in providers.",
+            ('call', 'failed')))
+        self.slow_requests = registry.add(Counter(
+            'catalog_slow_requests_total',
+            "Requests slower than the slow request threshold.",
+            ('endpoint',)))
+
+        for engine in set(engines):
+            event.listen(engine, 'before_cursor_execute',
+                         self.before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute',
+                         self.after_cursor_execute)
+        provider_client.on_call = self.observe_provider_call
+        app.jinja_env.template_class = TimedTemplate
+        app.before_request(self.start_request)
+        app.after_request(self.remember_status)
+        # teardown, not after_request: streamed responses run their queries
+        # after the view has returned
+        app.teardown_request(self.end_request)
+
+    def start_request(self):
+        g.request_started = time.perf_counter()
+        g.sql_statements = []  # (statement, seconds)
+        g.template_seconds = 0.0
+
+    def remember_status(self, response):
+        g.response_status = response.status_code
+        return response
+
+    def end_request(self, exception=None):
+        if 'request_started' not in g:
+            return
+        seconds = time.perf_counter() - g.request_started
+        endpoint = request.endpoint or 'none'
+        status = g.get('response_status', 500)
+        statements = g.sql_statements
+        sql_seconds = sum(elapsed for _, elapsed in statements)
+        self.requests.observe(seconds, endpoint, request.method, str(status))
+        self.sql_statements.observe(len(statements), endpoint)
+        self.sql_seconds.observe(sql_seconds, endpoint)
+        self.template_seconds.observe(g.get('template_seconds', 0.0),
+                                      endpoint)
+        if seconds >= self.slow_request_seconds:
+            self.slow_requests.inc(1, endpoint)
+            self.log_slow_request(seconds, status, statements, sql_seconds)
+
+    def log_slow_request(self, seconds, status, statements, sql_seconds):
+        path = request.full_path.rstrip('?')
+        lines = [f"Slow request: {request.method} {path} -> {status} in "
+                 f"{seconds * 1000:.0f} ms, "
+                 f"{len(statements)} SQL statements in "
+                 f"{sql_seconds * 1000:.0f} ms, templates "
+                 f"{g.get('template_seconds', 0.0) * 1000:.0f} ms"]
+        for statement, elapsed in statements[:SLOW_REQUEST_STATEMENTS]:
+            lines.append(f"  {elapsed * 1000:7.1f} ms  " +
+                         " ".join(statement.split()))
+        if len(statements) > SLOW_REQUEST_STATEMENTS:
+            lines.append(f"  ... {len(statements) - SLOW_REQUEST_STATEMENTS}"
+                         f" more statements")
+        self.logger.warning("\n".join(lines))
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters,
+                              context, executemany):
+        conn.info.setdefault('statement_started', []).append(
+            time.perf_counter())
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters,
+                             context, executemany):
+        elapsed = time.perf_counter() - \
+            conn.info['statement_started'].pop()
+        self.all_sql_statements.inc()
+        if has_request_context() and 'sql_statements' in g:
+            g.sql_statements.append((statement, elapsed))
+
+    def observe_provider_call(self, name, seconds, failed):
+        self.provider_calls.observe(seconds, name, 'true' if failed
+                                    else 'false')
+
+
+def add_extension_metrics(registry, app):
+    # the statistics the extensions keep themselves, read at every scrape
+    cache = app.extensions.get('page_cache')
+    if cache is not None:
+        for key, kind in (('hits', 'counter'), ('misses', 'counter'),
+                          ('evictions', 'counter'),
+                          ('invalidations', 'counter'),
+                          ('entries', 'gauge'), ('size_bytes', 'gauge')):
+            registry.add(Collected(
+                f'catalog_page_cache_{key}' +
+                ('_total' if kind == 'counter' else ''),
+                f"Page cache {key.replace('_', ' ')}.",
+                lambda key=key: cache.stats()[key], kind=kind))
+    compression = app.extensions.get('compression')
+    if compression is not None and compression.cache is not None:
+        for key, kind in (('hits', 'counter'), ('misses', 'counter'),
+                          ('evictions', 'counter'), ('entries', 'gauge'),
+                          ('size_bytes', 'gauge')):
+            registry.add(Collected(
+                f'catalog_compression_cache_{key}' +
+                ('_total' if kind == 'counter' else ''),
+                f"Cache of compressed bodies {key.replace('_', ' ')}.",
+                lambda key=key: compression.cache.stats()[key], kind=kind))
+    client = app.extensions['provider_client']
+    registry.add(Collected(
+        'catalog_rejected_sign_ins_total',
+        "Sign-ins rejected because all sign-in slots were in use.",
+        lambda: client.rejected_sign_ins, kind='counter'))
+    worker = app.extensions['revocation_worker']
+    registry.add(Collected(
+        'catalog_revocation_queue',
+        "Tokens in the revocation queue: all of them (depth) and those "
+        "due for an attempt (due).",
+        lambda: {(key,): value for key, value in worker.stats().items()
+                 if key in ('depth', 'due')},
+        labels=('state',)))
+    registry.add(Collected(
+        'catalog_revocation_queue_oldest_seconds',
+        "Age of the oldest token in the revocation queue.",
+        lambda: worker.stats()['oldest_seconds']))
+
+
+def init_metrics(app):
+    """
+    Instrument app, which must have been set up with init_db() and have its
+    extensions, and return its RequestMetrics.
+    """
+    metrics = RequestMetrics(app, app.extensions['database'],
+                             app.extensions['provider_client'])
+    add_extension_metrics(metrics.registry, app)
+    return metrics
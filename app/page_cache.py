@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Rendered page cache for Elisabeth's Sports Item Catalog
+
+The index, category and item pages look the same for every visitor (the
+user header is loaded by JavaScript), so their rendered HTML can be reused
+until the catalog changes. PageCache keeps the rendered bodies in a least
+recently used cache with a memory budget.
+
+Every cached page carries tags naming the data it shows, e.g.
+'category:3' or 'item:12'. Writes log the tags they affect together
+with the new catalog version (see database_access.record_catalog_change()).
+Before a cached page is used, the cache catches up with the current catalog
+version and drops exactly the pages whose tags were changed - also for
+changes made by other worker processes.
+"""
+
+import sys
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, g, request
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+class PageCache(object):
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.version = None
+        self.size = 0
+        self._entries = OrderedDict()  # key -> (body, tags, size)
+        self._keys_by_tag = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def sync(self, version, load_changed_tags):
+        """
+        Catch up with the catalog version. load_changed_tags(after_version)
+        returns the tags changed since after_version, or None if that is
+        not known any more.
+        """
+        with self._lock:
+            if version == self.version:
+                return
+            seen_version = self.version
+        changed_tags = None
+        if seen_version is not None and version > seen_version:
+            changed_tags = load_changed_tags(seen_version)
+        with self._lock:
+            if self.version != seen_version:
+                # another thread synced in the meantime
+                return
+            if changed_tags is None:
+                self._clear()
+            else:
+                for tag in changed_tags:
+                    self._invalidate(tag)
+            self.version = version
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, body, tags, version):
+        size = sys.getsizeof(body)
+        with self._lock:
+            # a page rendered before the cache caught up with a newer
+            # version may show outdated data
+            if version != self.version or size > self.max_bytes:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (body, tags, size)
+            for tag in tags:
+                self._keys_by_tag.setdefault(tag, set()).add(key)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries),
+                    'size_bytes': self.size,
+                    'max_bytes': self.max_bytes,
+                    'version': self.version,
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'invalidations': self.invalidations}
+
+    def _remove(self, key):
+        body, tags, size = self._entries.pop(key)
+        for tag in tags:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+        self.size -= size
+
+    def _invalidate(self, tag):
+        for key in list(self._keys_by_tag.get(tag, ())):
+            self._remove(key)
+            self.invalidations += 1
+
+    def _clear(self):
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+        self._keys_by_tag.clear()
+        self.size = 0
+
+
+def tag_page(*tags):
+    """Add tags to the page that is currently being rendered."""
+    g.setdefault('page_tags', set()).update(tags)
+
+
+def request_key(arguments):
+    """
+    Return a key for the current request made of its endpoint, its view
+    arguments and the values of the query arguments named in arguments.
+    Other query arguments do not change the response, so requests that only
+    differ in them share a cache entry instead of adding one each.
+    """
+    return (request.endpoint,
+            tuple(sorted((request.view_args or {}).items())),
+            tuple(request.args.get(name) for name in arguments))
+
+
+def cached_page(get_version, load_changed_tags, tags=None,
+                arguments=('limit', 'after')):
+    """
+    Decorator for views that return a rendered page. get_version() returns
+    the current catalog version, load_changed_tags is passed on to
+    PageCache.sync(), tags(**view_args) returns the tags of the page; the
+    view can add more with tag_page(). arguments names the query arguments
+    the view reads; the page is cached per combination of their values.
+    """
+    def decorator(view):
+        @wraps(view)
+        def decorated_view(*args, **kwargs):
+            cache = current_app.extensions.get('page_cache')
+            if cache is None:
+                return view(*args, **kwargs)
+            version = get_version()
+            cache.sync(version, load_changed_tags)
+            key = request_key(arguments)
+            body = cache.get(key)
+            if body is not None:
+                return body
+            body = view(*args, **kwargs)
+            if isinstance(body, str):
+                page_tags = set(tags(**kwargs)) if tags else set()
+                page_tags |= g.get('page_tags', set())
+                cache.put(key, body, page_tags, version)
+            return body
+        return decorated_view
+    return decorator
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Keyset pagination for Elisabeth's Sports Item Catalog
+
+Item lists are ordered newest first by (last_modified, id). A page is
+described by its size (limit) and the position of the last item of the
+previous page (after). That position is handed to clients as an opaque
+cursor string, so fetching a deep page costs the same as fetching the first
+one - unlike an OFFSET, which has to skip all preceding rows.
+"""
+
+import datetime
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from binascii import Error as Base64Error
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+def encode_cursor(item):
+    position = f"{item.last_modified.isoformat()}|{item.id}"
+    return urlsafe_b64encode(position.encode('utf-8')).decode('ascii') \
+        .rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Return the (last_modified, id) position encoded in cursor. Raises
+    ValueError if the cursor is malformed.
+    """
+    try:
+        position = urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)) \
+            .decode('utf-8')
+        last_modified, item_id = position.split('|')
+        return datetime.datetime.fromisoformat(last_modified), int(item_id)
+    except (Base64Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor '{}'.".format(cursor))
+
+
+def parse_page_arguments(args, default_limit, max_limit):
+    """
+    Read the limit and after arguments from the query string args and
+    return them as (limit, position). Raises ValueError for invalid values.
+    """
+    try:
+        limit = int(args.get('limit', default_limit))
+    except ValueError:
+        raise ValueError("The limit must be a number.")
+    if not 1 <= limit <= max_limit:
+        raise ValueError("The limit must be between 1 and "
+                         "{}.".format(max_limit))
+    after = args.get('after')
+    position = decode_cursor(after) if after else None
+    return limit, position
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+HTTP client for the sign-in providers of Elisabeth's Sports Item Catalog
+
+All calls to Google and Facebook go through one ProviderClient per
+application. It keeps a pool of keep-alive connections per host, so the
+TCP and TLS handshakes are paid once instead of on every call, gives every
+call a connect and a read timeout, retries failed connections and (for
+idempotent calls) responses like 503 a bounded number of times with
+backoff, and records the latency of every upstream call by name.
+
+Calls that do not depend on each other can run at the same time in the
+client's thread pool (see run_concurrently()). To keep slow providers from
+tying up all threads of a worker process, only a limited number of sign-ins
+may wait for providers at once (see sign_in_slot()); further sign-ins are
+turned away with ProviderBusy instead of queueing up behind them.
+
+The base URLs of the providers are configurable, so the client can be
+pointed at a local stub server.
+
+requests, urllib3 and httplib2 are imported when the first call is made:
+most worker processes serve the catalog without ever signing anybody in.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+class ProviderError(Exception):
+    """A provider could not be reached or did not answer in time."""
+
+
+class ProviderBusy(ProviderError):
+    """Too many sign-ins are waiting for the providers already."""
+
+
+def create_session(pool_size, retries, backoff):
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    retry = Retry(total=retries, backoff_factor=backoff,
+                  status_forcelist=(500, 502, 503, 504),
+                  method_whitelist=frozenset(['GET', 'DELETE']),
+                  raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=pool_size,
+                          pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class ProviderClient(object):
+    def __init__(self, pool_size=10, connect_timeout=3.05, read_timeout=10,
+                 retries=2, backoff=0.2, max_workers=8, max_sign_ins=2,
+                 sign_in_timeout=1):
+        self.timeout = (connect_timeout, read_timeout)
+        self._session_args = (pool_size, retries, backoff)
+        self._session = None
+        self._executor = ThreadPoolExecutor(max_workers,
+                                            thread_name_prefix='provider')
+        self._sign_ins = threading.BoundedSemaphore(max_sign_ins)
+        self.sign_in_timeout = sign_in_timeout
+        self.rejected_sign_ins = 0
+        self._calls = {}  # name -> call statistics
+        self._lock = threading.Lock()
+        # called with (name, seconds, failed) after every call, e.g. by
+        # metrics.py
+        self.on_call = None
+
+    @property
+    def session(self):
+        # created by the first call, see the module docstring
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = create_session(*self._session_args)
+        return self._session
+
+    def request(self, name, method, url, **kwargs):
+        """
+        Send a request and return the requests.Response. name identifies
+        the upstream call in the statistics, e.g. 'google.tokeninfo'.
+        Raises ProviderError if the provider cannot be reached or times out.
+        """
+        import requests
+
+        session = self.session
+        kwargs.setdefault('timeout', self.timeout)
+        started = time.perf_counter()
+        try:
+            response = session.request(method, url, **kwargs)
+        except requests.RequestException as e:
+            self._record(name, time.perf_counter() - started, failed=True)
+            # the message of e contains the URL, which may carry a token
+            raise ProviderError(f"{name}: {type(e).__name__}") from e
+        self._record(name, time.perf_counter() - started,
+                     failed=response.status_code >= 500)
+        return response
+
+    def get_json(self, name, url, **kwargs):
+        response = self.request(name, 'GET', url, **kwargs)
+        try:
+            return response.json()
+        except ValueError as e:
+            raise ProviderError(f"{name}: invalid JSON response") from e
+
+    def httplib2_request(self, name):
+        """
+        Return a function with the signature of httplib2.Http.request() that
+        sends its requests through this client, for libraries such as
+        oauth2client that expect an httplib2 object.
+        """
+        import httplib2
+
+        def request(uri, method='GET', body=None, headers=None, **kwargs):
+            response = self.request(name, method, uri, data=body,
+                                    headers=headers)
+            info = dict(response.headers)
+            info['status'] = str(response.status_code)
+            return httplib2.Response(info), response.content
+        return request
+
+    def run_concurrently(self, *calls):
+        """
+        Run the functions calls at the same time and return their results
+        in the same order. The first exception raised by a call is raised
+        again.
+        """
+        futures = [self._executor.submit(call) for call in calls]
+        return [future.result() for future in futures]
+
+    @contextmanager
+    def sign_in_slot(self):
+        """
+        Wait at most sign_in_timeout seconds for one of the max_sign_ins
+        slots for talking to the providers. Raises ProviderBusy if none
+        becomes free.
+        """
+        if not self._sign_ins.acquire(timeout=self.sign_in_timeout):
+            with self._lock:
+                self.rejected_sign_ins += 1
+            raise ProviderBusy("all sign-in slots are in use")
+        try:
+            yield
+        finally:
+            self._sign_ins.release()
+
+    def stats(self):
+        with self._lock:
+            return {'calls': {name: dict(calls)
+                              for name, calls in self._calls.items()},
+                    'rejected_sign_ins': self.rejected_sign_ins}
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        if self._session is not None:
+            self._session.close()
+
+    def _record(self, name, seconds, failed):
+        with self._lock:
+            calls = self._calls.setdefault(name, {
+                'calls': 0, 'errors': 0, 'total_seconds': 0.0,
+                'max_seconds': 0.0})
+            calls['calls'] += 1
+            if failed:
+                calls['errors'] += 1
+            calls['total_seconds'] += seconds
+            calls['max_seconds'] = max(calls['max_seconds'], seconds)
+        if self.on_call is not None:
+            self.on_call(name, seconds, failed)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Client secrets of the sign-in providers of Elisabeth's Sports Item Catalog
+
+ProviderSecrets reads and validates client_secrets.json (Google) and
+fb_client_secrets.json (Facebook) once, when the application is created,
+and hands the parsed values to the sign-in handlers, so that signing in
+does not read or parse any file.
+
+The files are read again when they change: the sign-in handlers call
+check(), which compares the modification times of the files at most every
+check_interval seconds. A reload can also be requested with SIGHUP (see
+reload_on_sighup()) when the application is served by a single process,
+e.g. the werkzeug server; it cannot be used under gunicorn, whose master
+process handles SIGHUP itself (it restarts the workers, which read the
+files anew anyway). A file that is missing or invalid disables sign-in
+with its provider, also when it is removed after it was loaded; if a
+changed file is invalid, the values loaded before are kept.
+"""
+
+import json
+import logging
+import os
+import signal
+import threading
+import time
+
+from oauth2client import clientsecrets
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+logger = logging.getLogger(__name__)
+
+
+def load_google_secrets(path):
+    with open(path, 'r') as f:
+        client_type, client_info = clientsecrets.loads(f.read())
+    if client_type != clientsecrets.TYPE_WEB:
+        raise ValueError(f"'{path}' does not describe a web application.")
+    return client_info
+
+
+def load_facebook_secrets(path):
+    with open(path, 'r') as f:
+        client_info = json.load(f)['web']
+    for field in ('app_id', 'app_secret'):
+        value = client_info.get(field)
+        if not value or value.startswith('INSERT '):
+            raise ValueError(f"'{path}' does not contain the {field}.")
+    return client_info
+
+
+LOADERS = {'google': load_google_secrets,
+           'facebook': load_facebook_secrets}
+
+
+class ProviderSecrets(object):
+    def __init__(self, paths, check_interval=5):
+        """paths maps the provider names 'google' and 'facebook' to files."""
+        self.paths = paths
+        self.check_interval = check_interval
+        self._secrets = {}
+        self._mtimes = {}
+        self._next_check = 0
+        self._reload_requested = False
+        self._lock = threading.Lock()
+        self.reload()
+
+    def get(self, provider):
+        """Return the client secrets of provider, or None if unavailable."""
+        return self._secrets.get(provider)
+
+    def check(self):
+        """Reload the files that changed since they were loaded."""
+        now = time.monotonic()
+        if not self._reload_requested and (
+                not self.check_interval or now < self._next_check):
+            return
+        self._next_check = now + self.check_interval
+        if self._reload_requested or self._mtimes != self._read_mtimes():
+            self.reload()
+
+    def reload(self):
+        with self._lock:
+            self._reload_requested = False
+            mtimes = self._read_mtimes()
+            for provider, path in self.paths.items():
+                if provider in self._secrets and \
+                        mtimes[provider] == self._mtimes.get(provider):
+                    continue
+                try:
+                    self._secrets[provider] = LOADERS[provider](path)
+                except (OSError, ValueError, KeyError,
+                        clientsecrets.InvalidClientSecretsError) as e:
+                    if provider in self._secrets and \
+                            mtimes[provider] is not None:
+                        logger.error("Keeping the %s client secrets loaded "
+                                     "before; '%s' is invalid: %s",
+                                     provider, path, e)
+                    else:
+                        # a removed file takes its secrets with it
+                        self._secrets.pop(provider, None)
+                        logger.warning("Sign-in with %s is disabled: %s",
+                                       provider, e)
+            self._mtimes = mtimes
+
+    def reload_on_sighup(self):
+        # Not for gunicorn: its master process replaces the handler with its
+        # own, and its workers reset SIGHUP to the default, which ends them.
+        # The handler only marks the files for reloading: the next check()
+        # reads them, outside of the signal handler.
+        def request_reload(signum, frame):
+            self._reload_requested = True
+        signal.signal(signal.SIGHUP, request_reload)
+
+    def _read_mtimes(self):
+        mtimes = {}
+        for provider, path in self.paths.items():
+            try:
+                mtimes[provider] = os.stat(path).st_mtime_ns
+            except OSError:
+                mtimes[provider] = None
+        return mtimes
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Query budgets for Elisabeth's Sports Item Catalog
+
+Every endpoint declares with @query_budget(n) the most SQL statements a
+request to it may issue, whatever the size of the catalog. The budgets are
+enforced by QueryBudgets, depending on QUERY_BUDGETS:
+  *  'raise': a request over its budget raises QueryBudgetExceeded, which
+     fails the test (the default when the application is testing)
+  *  'log': requests over their budget and requests that issue the same
+     statement with the same parameters more than once are logged (the
+     default in debug mode)
+  *  'off': nothing is checked (the default otherwise)
+The statements of a streamed response are counted until its last chunk.
+'flask catalog check-query-counts' checks the budgets of sample URLs.
+"""
+
+from collections import Counter
+
+from flask import current_app, g, request, has_request_context
+from sqlalchemy import event
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+MODES = ('raise', 'log', 'off')
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(limit):
+    """
+    Declare that a request to the decorated view issues at most limit SQL
+    statements. Put it right below the route decorators.
+    """
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def get_query_budget(endpoint):
+    view = current_app.view_functions.get(endpoint)
+    return getattr(view, 'query_budget', None)
+
+
+def normalize_parameters(parameters):
+    # an id from the URL ('7') and from a loaded row (7) select the same row
+    if isinstance(parameters, (tuple, list)):
+        return tuple(str(parameter) for parameter in parameters)
+    return repr(parameters)
+
+
+def find_duplicates(statements):
+    """Return the (statement, parameters) pairs issued more than once."""
+    counts = Counter((statement, normalize_parameters(parameters))
+                     for statement, parameters in statements)
+    return [(statement, parameters, count)
+            for (statement, parameters), count in counts.items()
+            if count > 1]
+
+
+def format_report(endpoint, limit, statements):
+    lines = [f"{request.method} {request.full_path.rstrip('?')} "
+             f"({endpoint}) issued {len(statements)} SQL statements, "
+             f"budget {limit}:"]
+    for statement, parameters in statements:
+        lines.append(f"  {' '.join(statement.split())}  {parameters!r}")
+    duplicates = find_duplicates(statements)
+    if duplicates:
+        lines.append("Issued more than once:")
+        for statement, parameters, count in duplicates:
+            lines.append(f"  {count}x {' '.join(statement.split())}  "
+                         f"{parameters}")
+    return "\n".join(lines)
+
+
+class QueryBudgets(object):
+    def __init__(self, app):
+        self.app = app
+        self.mode = app.config['QUERY_BUDGETS']
+        if self.mode and self.mode not in MODES:
+            raise ValueError(f"QUERY_BUDGETS must be one of "
+                             f"{', '.join(MODES)}, not '{self.mode}'")
+        for engine in set(app.extensions['database']):
+            event.listen(engine, 'before_cursor_execute',
+                         self.before_cursor_execute)
+        app.before_request(self.start_request)
+        # teardown: streamed responses issue statements after the view
+        # has returned
+        app.teardown_request(self.check_request)
+
+    def get_mode(self):
+        if self.mode:
+            return self.mode
+        if self.app.testing:
+            return 'raise'
+        return 'log' if self.app.debug else 'off'
+
+    def start_request(self):
+        mode = self.get_mode()
+        if mode != 'off':
+            g.budgeted_statements = []
+            g.query_budget_mode = mode
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters,
+                              context, executemany):
+        if has_request_context() and 'budgeted_statements' in g:
+            g.budgeted_statements.append((statement, parameters))
+
+    def check_request(self, exception=None):
+        statements = g.pop('budgeted_statements', None)
+        if statements is None:
+            return
+        endpoint = request.endpoint
+        limit = get_query_budget(endpoint)
+        exceeded = limit is not None and len(statements) > limit
+        if g.query_budget_mode == 'raise':
+            # do not hide the exception the request failed with
+            if exceeded and exception is None:
+                raise QueryBudgetExceeded(
+                    format_report(endpoint, limit, statements))
+        elif exceeded or find_duplicates(statements):
+            self.app.logger.warning(format_report(endpoint, limit,
+                                                  statements))
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Serializers for the JSON endpoints of Elisabeth's Sports Item Catalog
+
+The endpoints either build the whole document and pass it to jsonify, or -
+in streaming mode - write it piece by piece with the generators at the end
+of this module. Both take the items as rows of the columns in
+database_access.ITEM_COLUMNS, which are turned into the dictionaries of
+Items.serialize without building ORM objects first; the JSON provider
+encodes them (see json_provider.py).
+"""
+
+from itertools import groupby
+from operator import itemgetter
+
+from json_provider import dumps
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+ITEM_FIELDS = ('id', 'name', 'description', 'category', 'last_modified')
+
+category_of = itemgetter(ITEM_FIELDS.index('category'))
+
+
+def serialize_item(row):
+    # rows may carry further columns after ITEM_FIELDS, e.g. the slug
+    return dict(zip(ITEM_FIELDS, row))
+
+
+def serialize_catalog(rows):
+    """
+    Build the 'Catalog' structure of /catalog.json in a single pass.
+
+    rows are ordered by category name, as returned by
+    get_catalog_rows_from_db(); the id is None for a category without items.
+    """
+    serialized_catalog = {}
+    for category, category_rows in groupby(rows, key=category_of):
+        serialized_catalog[category] = {
+            'Items': [serialize_item(row) for row in category_rows
+                      if row[0] is not None]
+        }
+    return serialized_catalog
+
+
+'''
+# STREAMING SERIALIZERS
+  The generators below produce the same documents as the serializers above
+  (or one JSON document per line for NDJSON) piece by piece, so that a
+  response can be sent while the rows are still being fetched. Small pieces
+  are collected into chunks of about CHUNK_SIZE characters.
+'''
+
+CHUNK_SIZE = 16 * 1024
+
+
+def chunked(pieces, chunk_size=CHUNK_SIZE):
+    buffer = []
+    size = 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def stream_catalog(rows):
+    """Stream /catalog.json from the rows of get_catalog_rows_from_db()."""
+    yield '{"Catalog":{'
+    separator = ''
+    for category, category_rows in groupby(rows, key=category_of):
+        yield separator + dumps(category) + ':{"Items":['
+        separator = ','
+        item_separator = ''
+        for row in category_rows:
+            if row[0] is not None:
+                yield item_separator + dumps(serialize_item(row))
+                item_separator = ','
+        yield ']}'
+    yield '}}\n'
+
+
+def stream_category(category, rows):
+    """
+    Stream /catalog/<category>.json from the rows of
+    get_item_rows_from_db(). The number of items is counted while the items
+    are written, so no separate count query is needed.
+    """
+    yield '{"Category":{"Items":['
+    number_of_items = 0
+    for row in rows:
+        yield (',' if number_of_items else '') + \
+            dumps(serialize_item(row))
+        number_of_items += 1
+    yield '],"Name":' + dumps(category) + \
+          ',"Number fo items":' + str(number_of_items) + '}}\n'
+
+
+def stream_ndjson(rows):
+    """Stream one serialized item per line."""
+    for row in rows:
+        yield dumps(serialize_item(row)) + '\n'
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Fingerprinted static files for Elisabeth's Sports Item Catalog
+
+`flask catalog build-static` (see build_static_assets()) copies every file
+in the static folder to static/build, with a hash of its content in the
+name (style.css -> style.3f9a0c1b2d4e.css), and writes precompressed
+gzip and - if the brotli package is installed - brotli variants of the
+text files next to the copies. References between the files, such as
+url() and @import in style sheets, are rewritten to the fingerprinted names.
+build/manifest.json maps the original names to the fingerprinted ones.
+
+If a manifest exists when the application is created, StaticAssets makes
+url_for('static', filename=...) point to the fingerprinted files and serves
+them with the precompressed variant the client accepts and with headers
+that let browsers and proxies keep them for a year without revalidating:
+a changed file gets a new name. Files that are not in the manifest are
+served as before, e.g. when build-static has not been run yet. The copies
+of earlier builds are kept, so pages cached by clients before a deployment
+can still load the files they refer to.
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+
+from flask import current_app, request, send_from_directory
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+BUILD_FOLDER = 'build'
+MANIFEST = 'manifest.json'
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# files worth compressing; images like JPEG are compressed already
+PRECOMPRESSED_EXTENSIONS = {'.css', '.js', '.svg', '.ico', '.txt', '.html',
+                            '.json'}
+# the static files are compressed once, at the highest levels
+VARIANTS = [('br', '.br'), ('gzip', '.gz')]
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+?)\1\s*\)')
+CSS_IMPORT = re.compile(r'@import\s+([\'"])([^\'"]+)\1')
+
+
+'''
+# BUILD
+'''
+
+
+def source_files(static_folder):
+    """Return the paths of the static files, relative to static_folder."""
+    paths = []
+    for directory, subdirectories, filenames in os.walk(static_folder):
+        if directory == static_folder and BUILD_FOLDER in subdirectories:
+            subdirectories.remove(BUILD_FOLDER)
+        for filename in filenames:
+            path = os.path.relpath(os.path.join(directory, filename),
+                                   static_folder)
+            paths.append(path.replace(os.sep, '/'))
+    return sorted(paths)
+
+
+def split_reference(reference):
+    """Split a reference like 'font.woff?v=2#icons' into path and rest."""
+    return re.match(r'([^?#]*)(.*)', reference, re.DOTALL).groups()
+
+
+def resolve_reference(reference, name):
+    """
+    Return the static path a style sheet name refers to with reference, or
+    None for references to other sites, data URLs and the like.
+    """
+    if ':' in reference or reference.startswith(('/', '#')):
+        return None
+    path, _ = split_reference(reference)
+    return posixpath.normpath(posixpath.join(posixpath.dirname(name), path))
+
+
+def css_references(css, name):
+    return [resolve_reference(match.group(2), name)
+            for pattern in (CSS_URL, CSS_IMPORT)
+            for match in pattern.finditer(css)]
+
+
+def rewrite_css(css, name, manifest):
+    def replace(match):
+        reference = match.group(2)
+        path = resolve_reference(reference, name)
+        if path not in manifest:
+            return match.group(0)
+        # the fingerprinted files keep the directory layout
+        built = posixpath.relpath(manifest[path],
+                                  posixpath.dirname(name) or '.')
+        return match.group(0).replace(
+            reference, built + split_reference(reference)[1], 1)
+    for pattern in (CSS_URL, CSS_IMPORT):
+        css = pattern.sub(replace, css)
+    return css
+
+
+def fingerprint(name, data):
+    root, extension = posixpath.splitext(name)
+    return f'{root}.{hashlib.sha256(data).hexdigest()[:12]}{extension}'
+
+
+def compress_variants(data):
+    """Return the (suffix, body) of the variants that are smaller."""
+    # mtime=0: the same file always gives the same .gz
+    variants = [('.gz', gzip.compress(data, GZIP_LEVEL, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(data,
+                                                quality=BROTLI_QUALITY)))
+    return [(suffix, body) for suffix, body in variants
+            if len(body) < len(data)]
+
+
+def write_file(folder, path, data):
+    # written under a temporary name and renamed, so a server never sends
+    # half a file
+    target = os.path.join(folder, *path.split('/'))
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open(target + '.tmp', 'wb') as f:
+        f.write(data)
+    os.replace(target + '.tmp', target)
+
+
+def build_static_assets(static_folder):
+    """
+    Write the fingerprinted and precompressed static files and the manifest
+    to the build folder of static_folder and return the manifest.
+    """
+    build_folder = os.path.join(static_folder, BUILD_FOLDER)
+    sources = set(source_files(static_folder))
+    manifest = {}
+
+    def build(name, building):
+        with open(os.path.join(static_folder, *name.split('/')), 'rb') as f:
+            data = f.read()
+        if name.endswith('.css'):
+            css = data.decode('utf-8')
+            # the files a style sheet refers to get their names first
+            for path in css_references(css, name):
+                if path in sources and path not in manifest and \
+                        path not in building:
+                    build(path, building | {name})
+            data = rewrite_css(css, name, manifest).encode('utf-8')
+        built = fingerprint(name, data)
+        write_file(build_folder, built, data)
+        if posixpath.splitext(name)[1] in PRECOMPRESSED_EXTENSIONS:
+            for suffix, body in compress_variants(data):
+                write_file(build_folder, built + suffix, body)
+        manifest[name] = built
+
+    for name in sorted(sources):
+        if name not in manifest:
+            build(name, frozenset())
+    # written last: it refers to the files written above
+    write_file(build_folder, MANIFEST,
+               json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+
+'''
+# SERVING
+'''
+
+
+def load_manifest(build_folder):
+    try:
+        with open(os.path.join(build_folder, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+class StaticAssets(object):
+    def __init__(self, app):
+        self.build_folder = os.path.join(app.static_folder, BUILD_FOLDER)
+        self.manifest = load_manifest(self.build_folder)
+        # fingerprinted path -> encodings of its precompressed variants
+        self.variants = {
+            built: [encoding for encoding, suffix in VARIANTS
+                    if os.path.isfile(os.path.join(self.build_folder,
+                                                   built + suffix))]
+            for built in self.manifest.values()}
+        if self.manifest:
+            app.url_defaults(self.fingerprint_url)
+        app.view_functions['static'] = self.send_static_file
+
+    def fingerprint_url(self, endpoint, values):
+        if endpoint == 'static':
+            built = self.manifest.get(values.get('filename'))
+            if built is not None:
+                values['filename'] = f'{BUILD_FOLDER}/{built}'
+
+    def send_static_file(self, filename):
+        built = filename[len(BUILD_FOLDER) + 1:] \
+            if filename.startswith(BUILD_FOLDER + '/') else None
+        if built not in self.variants:
+            return current_app.send_static_file(filename)
+        variants = self.variants[built]
+        encoding = request.accept_encodings.best_match(variants) \
+            if variants else None
+        path = built + dict(VARIANTS)[encoding] if encoding else built
+        response = send_from_directory(
+            self.build_folder, path,
+            mimetype=mimetypes.guess_type(built)[0] or
+            'application/octet-stream')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if variants:
+            response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        return response
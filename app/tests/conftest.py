@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+pytest fixtures for Elisabeth's Sports Item Catalog
+
+The application modules import each other from the app folder (like
+`python application.py` does), so it is put on the module search path.
+"""
+
+import os
+import sys
+
+import pytest
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+APP_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_FOLDER)
+
+
+@pytest.fixture(scope='module')
+def make_app(tmp_path_factory):
+    """Create applications, each on a new database with the sample catalog."""
+    from application import create_app
+    from database import database_access
+
+    def make_app():
+        database = tmp_path_factory.mktemp('catalog') / 'catalog.db'
+        app = create_app({
+            'TESTING': True,
+            'SECRET_KEY': 'test',
+            'DATABASE_URL': f'sqlite:///{database}',
+            'QUERY_BUDGETS': 'raise',
+            # nothing may leave the machine, e.g. token revocations
+            'GOOGLE_ACCOUNTS_URL': 'http://127.0.0.1:9',
+            'FACEBOOK_GRAPH_URL': 'http://127.0.0.1:9',
+        })
+        with app.app_context():
+            database_access.setup_db()
+        return app
+    return make_app
+
+
+@pytest.fixture(scope='module')
+def app(make_app):
+    """The application on a new database with the sample catalog."""
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def signed_in_client(client):
+    # what a sign-in stores in the login session, see application.py
+    with client.session_transaction() as login_session:
+        login_session['provider'] = 'google'
+        login_session['access_token'] = 'token'
+        login_session['username'] = 'Tester'
+        login_session['state'] = 'state'
+    return client
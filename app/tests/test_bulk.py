@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Bulk import tests for Elisabeth's Sports Item Catalog
+
+Imports small CSV and NDJSON files (see database/bulk.py): invalid rows are
+skipped with their reasons, an import interrupted by a failing batch
+continues after the last committed batch, and a file that has been imported
+completely is only imported again with restart.
+"""
+
+import csv
+import json
+
+import pytest
+
+from database import bulk
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+class BatchFailed(Exception):
+    pass
+
+
+@pytest.fixture
+def engine(app):
+    return app.extensions['database'][0]
+
+
+def count_items(engine, prefix):
+    with engine.connect() as connection:
+        return connection.scalar(
+            "SELECT count(*) FROM items WHERE name LIKE ?", prefix + '%')
+
+
+def write_ndjson(path, lines):
+    path.write_text(''.join(line + '\n' for line in lines),
+                    encoding='utf-8')
+    return str(path)
+
+
+def item(name, category='Soccer', **fields):
+    return json.dumps(dict(name=name, description='Imported.',
+                           category=category, **fields))
+
+
+def test_skipped_rows_are_reported(engine, tmp_path):
+    path = tmp_path / 'items.csv'
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(bulk.FIELDS)
+        writer.writerow(['Report ok', 'Fine.', 'Curling', ''])
+        writer.writerow(['', 'No name.', 'Soccer', ''])
+        writer.writerow(['Report long', 'x' * 300, 'Soccer', ''])
+        writer.writerow(['Report date', 'Bad date.', 'Soccer', 'yesterday'])
+        writer.writerow(['Report ok 2', 'Fine.', 'Soccer',
+                         '2019-08-01T12:00:00'])
+
+    summary = bulk.import_items(engine, str(path),
+                                batch_size=2)
+
+    assert summary['imported'] == 2
+    assert summary['skipped'] == 3
+    assert summary['skip_reasons'] == {
+        "'name' is missing": 1,
+        "'description' is longer than 250 characters": 1,
+        "'last_modified' is not an ISO 8601 date": 1}
+    assert count_items(engine, 'Report ') == 2
+    # the missing category was created
+    with engine.connect() as connection:
+        assert connection.scalar(
+            "SELECT slug FROM categories WHERE name = 'Curling'") == 'curling'
+
+
+def test_interrupted_import_resumes(engine, tmp_path, monkeypatch):
+    lines = [item(f'Resume {number}') for number in range(1, 11)]
+    lines[1] = '{"name": "Resume broken'
+    lines[7] = item('', category='Soccer')
+    path = write_ndjson(tmp_path / 'items.ndjson', lines)
+
+    insert_items = bulk.insert_items
+    calls = []
+
+    def fail_third_batch(connection, rows):
+        calls.append(len(rows))
+        if len(calls) == 3:
+            # after the items of the batch have been written
+            insert_items(connection, rows)
+            raise BatchFailed()
+        return insert_items(connection, rows)
+
+    monkeypatch.setattr(bulk, 'insert_items', fail_third_batch)
+    with pytest.raises(BatchFailed):
+        bulk.import_items(engine, path, batch_size=3)
+    # rows 1-6 in two batches; the third batch was rolled back
+    assert count_items(engine, 'Resume ') == 5
+    monkeypatch.setattr(bulk, 'insert_items', insert_items)
+
+    summary = bulk.import_items(engine, path, batch_size=3)
+    assert summary['resumed_after'] == 6
+    assert summary['imported'] == 3
+    assert summary['skip_reasons'] == {"'name' is missing": 1}
+    assert count_items(engine, 'Resume ') == 8
+    with engine.connect() as connection:
+        names = [row[0] for row in connection.execute(
+            "SELECT name FROM items WHERE name LIKE 'Resume %' "
+            "ORDER BY id")]
+    assert names == ['Resume 1', 'Resume 3', 'Resume 4', 'Resume 5',
+                     'Resume 6', 'Resume 7', 'Resume 9', 'Resume 10']
+
+    summary = bulk.import_items(engine, path, batch_size=3)
+    assert summary['already_imported']
+    assert summary['imported'] == 0
+    assert count_items(engine, 'Resume ') == 8
+
+    summary = bulk.import_items(engine, path, batch_size=3,
+                                restart=True)
+    assert not summary['already_imported']
+    assert summary['resumed_after'] == 0
+    assert summary['imported'] == 8
+    assert count_items(engine, 'Resume ') == 16
+
+
+def test_changed_file_is_a_new_import(engine, tmp_path):
+    path = write_ndjson(tmp_path / 'items.ndjson', [item('Changed 1')])
+    assert bulk.import_items(engine, path)['imported'] == 1
+    write_ndjson(tmp_path / 'items.ndjson',
+                 [item('Changed 1'), item('Changed 2')])
+    summary = bulk.import_items(engine, path)
+    assert not summary['already_imported']
+    assert summary['imported'] == 2
+    assert count_items(engine, 'Changed ') == 3
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Command line tests for Elisabeth's Sports Item Catalog
+
+Runs the `flask catalog` commands the way the README documents them: with
+the installed flask script and FLASK_APP=application, in a new process.
+"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+APP_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the console script next to the interpreter; `python -m flask` would put
+# the working directory on the module search path and hide import problems
+FLASK = os.path.join(os.path.dirname(sys.executable), 'flask')
+
+
+@pytest.fixture
+def flask_cli(tmp_path):
+    if not os.path.isfile(FLASK):
+        pytest.skip(f"no flask script at {FLASK}")
+    env = {name: value for name, value in os.environ.items()
+           if name != 'PYTHONPATH'}
+    env.update({'FLASK_APP': 'application',
+                'CATALOG_SECRET_KEY': 'test',
+                'CATALOG_DATABASE_URL':
+                    f"sqlite:///{tmp_path / 'catalog.db'}"})
+
+    def run(*args):
+        return subprocess.run([FLASK, 'catalog', *args], cwd=APP_FOLDER,
+                              env=env, stdout=subprocess.PIPE,
+                              stderr=subprocess.STDOUT,
+                              universal_newlines=True, timeout=120)
+    return run
+
+
+def test_init_db_and_checks(flask_cli):
+    result = flask_cli('init-db')
+    assert result.returncode == 0, result.stdout
+    assert 'Created: catalog' in result.stdout
+    for command in ('check-query-plans', 'check-query-counts'):
+        result = flask_cli(command)
+        assert result.returncode == 0, result.stdout
+    result = flask_cli('init-db')
+    assert result.returncode == 0, result.stdout
+    assert 'Database is up to date.' in result.stdout
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Database access tests for Elisabeth's Sports Item Catalog
+
+Every application keeps its engines in app.extensions['database'] (see
+database/database_access.py), so an application created later in the same
+process does not take over the database of the ones created before.
+"""
+
+from database import database_access
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+def count_items(app, name):
+    with app.app_context():
+        engine, _ = database_access.get_engines()
+        with engine.connect() as connection:
+            return connection.scalar(
+                "SELECT count(*) FROM items WHERE name = ?", name)
+
+
+def test_applications_keep_their_database(app, signed_in_client, make_app):
+    other = make_app()
+    assert other.extensions['database'] != app.extensions['database']
+
+    # app was created first and still reads and writes its own database
+    response = signed_in_client.post('/catalog/add', data={
+        'name': 'Own ball', 'description': 'Stays at home.',
+        'category': 'soccer'})
+    assert response.status_code == 302
+    assert b'Own ball' in signed_in_client.get('/').data
+    assert b'Own ball' not in other.test_client().get('/').data
+    assert count_items(app, 'Own ball') == 1
+    assert count_items(other, 'Own ball') == 0
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Schema upgrade tests for Elisabeth's Sports Item Catalog
+
+Builds a database of schema version 1 (category names as keys, as created
+by the first version of database_setup.py) and upgrades it with
+upgrade_database() while an "old application" writes to it between the
+batches of the item copy, see migrations.migrate_to_v2().
+"""
+
+import sqlite3
+from functools import partial
+
+import pytest
+
+from config import Config
+from database import migrations
+from database.engines import create_engines
+from database.database_setup import SCHEMA_VERSION
+from database.migrations import upgrade_database, needs_v2_migration
+from database.search import search_items
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+V1_SCHEMA = """
+    CREATE TABLE categories (
+        name VARCHAR(50) NOT NULL,
+        PRIMARY KEY (name));
+    CREATE TABLE items (
+        id INTEGER NOT NULL,
+        name VARCHAR(100) NOT NULL,
+        description VARCHAR(250) NOT NULL,
+        category INTEGER,
+        last_modified DATETIME NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY(category) REFERENCES categories (name));
+"""
+
+V1_CATEGORIES = ['Soccer', 'Rock Climbing', 'Rock-Climbing']
+# (category, number of items); 'Hockey' is only named by its items, and
+# items without a category cannot be migrated
+V1_ITEMS = [('Soccer', 9), ('Rock Climbing', 7), ('Rock-Climbing', 2),
+            ('Hockey', 3), (None, 1)]
+BATCH_SIZE = 5
+
+
+class Interrupted(Exception):
+    pass
+
+
+def create_v1_database(path):
+    connection = sqlite3.connect(str(path))
+    with connection:
+        connection.executescript(V1_SCHEMA)
+        connection.executemany("INSERT INTO categories VALUES (?)",
+                               [(name,) for name in V1_CATEGORIES])
+        connection.executemany(
+            "INSERT INTO items (name, description, category, last_modified) "
+            "VALUES (?, ?, ?, '2019-08-01 12:00:00.000000')",
+            [(f"{category} item {number}", f"Sample {number}", category)
+             for category, count in V1_ITEMS for number in range(count)])
+    return connection
+
+
+def write_as_old_application(connection):
+    # items 1 and 2 have been copied by the first batch already
+    with connection:
+        connection.execute("INSERT INTO categories VALUES ('Curling')")
+        connection.execute(
+            "UPDATE items SET name = 'Renamed stone', category = 'Curling' "
+            "WHERE id = 1")
+        connection.execute("DELETE FROM items WHERE id = 2")
+        connection.execute(
+            "INSERT INTO items (name, description, category, last_modified) "
+            "VALUES ('Broom', 'Sweeps', 'Curling', "
+            "'2019-08-02 12:00:00.000000')")
+        connection.execute(
+            "INSERT INTO items (name, description, category, last_modified) "
+            "VALUES ('Late ball', 'Added during the copy', 'Soccer', "
+            "'2019-08-02 12:00:00.000000')")
+
+
+def v1_items(connection):
+    """The items the old application shows, as they should be migrated."""
+    return sorted(connection.execute("""
+        SELECT id, name, description, category, last_modified FROM items
+        WHERE category IS NOT NULL"""))
+
+
+@pytest.fixture
+def engine(tmp_path):
+    config = {name: getattr(Config, name) for name in dir(Config)
+              if name.isupper()}
+    config['DATABASE_URL'] = f"sqlite:///{tmp_path / 'catalog.db'}"
+    engine, _ = create_engines(config)
+    yield engine
+    engine.dispose()
+
+
+def test_migrate_v1_while_written(tmp_path, engine, monkeypatch):
+    monkeypatch.setattr(migrations, 'migrate_to_v2', partial(
+        migrations.migrate_to_v2, batch_size=BATCH_SIZE))
+    old_application = create_v1_database(tmp_path / 'catalog.db')
+    batches = []
+    expected = []
+
+    def report(message):
+        if 'copied the items' not in message:
+            return
+        batches.append(message)
+        if len(batches) == 1:
+            write_as_old_application(old_application)
+        elif len(batches) == 2:
+            # stop the first run after two committed batches
+            raise Interrupted(message)
+        expected[:] = v1_items(old_application)
+
+    with pytest.raises(Interrupted):
+        upgrade_database(engine, report=report)
+    with engine.connect() as connection:
+        assert needs_v2_migration(connection)
+        copied = connection.scalar(
+            "SELECT rows_done FROM import_progress "
+            "WHERE source = 'schema-v2'")
+    assert copied == 2 * BATCH_SIZE
+
+    created = upgrade_database(engine, report=report)
+    assert 'schema version 2' in created
+    # the second run continued after the batches of the first one
+    assert f"up to id {3 * BATCH_SIZE} " in batches[2]
+    assert upgrade_database(engine) == []
+    old_application.close()
+
+    with engine.connect() as connection:
+        assert connection.scalar('PRAGMA user_version') == SCHEMA_VERSION
+        assert connection.scalar('PRAGMA integrity_check') == 'ok'
+        assert connection.execute('PRAGMA foreign_key_check').fetchall() \
+            == []
+        assert sorted(connection.execute("""
+            SELECT items.id, items.name, items.description, categories.name,
+                   items.last_modified
+            FROM items JOIN categories ON categories.id = items.category_id
+            """)) == expected
+        assert expected[0][1:4] == ('Renamed stone', 'Sample 0', 'Curling')
+        assert 2 not in [row[0] for row in expected]
+
+        categories = dict(connection.execute(
+            "SELECT name, slug FROM categories").fetchall())
+        assert categories == {'Soccer': 'soccer',
+                              'Rock Climbing': 'rock-climbing',
+                              'Rock-Climbing': 'rock-climbing-2',
+                              'Hockey': 'hockey',
+                              'Curling': 'curling'}
+        counts = dict(connection.execute(
+            "SELECT name, item_count FROM categories").fetchall())
+        # Soccer lost items 1 (moved) and 2 (deleted) and gained Late ball
+        assert counts == {'Soccer': 8, 'Rock Climbing': 7,
+                          'Rock-Climbing': 2, 'Hockey': 3, 'Curling': 2}
+
+        connection.execute("INSERT INTO items_search (items_search) "
+                           "VALUES ('integrity-check')")
+        assert [row.id for row in
+                search_items(connection, 'renamed stone', 10)] == [1]
+        assert [row.id for row in search_items(connection, 'late', 10)] \
+            == [expected[-1][0]]
+        # item 2 was deleted during the copy
+        assert 2 not in [row.id for row in
+                         search_items(connection, 'soccer item', 20)]
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Page cache tests for Elisabeth's Sports Item Catalog
+
+Renders the index, category and item pages, writes through the routes and
+checks which pages are served from the page cache afterwards: a write must
+drop exactly the pages that show what it changed (see page_cache.py).
+"""
+
+import pytest
+
+from database import database_access
+from database.database_setup import Items
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+@pytest.fixture
+def catalog(app):
+    """Category slug -> ids of its items, and the ids on the index page."""
+    with app.app_context():
+        items = database_access.session.query(Items).all()
+        by_category = {}
+        for item in items:
+            by_category.setdefault(item.category_slug, []).append(item.id)
+        latest = [item.id for item in
+                  database_access.get_latest_items_from_db()]
+        database_access.remove_db_session()
+    return by_category, latest
+
+
+def is_cached(app, client, url):
+    """Request url and tell whether it came from the page cache."""
+    cache = app.extensions['page_cache']
+    hits = cache.stats()['hits']
+    response = client.get(url)
+    assert response.status_code == 200
+    return cache.stats()['hits'] > hits
+
+
+def render(app, client, urls):
+    for url in urls:
+        is_cached(app, client, url)
+    assert all(is_cached(app, client, url) for url in urls)
+
+
+def cached_pages(app, client, urls):
+    return {url for url in urls if is_cached(app, client, url)}
+
+
+def category_url(slug):
+    return f'/catalog/{slug}/items'
+
+
+def item_url(slug, item_id):
+    return f'/catalog/{slug}/{item_id}'
+
+
+def test_add_drops_category_and_index(app, signed_in_client, catalog):
+    by_category, _ = catalog
+    target, other = 'soccer', 'hockey'
+    urls = ['/', category_url(target), category_url(other),
+            item_url(target, by_category[target][0]),
+            item_url(other, by_category[other][0])]
+    render(app, signed_in_client, urls)
+
+    response = signed_in_client.post('/catalog/add', data={
+        'name': 'Cache ball', 'description': 'Fresh.', 'category': target})
+    assert response.status_code == 302
+
+    assert cached_pages(app, signed_in_client, urls) == set(urls[2:])
+
+
+def test_move_drops_both_categories(app, signed_in_client, catalog):
+    by_category, _ = catalog
+    source, target, other = 'basketball', 'baseball', 'skating'
+    moved = by_category[source][0]
+    urls = ['/', category_url(source), category_url(target),
+            category_url(other), item_url(source, moved),
+            item_url(source, by_category[source][1]),
+            item_url(other, by_category[other][0])]
+    render(app, signed_in_client, urls)
+
+    response = signed_in_client.post(f'/catalog/{moved}/edit', data={
+        'name': '', 'description': '', 'category': 'Baseball'})
+    assert response.status_code == 302
+
+    # not the cached page of the item in its old category
+    assert signed_in_client.get(item_url(source, moved)).status_code == 404
+    urls.remove(item_url(source, moved))
+    assert cached_pages(app, signed_in_client, urls) == \
+        {category_url(other), item_url(source, by_category[source][1]),
+         item_url(other, by_category[other][0])}
+    assert not is_cached(app, signed_in_client, item_url(target, moved))
+
+
+def test_delete_keeps_index_without_the_item(app, signed_in_client,
+                                             catalog):
+    by_category, latest = catalog
+    slug, other = 'snowboarding', 'rock-climbing'
+    deleted = next(item_id for item_id in by_category[slug]
+                   if item_id not in latest)
+    kept = next(item_id for item_id in by_category[slug]
+                if item_id != deleted)
+    urls = ['/', category_url(slug), category_url(other),
+            item_url(slug, kept)]
+    render(app, signed_in_client, urls)
+
+    response = signed_in_client.post(f'/catalog/{deleted}/delete')
+    assert response.status_code == 302
+
+    # the index does not show the deleted item
+    assert cached_pages(app, signed_in_client, urls) == \
+        {'/', category_url(other), item_url(slug, kept)}
+
+
+def test_delete_of_latest_item_drops_index(app, signed_in_client, catalog):
+    by_category, latest = catalog
+    deleted = latest[0]
+    slug = next(slug for slug, ids in by_category.items() if deleted in ids)
+    other = next(slug for slug, ids in by_category.items()
+                 if not set(ids) & set(latest))
+    urls = ['/', category_url(slug), category_url(other)]
+    render(app, signed_in_client, urls)
+
+    response = signed_in_client.post(f'/catalog/{deleted}/delete')
+    assert response.status_code == 302
+
+    assert cached_pages(app, signed_in_client, urls) == \
+        {category_url(other)}
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Query budget tests for Elisabeth's Sports Item Catalog
+
+Requests every endpoint that declares a query budget (see query_budget.py).
+The application is testing, so a request over its budget raises
+QueryBudgetExceeded and fails the test. The query plans of the read helpers
+are checked as well (see database/query_plans.py), and so are the query
+counts reported by `flask catalog check-query-counts`.
+
+    cd app && python -m pytest tests
+"""
+
+import pytest
+from flask import current_app
+
+from query_budget import QueryBudgetExceeded, get_query_budget
+from database import database_access
+from database.query_plans import check_query_plans, find_plan_problems, \
+    get_read_helpers
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+# {category} and {item_id} are taken from the most recently modified item
+READ_URLS = [
+    '/',
+    '/catalog/{category}/items',
+    '/catalog/{category}/items?limit=2',
+    '/catalog/{category}/{item_id}',
+    '/catalog/search?q=ball',
+    '/catalog.json',
+    '/catalog.json?stream=1',
+    '/catalog/{category}.json',
+    '/catalog/{category}.json?stream=ndjson',
+    '/catalog/{category}/{item_id}.json',
+    '/catalog/search.json?q=ball',
+    '/stats/page-cache.json',
+    '/stats/compression.json',
+    '/stats/providers.json',
+    '/stats/revocations.json',
+    '/metrics',
+    '/login',
+    '/is_user_connected',
+]
+
+SIGNED_IN_URLS = [
+    '/catalog/add',
+    '/catalog/{item_id}/edit',
+    '/catalog/{item_id}/delete',
+]
+
+requested_endpoints = set()
+
+
+@pytest.fixture(scope='module')
+def sample_item(app):
+    with app.app_context():
+        item = database_access.get_latest_items_from_db().first()
+        sample = {'category': item.category_slug, 'item_id': item.id}
+        database_access.remove_db_session()
+    return sample
+
+
+def request(client, method, url, **kwargs):
+    """Send a request and read its (possibly streamed) response."""
+    endpoint, _ = current_app.url_map.bind('localhost').match(
+        url.split('?')[0], method=method)
+    assert get_query_budget(endpoint) is not None, \
+        f"{endpoint} has no query budget"
+    requested_endpoints.add(endpoint)
+    response = client.open(url, method=method, **kwargs)
+    response.get_data()
+    response.close()
+    return response
+
+
+@pytest.mark.parametrize('url', READ_URLS)
+def test_read_within_budget(app, client, sample_item, url):
+    with app.app_context():
+        response = request(client, 'GET', url.format(**sample_item))
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('url', SIGNED_IN_URLS)
+def test_form_within_budget(app, signed_in_client, sample_item, url):
+    with app.app_context():
+        response = request(signed_in_client, 'GET',
+                           url.format(**sample_item))
+    assert response.status_code == 200
+
+
+def test_writes_within_budget(app, signed_in_client, sample_item):
+    with app.app_context():
+        response = request(signed_in_client, 'POST', '/catalog/add', data={
+            'name': 'Budget ball', 'description': 'Counts its queries.',
+            'category': sample_item['category']})
+        assert response.status_code == 302
+        item_id = response.headers['Location'].rsplit('/', 1)[1]
+        response = request(signed_in_client, 'POST',
+                           f'/catalog/{item_id}/edit', data={
+                               'name': 'Budget bat', 'description': '',
+                               'category': ''})
+        assert response.status_code == 302
+        response = request(signed_in_client, 'POST',
+                           f'/catalog/{item_id}/delete')
+        assert response.status_code == 302
+
+
+def test_sign_in_and_out_within_budget(app, signed_in_client):
+    with app.app_context():
+        # rejected before a provider is asked: the state does not match
+        for url in ('/gconnect?state=wrong', '/fbconnect?state=wrong'):
+            assert request(signed_in_client, 'POST', url).status_code == 401
+        assert request(signed_in_client, 'GET',
+                       '/disconnect').status_code == 200
+
+
+def test_over_budget_fails(app, client, monkeypatch):
+    monkeypatch.setattr(app.view_functions['catalog.index'],
+                        'query_budget', 0)
+    with pytest.raises(QueryBudgetExceeded):
+        client.get('/').get_data()
+
+
+@pytest.mark.parametrize('plan, problems', [
+    (['SEARCH items USING INDEX ix_items_category_id_last_modified '
+      '(category_id=?)'], 0),
+    (['SCAN items USING COVERING INDEX ix_items_last_modified'], 0),
+    (['SCAN categories'], 0),
+    (['SCAN items'], 1),
+    (['SCAN TABLE items'], 1),
+    (['SCAN catalog_changes'], 1),
+    (['SEARCH catalog_changes USING INDEX ix_catalog_changes_version '
+      '(version>?)'], 0),
+    (['SEARCH items USING INDEX ix_items_last_modified (last_modified<?)',
+      'USE TEMP B-TREE FOR ORDER BY'], 1),
+])
+def test_find_plan_problems(plan, problems):
+    assert len(find_plan_problems(plan)) == problems
+
+
+def test_query_plans(app):
+    with app.app_context():
+        results = check_query_plans(*app.extensions['database'])
+    assert results
+    assert [(helper, ' '.join(statement.split()), plan)
+            for helper, statement, plan, problems in results
+            if problems] == []
+
+
+def test_query_plans_cover_every_read_helper():
+    checked = {helper.__name__ for helper, _ in get_read_helpers()}
+    assert {name for name in vars(database_access)
+            if name.startswith('get_') and name.endswith('_from_db')} == \
+        checked
+    assert {'get_item_count_from_db', 'get_catalog_version_from_db',
+            'get_changed_tags_from_db', 'get_search_results_from_db'} <= \
+        checked
+
+
+def test_check_query_counts_command(app):
+    result = app.test_cli_runner().invoke(
+        args=['catalog', 'check-query-counts'])
+    assert result.exit_code == 0, result.output
+    assert '[FAIL]' not in result.output
+
+
+def test_every_budget_requested(app):
+    # runs last: the tests above have requested every budgeted endpoint
+    budgeted = {endpoint for endpoint in app.view_functions
+                if getattr(app.view_functions[endpoint], 'query_budget',
+                           None) is not None}
+    assert budgeted - requested_endpoints == set()
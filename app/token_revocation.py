@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Deferred token revocation for Elisabeth's Sports Item Catalog
+
+Signing out clears the login session right away and puts the access token
+into the revocation queue (see database/revocation_queue.py). A
+RevocationWorker thread in every worker process revokes queued tokens with
+Google or Facebook. Failed attempts are retried with exponential backoff;
+after max_attempts the token is dropped (it expires on its own). A token
+the provider no longer knows counts as revoked.
+
+The worker thread is started when a process serves its first request and,
+under gunicorn, right after a worker process is forked (see
+gunicorn.conf.py), so tokens queued before a restart or crash are revoked
+without waiting for the next sign-out. Every sign-out wakes it up. The
+queue can also be worked off from the command line with
+'flask catalog revoke-tokens'.
+"""
+
+import datetime
+import logging
+import threading
+
+from database.revocation_queue import claim_due_revocations, \
+    remove_revocation, reschedule_revocation, get_queue_stats
+from provider_client import ProviderError
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 20
+MAX_BACKOFF = datetime.timedelta(hours=6)
+# time a worker has to revoke the entries it claimed before another worker
+# may try them again
+LEASE = datetime.timedelta(minutes=5)
+
+
+def revoke_token(client, config, entry):
+    """
+    Revoke the token of a queue entry. Returns None if the token is
+    revoked (or unknown to the provider), otherwise the reason why not.
+    """
+    try:
+        if entry.provider == 'google':
+            response = client.request(
+                'google.revoke', 'GET',
+                config['GOOGLE_ACCOUNTS_URL'] + '/o/oauth2/revoke',
+                params={'token': entry.token})
+            # 400: the token has expired or was revoked before
+            if response.status_code in (200, 400):
+                return None
+        elif entry.provider == 'facebook':
+            response = client.request(
+                'facebook.revoke', 'DELETE',
+                config['FACEBOOK_GRAPH_URL'] +
+                f'/{entry.account_id}/permissions',
+                params={'access_token': entry.token})
+            # 400 and 401: the token is invalid (expired or revoked)
+            if response.status_code in (400, 401) or (
+                    response.ok and response.json().get('success') is True):
+                return None
+        else:
+            return f"unknown provider '{entry.provider}'"
+    except (ProviderError, ValueError) as e:
+        return str(e)
+    return f"{entry.provider} answered with {response.status_code}"
+
+
+class RevocationWorker(object):
+    def __init__(self, engine, client, config, poll_interval=30,
+                 max_attempts=8, backoff=30):
+        self.engine = engine
+        self.client = client
+        self.config = config
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff = datetime.timedelta(seconds=backoff)
+        self.revoked = 0
+        self.failed = 0
+        self.dropped = 0
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def ensure_running(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='token-revocation', daemon=True)
+                self._thread.start()
+
+    def notify(self):
+        """Start the worker if needed and let it look at the queue now."""
+        self.ensure_running()
+        self._wakeup.set()
+
+    def run_once(self):
+        """Revoke all tokens that are due. Returns how many were handled."""
+        handled = 0
+        while True:
+            with self.engine.begin() as connection:
+                entries = claim_due_revocations(connection, BATCH_SIZE,
+                                                LEASE)
+            for entry in entries:
+                self._revoke(entry)
+            handled += len(entries)
+            if len(entries) < BATCH_SIZE:
+                return handled
+
+    def stats(self):
+        with self.engine.connect() as connection:
+            stats = get_queue_stats(connection)
+        stats.update(revoked=self.revoked, failed_attempts=self.failed,
+                     dropped=self.dropped)
+        return stats
+
+    def _revoke(self, entry):
+        error = revoke_token(self.client, self.config, entry)
+        with self.engine.begin() as connection:
+            if error is None:
+                remove_revocation(connection, entry.id)
+                self.revoked += 1
+                return
+            attempts = entry.attempts + 1
+            self.failed += 1
+            if attempts >= self.max_attempts:
+                logger.warning("Giving up revoking a %s token after %d "
+                               "attempts: %s", entry.provider, attempts,
+                               error)
+                remove_revocation(connection, entry.id)
+                self.dropped += 1
+                return
+            delay = min(self.backoff * 2 ** (attempts - 1), MAX_BACKOFF)
+            reschedule_revocation(connection, entry.id, attempts,
+                                  datetime.datetime.now() + delay, error)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            try:
+                self.run_once()
+            except Exception:
+                # keep the worker alive; the entries are retried later
+                logger.exception("Revoking queued tokens failed")
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+WSGI entry point for Elisabeth's Sports Item Catalog
+
+Creates the application once, so that a pre-forking server can load it in
+its master process and hand it to every worker process, e.g. with gunicorn:
+
+    export CATALOG_SECRET_KEY=<shared secret>
+    FLASK_APP=application flask catalog init-db
+    gunicorn --config gunicorn.conf.py wsgi:app
+
+The database is not created or upgraded here: run `flask catalog init-db`
+before starting the server.
+
+All workers must share the same CATALOG_SECRET_KEY, otherwise a login made
+on one worker is not valid on the others.
+"""
+
+from application import create_app
+
+
+__author__ = "Elisabeth M. Strunk"
+__version__ = 1.0
+__maintainer__ = "Elisabeth M. Strunk"
+__email__ = "elisabeth.maria.strunk@gmail.com"
+__status__ = "Development"
+
+
+app = create_app()